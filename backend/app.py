@@ -7,7 +7,14 @@ from flask import Flask, request, jsonify, send_from_directory, session, Respons
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from functools import wraps
+from collections import OrderedDict
+import hashlib
+import threading
 import json
+import time
+import os
+import signal
+import sys
 from io import BytesIO
 from pathlib import Path
 import logging
@@ -18,7 +25,7 @@ logging.basicConfig(level=logging.INFO)
 from config_db import (
     init_config_db, get_secret_key, get_admin_username,
     verify_password, update_admin_credentials,
-    get_danbooru_config, update_danbooru_config
+    get_danbooru_config, update_danbooru_config, close_config_db
 )
 
 # 初始化配置数据库
@@ -28,11 +35,22 @@ from database import (
     init_db, get_all_categories, create_category, update_category, get_all_artists,
     get_artists_by_category, create_artist, update_artist, delete_artist,
     get_artist_by_id, get_db, check_artist_exists,
-    get_all_artists_for_dedup, batch_create_artists, batch_update_artists
+    get_all_artists_for_dedup, batch_create_artists, batch_update_artists,
+    close_db, list_artists, search_artists, fuzzy_search_artists,
+    get_data_version, get_artist_changes, find_duplicate_artists, merge_duplicate_artists,
+    list_incomplete_artists, get_library_stats,
+    get_artists_by_identity_keys, write_preset_items, get_preset_items, get_presets_by_artist,
+    bulk_update_post_counts, record_fetch_results, artist_write_queue, DEFAULT_PAGE_SIZE, BULK_INSERT_BATCH_SIZE
 )
+from artist_filter import compile_filter
+import http_cache
+import jobs
+import scheduler
 from utils import (
-    auto_complete_names, format_noob, format_nai,
-    generate_danbooru_link, fetch_post_counts_batch,
+    auto_complete_names, format_noob, format_nai, artist_field_keys,
+    artist_identity_key, parse_prompt_artists,
+    generate_danbooru_link, fetch_post_counts_batch, refresh_post_counts_bulk, fetch_status_from_result,
+    get_rate_limiter_state,
     IMAGES_DIR, BACKGROUNDS_DIR
 )
 
@@ -60,7 +78,7 @@ CORS(app,
          'http://localhost:5174',
          'http://127.0.0.1:5174',
      ],
-     allow_headers=['Content-Type', 'Authorization'],
+     allow_headers=['Content-Type', 'Authorization', 'Last-Event-ID'],
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
 
 # 每次请求时刷新 session，确保活跃用户不会被登出
@@ -69,6 +87,18 @@ def refresh_session():
     session.permanent = True
     session.modified = True
 
+# 请求结束时释放本线程复用的数据库连接
+@app.teardown_appcontext
+def close_db_connections(exception=None):
+    close_db()
+    close_config_db()
+    jobs.close_jobs_db()
+
+def _handle_sigterm(signum, frame):
+    """docker stop 等发送 SIGTERM 时先提交写入队列再退出（默认处理方式不会执行 atexit）"""
+    artist_write_queue.close()
+    sys.exit(0)
+
 # 登录验证装饰器
 def login_required(f):
     @wraps(f)
@@ -78,6 +108,47 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# -------------------------------
+# 列表响应缓存（按数据版本失效，支持 ETag/304）
+# -------------------------------
+
+RESPONSE_CACHE_MAX_ENTRIES = 64
+_response_cache = OrderedDict()  # cache_key -> (data_version, body)
+_response_cache_lock = threading.Lock()
+
+def cached_json_response(cache_key, build_payload):
+    """
+    读穿缓存：以数据版本号为键缓存序列化后的 JSON
+    - 客户端 If-None-Match 命中当前版本时直接返回 304
+    - 版本未变化时复用已序列化的响应体，不再查询数据库
+    """
+    version = get_data_version()
+    etag = f"v{version}-{hashlib.sha1(cache_key.encode()).hexdigest()[:12]}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = None
+        with _response_cache_lock:
+            entry = _response_cache.get(cache_key)
+            if entry and entry[0] == version:
+                body = entry[1]
+                _response_cache.move_to_end(cache_key)
+
+        if body is None:
+            body = app.json.dumps(build_payload())
+            with _response_cache_lock:
+                _response_cache[cache_key] = (version, body)
+                _response_cache.move_to_end(cache_key)
+                while len(_response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+                    _response_cache.popitem(last=False)
+
+        response = Response(body, mimetype='application/json')
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 # 允许的图片格式
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
@@ -86,6 +157,20 @@ def allowed_file(filename):
 
 # 初始化数据库
 init_db()
+jobs.init_jobs_db()
+
+def start_background_services():
+    """启动后台任务工作线程和定时刷新，由 run.py 在服务进程中调用（导入 app 时不启动）"""
+    # 后台任务工作线程（JOB_WORKER=external 时由单独的 python -m jobs 进程执行任务）
+    if os.environ.get('JOB_WORKER', 'inline').lower() != 'external':
+        jobs.start_worker()
+
+    # 作品数量定时刷新（POST_COUNT_REFRESH_INTERVAL=0 时关闭）
+    scheduler.start_scheduler()
+
+    # 信号处理只能在主线程注册
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _handle_sigterm)
 
 # -------------------------------
 # 图片文件服务
@@ -251,8 +336,10 @@ def api_clear_danbooru_config():
 def api_get_categories():
     """获取所有分类"""
     try:
-        categories = get_all_categories()
-        return jsonify({"success": True, "data": categories})
+        return cached_json_response(
+            'categories',
+            lambda: {"success": True, "data": get_all_categories()}
+        )
     except Exception as e:
         logging.error(f"获取分类失败: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -317,18 +404,176 @@ def api_delete_category(category_id):
 @app.route('/api/artists', methods=['GET'])
 @login_required
 def api_get_artists():
-    """获取所有画师或按分类获取"""
+    """
+    获取所有画师或按分类获取
+    传入 limit / cursor / sort / incomplete 任一参数时启用服务端分页：
+    - limit: 每页数量（默认100，最大500）
+    - cursor: 上一页返回的 next_cursor
+    - sort: count_desc / count_asc / date_desc / date_asc
+    - category_id: 分类筛选
+    - incomplete: 为 1/true 时仅返回待补全画师
+    """
     try:
         category_id = request.args.get('category_id', type=int)
+        paginated = any(key in request.args for key in ('limit', 'cursor', 'sort', 'incomplete'))
+
+        cache_key = 'artists?' + '&'.join(f"{k}={v}" for k, v in sorted(request.args.items()))
+
+        if paginated:
+            incomplete = request.args.get('incomplete', '').lower() in ('1', 'true', 'yes')
+
+            def build_page():
+                page = list_artists(
+                    limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+                    cursor_token=request.args.get('cursor') or None,
+                    sort=request.args.get('sort', 'count_desc'),
+                    category_id=category_id,
+                    incomplete=incomplete
+                )
+                return {
+                    "success": True,
+                    "data": page['items'],
+                    "pagination": {
+                        "next_cursor": page['next_cursor'],
+                        "total": page['total']
+                    }
+                }
+
+            try:
+                return cached_json_response(cache_key, build_page)
+            except ValueError as e:
+                return jsonify({"success": False, "error": str(e)}), 400
 
         if category_id:
-            artists = get_artists_by_category(category_id)
-        else:
-            artists = get_all_artists()
+            return cached_json_response(
+                cache_key,
+                lambda: {"success": True, "data": get_artists_by_category(category_id)}
+            )
+        return cached_json_response(
+            cache_key,
+            lambda: {"success": True, "data": get_all_artists()}
+        )
+    except Exception as e:
+        logging.error(f"获取画师失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/api/artists/query', methods=['GET'])
+@login_required
+def api_query_artists():
+    """
+    按筛选表达式查询画师（服务端分页，参数同 /api/artists 分页模式）
+    - filter: 筛选表达式，如 cat:Anime AND NOT cat:Sketch、posts>500、has:image、updated<30d
+    """
+    try:
+        try:
+            filter_condition = compile_filter(request.args.get('filter', ''))
+            page = list_artists(
+                limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+                cursor_token=request.args.get('cursor') or None,
+                sort=request.args.get('sort', 'count_desc'),
+                filter_condition=filter_condition
+            )
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        # 表达式可能包含相对时间（如 updated<30d），结果随时间变化，因此不走数据版本缓存
+        return jsonify({
+            "success": True,
+            "data": page['items'],
+            "pagination": {
+                "next_cursor": page['next_cursor'],
+                "total": page['total']
+            }
+        })
+    except Exception as e:
+        logging.error(f"筛选画师失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/artists/incomplete', methods=['GET'])
+@login_required
+def api_get_incomplete_artists():
+    """
+    按 ID 分页获取待补全画师（走部分索引）
+    - mode: incomplete（默认，与"待补全"筛选一致）/ enrichment（需要获取作品数据）
+    - limit / cursor: 同 /api/artists 分页模式
+    """
+    try:
+        cache_key = 'artists/incomplete?' + '&'.join(f"{k}={v}" for k, v in sorted(request.args.items()))
+
+        def build_page():
+            page = list_incomplete_artists(
+                limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+                cursor_token=request.args.get('cursor') or None,
+                mode=request.args.get('mode', 'incomplete')
+            )
+            return {
+                "success": True,
+                "data": page['items'],
+                "pagination": {
+                    "next_cursor": page['next_cursor'],
+                    "total": page['total']
+                }
+            }
+
+        try:
+            return cached_json_response(cache_key, build_page)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"获取待补全画师失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/artists/search', methods=['GET'])
+@login_required
+def api_search_artists():
+    """全文搜索画师（名称与备注），按相关度排序并返回高亮片段"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = request.args.get('limit', 50, type=int)
+
+        if not query:
+            return jsonify({"success": True, "data": []})
+
+        artists = search_artists(query, limit=limit)
         return jsonify({"success": True, "data": artists})
     except Exception as e:
-        logging.error(f"获取画师失败: {e}")
+        logging.error(f"搜索画师失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/artists/changes', methods=['GET'])
+@login_required
+def api_get_artist_changes():
+    """
+    增量同步：返回指定数据版本之后新建/修改的画师和已删除的画师 ID
+    - since: 上次同步返回的 version（缺省或 0 表示全量同步）
+    """
+    try:
+        since = request.args.get('since', '0').strip() or '0'
+        try:
+            changes = get_artist_changes(int(since))
+        except ValueError:
+            return jsonify({"success": False, "error": "无效的同步版本号"}), 400
+        return jsonify({"success": True, "data": changes})
+    except Exception as e:
+        logging.error(f"获取画师变更失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/artists/fuzzy', methods=['GET'])
+@login_required
+def api_fuzzy_search_artists():
+    """模糊搜索画师名称（容忍拼写错误），按相似度排序"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = request.args.get('limit', 20, type=int)
+        min_score = request.args.get('min_score', 0.2, type=float)
+
+        if not query:
+            return jsonify({"success": True, "data": []})
+
+        artists = fuzzy_search_artists(query, limit=limit, min_score=min_score)
+        return jsonify({"success": True, "data": artists})
+    except Exception as e:
+        logging.error(f"模糊搜索画师失败: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/api/artists/<int:artist_id>', methods=['GET'])
@@ -338,6 +583,7 @@ def api_get_artist(artist_id):
     try:
         artist = get_artist_by_id(artist_id)
         if artist:
+            scheduler.record_artist_view(artist_id)
             return jsonify({"success": True, "data": artist})
         else:
             return jsonify({"success": False, "error": "画师不存在"}), 404
@@ -565,140 +811,31 @@ def api_auto_complete():
 @app.route('/api/tools/auto-complete-all-stream', methods=['GET'])
 @login_required
 def api_auto_complete_all_stream():
-    """一键补全所有画师数据（SSE流式响应，带进度）"""
-    def get_display_name(artist):
-        """获取显示名称：优先使用NAI格式并去除artist:前缀，去除转义字符"""
-        name = artist.get('name_nai') or artist.get('name_noob') or '未命名'
-        # 去除 artist: 前缀
-        if name.startswith('artist:'):
-            name = name[7:]
-        # 去除 NOOB 格式的括号转义
-        name = name.replace('\\(', '(').replace('\\)', ')')
-        return name
-
-    def generate():
-        try:
-            artists = get_all_artists()
-            total_artists = len(artists)
-            updated_count = 0
-
-            # 发送初始状态
-            yield f"data: {json.dumps({'type': 'start', 'total': total_artists})}\n\n"
-
-            # 1. 补全名称和链接
-            for idx, artist in enumerate(artists):
-                artist_id = artist['id']
-                name_noob = artist.get('name_noob', '')
-                name_nai = artist.get('name_nai', '')
-                danbooru_link = artist.get('danbooru_link', '')
-                display_name = get_display_name(artist)
-
-                new_noob, new_nai, new_link = auto_complete_names(name_noob, name_nai, danbooru_link)
-
-                # 检查是否有变更
-                if (new_noob != name_noob or
-                    new_nai != name_nai or
-                    new_link != danbooru_link):
-
-                    update_artist(
-                        artist_id,
-                        name_noob=new_noob,
-                        name_nai=new_nai,
-                        danbooru_link=new_link
-                    )
-                    updated_count += 1
-                    # 更新内存中的对象
-                    artist['name_noob'] = new_noob
-                    artist['name_nai'] = new_nai
-                    artist['danbooru_link'] = new_link
-
-                # 发送进度 - 阶段1：名称补全
-                yield f"data: {json.dumps({'type': 'progress', 'phase': 'names', 'current': idx + 1, 'total': total_artists, 'artist_name': display_name, 'updated_count': updated_count})}\n\n"
-
-            # 2. 筛选需要获取作品数据的画师
-            artists_to_fetch = []
-            for artist in artists:
-                if artist.get('skip_danbooru'):
-                    continue
-
-                link = artist.get('danbooru_link')
-                if not link:
-                    continue
-
-                needs_fetch = False
-                if artist.get('post_count') is None or artist.get('post_count') == 0:
-                    needs_fetch = True
-
-                if not artist.get('image_example'):
-                    needs_fetch = True
-                else:
-                    image_path = IMAGES_DIR / artist['image_example']
-                    if not image_path.exists():
-                        needs_fetch = True
-
-                if needs_fetch:
-                    artists_to_fetch.append({
-                        'id': artist['id'],
-                        'uuid': artist.get('uuid'),
-                        'danbooru_link': link,
-                        'name': get_display_name(artist)
-                    })
-
-            # 发送阶段2开始信息
-            yield f"data: {json.dumps({'type': 'phase', 'phase': 'fetch', 'total': len(artists_to_fetch), 'message': f'开始获取 {len(artists_to_fetch)} 个画师的作品数据...'})}\n\n"
-
-            # 3. 逐个获取作品数据（使用流式版本）
-            fetched_count = 0
-            image_failed_count = 0
-            image_failed_artists = []
-
-            if artists_to_fetch:
-                from utils import fetch_post_counts_streaming
-
-                for progress in fetch_post_counts_streaming(artists_to_fetch):
-                    if progress['type'] == 'progress':
-                        # 发送获取进度
-                        yield f"data: {json.dumps({'type': 'progress', 'phase': 'fetch', 'current': progress['current'], 'total': progress['total'], 'artist_name': progress['artist_name']})}\n\n"
-                    elif progress['type'] == 'result':
-                        artist_id = progress['artist_id']
-                        result = progress['result']
-                        update_data = {}
-
-                        if result.get('post_count') is not None:
-                            update_data['post_count'] = result['post_count']
-                        if result.get('example_image'):
-                            update_data['image_example'] = result['example_image']
-
-                        if update_data:
-                            update_artist(artist_id, **update_data)
-                            fetched_count += 1
-
-                            if result.get('post_count') is not None and not result.get('example_image'):
-                                image_failed_count += 1
-                                image_failed_artists.append(progress['artist_name'])
-
-            # 构建最终消息
-            message = f"已自动补全 {updated_count} 个画师的基本信息"
-            if fetched_count > 0:
-                message += f"，并成功获取了 {fetched_count} 个画师的作品数据"
-            elif len(artists_to_fetch) > 0:
-                message += f"，尝试获取 {len(artists_to_fetch)} 个画师的作品数据但未成功"
-
-            if image_failed_count > 0:
-                message += f"（其中 {image_failed_count} 个画师封面获取失败）"
-
-            # 发送完成状态
-            yield f"data: {json.dumps({'type': 'complete', 'message': message, 'updated_count': updated_count, 'fetched_count': fetched_count, 'image_failed_count': image_failed_count, 'image_failed_artists': image_failed_artists})}\n\n"
+    """
+    一键补全所有画师数据（SSE流式响应，带进度）
+    兼容旧版前端：创建一键补全后台任务（已有未结束的任务时附加到该任务），按旧格式转发任务进度
+    """
+    try:
+        force_refresh = request.args.get('force_refresh', '').lower() in ('1', 'true', 'yes')
+        job, _ = jobs.create_job('enrich', {'force_refresh': force_refresh})
+    except Exception as e:
+        logging.error(f"一键补全失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
 
-        except Exception as e:
-            logging.error(f"一键补全失败: {e}")
-            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+    def to_legacy_event(event):
+        """任务事件转为旧版格式；排队 / 开始事件不转发，取消视为错误以便前端关闭连接"""
+        if event['type'] in ('queued', 'started', 'resumed'):
+            return None
+        if event['type'] == 'cancelled':
+            return {'type': 'error', 'error': event.get('message') or '任务已取消'}
+        return event
 
-    return Response(generate(), mimetype='text/event-stream', headers={
-        'Cache-Control': 'no-cache',
-        'Connection': 'keep-alive',
-        'X-Accel-Buffering': 'no'
-    })
+    # 默认从第一条事件开始发送，附加到运行中的任务时先补发已有进度
+    try:
+        after = int(request.headers.get('Last-Event-ID') or 0)
+    except ValueError:
+        after = 0
+    return _job_events_response(job['id'], after, to_legacy_event)
 
 @app.route('/api/tools/fetch-post-counts', methods=['POST'])
 @login_required
@@ -727,7 +864,7 @@ def api_fetch_post_counts():
                 })
 
         # 批量获取作品数量和示例图
-        results = fetch_post_counts_batch(artists)
+        results = fetch_post_counts_batch(artists, force_refresh=bool(data.get('force_refresh')))
 
         # 更新数据库并统计结果
         updated_count = 0
@@ -744,18 +881,23 @@ def api_fetch_post_counts():
                 if result.get('example_image'):
                     update_data['image_example'] = result['example_image']
 
+                artist_write_queue.submit(artist_id, fetch_status=fetch_status_from_result(result), **update_data)
                 if update_data:
-                    update_artist(artist_id, **update_data)
                     updated_count += 1
 
                     # 检查是否有警告（获取了作品数但没有图片）
                     if result.get('post_count') is not None and not result.get('example_image'):
                         artist_name = artist_id_to_name.get(artist_id, f"ID:{artist_id}")
                         warnings.append(f"{artist_name}: 获取到作品数量但未能下载示例图片")
-            else:
+            elif artist_id in artist_id_to_name:
                 # 完全失败的画师
-                artist_name = artist_id_to_name.get(artist_id, f"ID:{artist_id}")
-                failed_artists.append(artist_name)
+                artist_write_queue.submit(artist_id, fetch_status='failed')
+                failed_artists.append(artist_id_to_name[artist_id])
+            else:
+                failed_artists.append(f"ID:{artist_id}")
+
+        if not artist_write_queue.flush():
+            logging.warning("写入队列提交超时，部分作品数据稍后才会写入")
 
         # 构建响应消息
         messages = []
@@ -782,6 +924,309 @@ def api_fetch_post_counts():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/api/tools/refresh-post-counts', methods=['POST'])
+@login_required
+def api_refresh_post_counts():
+    """
+    仅刷新作品数量（批量标签查询，不下载图片）
+    请求体: {artist_ids?: [...], force_refresh?: bool}；不传 artist_ids 时刷新所有有链接且未跳过的画师
+    """
+    try:
+        data = request.json or {}
+        artist_ids = data.get('artist_ids')
+
+        with get_db() as conn:
+            if artist_ids:
+                artists = []
+                for i in range(0, len(artist_ids), 500):
+                    chunk = artist_ids[i:i + 500]
+                    placeholders = ", ".join("?" * len(chunk))
+                    artists.extend(dict(row) for row in conn.execute(
+                        f"SELECT id, danbooru_link FROM artists WHERE id IN ({placeholders})", chunk
+                    ))
+            else:
+                artists = [dict(row) for row in conn.execute("""
+                    SELECT id, danbooru_link FROM artists
+                    WHERE IFNULL(skip_danbooru, 0) = 0 AND IFNULL(danbooru_link, '') != ''
+                """)]
+
+        results, stats = refresh_post_counts_bulk(artists, force_refresh=bool(data.get('force_refresh')))
+        counts = {artist_id: count for artist_id, count in results.items() if count is not None}
+        updated = bulk_update_post_counts(counts)
+        record_fetch_results({
+            artist_id: 'ok' if count is not None else 'failed' for artist_id, count in results.items()
+        })
+
+        return jsonify({
+            "success": True,
+            "message": f"已刷新 {len(counts)} 个画师的作品数量，其中 {updated} 个有变化",
+            "data": {
+                "requested": len(artists),
+                "fetched": len(counts),
+                "updated": updated,
+                **stats
+            }
+        })
+    except Exception as e:
+        logging.error(f"批量刷新作品数量失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/tools/rate-limits', methods=['GET'])
+@login_required
+def api_get_rate_limits():
+    """Danbooru 请求限速器的实时状态（速率、并发、被限流次数等）"""
+    return jsonify({"success": True, "data": get_rate_limiter_state()})
+
+@app.route('/api/tools/refresh-scheduler', methods=['GET'])
+@login_required
+def api_get_refresh_scheduler():
+    """作品数量定时刷新的配置和最近一次执行结果"""
+    try:
+        return jsonify({"success": True, "data": scheduler.get_scheduler_state()})
+    except Exception as e:
+        logging.error(f"获取定时刷新状态失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/tools/http-cache', methods=['GET'])
+@login_required
+def api_get_http_cache_stats():
+    """Danbooru 响应缓存统计（条目数、占用大小、命中/未命中计数）"""
+    try:
+        return jsonify({"success": True, "data": http_cache.get_stats()})
+    except Exception as e:
+        logging.error(f"获取响应缓存统计失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/tools/http-cache', methods=['DELETE'])
+@login_required
+def api_clear_http_cache():
+    """清空 Danbooru 响应缓存（可通过 endpoint 参数只清空 counts / posts）"""
+    try:
+        removed = http_cache.clear(request.args.get('endpoint') or None)
+        return jsonify({"success": True, "data": {"removed": removed}})
+    except Exception as e:
+        logging.error(f"清空响应缓存失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# -------------------------------
+# 后台任务 API
+# -------------------------------
+
+@app.route('/api/jobs', methods=['GET'])
+@login_required
+def api_list_jobs():
+    """最近的后台任务（可通过 active=1 只返回未结束的任务）"""
+    try:
+        if request.args.get('active', '').lower() in ('1', 'true', 'yes'):
+            data = [job for job in (jobs.get_active_job(kind) for kind in jobs.JOB_KINDS) if job]
+        else:
+            data = jobs.list_jobs(request.args.get('limit', 20, type=int))
+        return jsonify({"success": True, "data": data})
+    except Exception as e:
+        logging.error(f"获取任务列表失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def api_create_job():
+    """
+    创建后台任务: {kind: 'enrich', force_refresh?: bool, artist_ids?: [...]}
+    同类型已有未结束的任务时返回该任务（created 为 false），不会重复发起
+    """
+    try:
+        data = request.json or {}
+        kind = data.get('kind', 'enrich')
+        if kind not in jobs.JOB_KINDS:
+            return jsonify({"success": False, "error": f"不支持的任务类型: {kind}"}), 400
+
+        artist_ids = data.get('artist_ids') or []
+        if not isinstance(artist_ids, list) or not all(isinstance(i, int) for i in artist_ids):
+            return jsonify({"success": False, "error": "artist_ids 必须是整数列表"}), 400
+
+        params = {'force_refresh': bool(data.get('force_refresh'))}
+        if artist_ids:
+            params['artist_ids'] = artist_ids
+
+        job, created = jobs.create_job(kind, params)
+        return jsonify({"success": True, "data": job, "created": created}), 201 if created else 200
+    except Exception as e:
+        logging.error(f"创建任务失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def api_get_job(job_id):
+    """任务详情（可通过 tasks=failed 等附带对应状态的逐画师子任务）"""
+    try:
+        job = jobs.get_job(job_id)
+        if not job:
+            return jsonify({"success": False, "error": "任务不存在"}), 404
+        task_status = request.args.get('tasks')
+        if task_status:
+            job['tasks'] = jobs.get_job_tasks(job_id, None if task_status == 'all' else task_status)
+        return jsonify({"success": True, "data": job})
+    except Exception as e:
+        logging.error(f"获取任务失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def api_cancel_job(job_id):
+    """取消任务（运行中的任务在当前批次完成后停止）"""
+    try:
+        job = jobs.cancel_job(job_id)
+        if not job:
+            return jsonify({"success": False, "error": "任务不存在"}), 404
+        return jsonify({"success": True, "data": job})
+    except Exception as e:
+        logging.error(f"取消任务失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# 进度流轮询间隔和保活注释间隔（秒）
+JOB_EVENTS_POLL_INTERVAL = 1
+JOB_EVENTS_KEEPALIVE = 15
+
+@app.route('/api/jobs/<int:job_id>/events', methods=['GET'])
+@login_required
+def api_job_events(job_id):
+    """
+    任务进度（SSE 流式响应）
+    每条事件带 id，断线重连时浏览器通过 Last-Event-ID 头（或 after 参数）从断点继续；
+    任务结束且事件全部发送后关闭流
+    """
+    if not jobs.get_job(job_id):
+        return jsonify({"success": False, "error": "任务不存在"}), 404
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('after') or '0'
+    try:
+        after = int(last_event_id)
+    except ValueError:
+        return jsonify({"success": False, "error": "无效的事件 ID"}), 400
+
+    return _job_events_response(job_id, after)
+
+def _job_events_response(job_id: int, after: int, transform=None):
+    """
+    轮询任务事件并以 SSE 发送，任务结束且事件全部发送后关闭流
+    transform 可改写事件内容（返回 None 时跳过该事件）
+    """
+    def generate():
+        nonlocal after
+        idle = 0.0
+        try:
+            while True:
+                # 先读状态再读事件：结束事件与状态在同一事务中写入，已结束时本轮必能读到全部事件
+                job = jobs.get_job(job_id)
+                finished = not job or job['status'] not in ('pending', 'running')
+                events = jobs.get_job_events(job_id, after)
+                for seq, data in events:
+                    after = seq
+                    if transform:
+                        event = transform(json.loads(data))
+                        if event is None:
+                            continue
+                        data = json.dumps(event, ensure_ascii=False)
+                    yield f"id: {seq}\ndata: {data}\n\n"
+                if events:
+                    idle = 0.0
+                    continue
+                if finished:
+                    break
+
+                time.sleep(JOB_EVENTS_POLL_INTERVAL)
+                idle += JOB_EVENTS_POLL_INTERVAL
+                if idle >= JOB_EVENTS_KEEPALIVE:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+        finally:
+            jobs.close_jobs_db()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/stats', methods=['GET'])
+@login_required
+def api_get_stats():
+    """画师库统计（总数、补全情况、作品数分布、图片占用空间），按数据版本缓存"""
+    def build_stats():
+        stats = get_library_stats()
+        image_count = 0
+        image_bytes = 0
+        with os.scandir(IMAGES_DIR) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    image_count += 1
+                    image_bytes += entry.stat().st_size
+        stats['images'] = {'count': image_count, 'bytes': image_bytes}
+        return {"success": True, "data": stats}
+
+    try:
+        return cached_json_response('stats', build_stats)
+    except Exception as e:
+        logging.error(f"获取统计信息失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/tools/duplicates', methods=['GET'])
+@login_required
+def api_find_duplicates():
+    """分页获取重复画师分组（每组包含保留项和重复项）"""
+    try:
+        try:
+            result = find_duplicate_artists(
+                limit=request.args.get('limit', 50, type=int),
+                cursor_token=request.args.get('cursor') or None
+            )
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+
+        return jsonify({
+            "success": True,
+            "data": result['groups'],
+            "pagination": {
+                "next_cursor": result['next_cursor'],
+                "total": result['total_groups']
+            }
+        })
+    except Exception as e:
+        logging.error(f"查找重复画师失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/tools/duplicates/merge', methods=['POST'])
+@login_required
+def api_merge_duplicates():
+    """
+    合并重复画师
+    请求体: {"merges": [{"keep_id": 1, "remove_ids": [2, 3]}]} 或 {"all": true}（每组保留最早创建的画师）
+    """
+    try:
+        data = request.json or {}
+        merges = data.get('merges')
+
+        if not data.get('all') and not merges:
+            return jsonify({"success": False, "error": "未指定要合并的画师"}), 400
+
+        result = merge_duplicate_artists(None if data.get('all') else merges)
+
+        # 删除被合并画师的图片文件
+        for filename in result.pop('removed_images'):
+            image_path = IMAGES_DIR / filename
+            if image_path.exists():
+                image_path.unlink()
+                logging.info(f"删除图片文件: {filename}")
+
+        return jsonify({
+            "success": True,
+            "data": result,
+            "message": f"已合并 {result['merged_groups']} 组重复画师，删除 {result['removed_count']} 个重复项"
+        })
+    except Exception as e:
+        logging.error(f"合并重复画师失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # -------------------------------
 # 导入导出 API
 # -------------------------------
@@ -898,14 +1343,12 @@ def api_import_json_stream():
                 name_nai = artist_item.get('name_nai', '').strip()
                 danbooru_link = artist_item.get('danbooru_link', '').strip()
 
-                # 快速去重检查（使用预加载的数据）
+                # 快速去重检查（使用预加载的身份键）
                 existing_artist = None
-                if name_noob and name_noob in existing_artists['by_noob']:
-                    existing_artist = existing_artists['by_noob'][name_noob]
-                elif name_nai and name_nai in existing_artists['by_nai']:
-                    existing_artist = existing_artists['by_nai'][name_nai]
-                elif danbooru_link and danbooru_link in existing_artists['by_link']:
-                    existing_artist = existing_artists['by_link'][danbooru_link]
+                for key in artist_field_keys(name_noob, name_nai, danbooru_link):
+                    if key in existing_artists['by_identity']:
+                        existing_artist = existing_artists['by_identity'][key]
+                        break
 
                 result = {
                     'category_ids': category_ids,
@@ -930,7 +1373,6 @@ def api_import_json_stream():
                 return result
 
             # 使用线程池并发处理
-            batch_size = 100
             max_workers = min(8, (total_artists // 100) + 1)  # 动态调整线程数
 
             with ThreadPoolExecutor(max_workers=max_workers) as executor:
@@ -957,9 +1399,9 @@ def api_import_json_stream():
             # 批量创建
             created_count = 0
             if to_create:
-                # 分批创建，每批100个
-                for i in range(0, len(to_create), batch_size):
-                    batch = to_create[i:i + batch_size]
+                # 分批创建，每批提交一次
+                for i in range(0, len(to_create), BULK_INSERT_BATCH_SIZE):
+                    batch = to_create[i:i + BULK_INSERT_BATCH_SIZE]
                     batch_create_artists(batch)
                     created_count += len(batch)
                     yield f"data: {json.dumps({'type': 'progress', 'phase': 'database', 'action': 'create', 'current': created_count, 'total': len(to_create)})}\n\n"
@@ -967,11 +1409,12 @@ def api_import_json_stream():
             # 批量更新
             updated_count = 0
             if to_update:
-                for i in range(0, len(to_update), batch_size):
-                    batch = to_update[i:i + batch_size]
-                    batch_update_artists(batch)
-                    updated_count += len(batch)
-                    yield f"data: {json.dumps({'type': 'progress', 'phase': 'database', 'action': 'update', 'current': updated_count, 'total': len(to_update)})}\n\n"
+                processed_updates = 0
+                for i in range(0, len(to_update), BULK_INSERT_BATCH_SIZE):
+                    batch = to_update[i:i + BULK_INSERT_BATCH_SIZE]
+                    updated_count += batch_update_artists(batch)
+                    processed_updates += len(batch)
+                    yield f"data: {json.dumps({'type': 'progress', 'phase': 'database', 'action': 'update', 'current': processed_updates, 'total': len(to_update)})}\n\n"
 
             yield f"data: {json.dumps({'type': 'phase_complete', 'phase': 'database', 'created': created_count, 'updated': updated_count})}\n\n"
 
@@ -998,12 +1441,14 @@ def api_import_json_stream():
 @login_required
 def api_get_presets():
     """获取所有画师串"""
-    try:
+    def load_presets():
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM artist_presets ORDER BY updated_at DESC")
-            presets = [dict(row) for row in cursor.fetchall()]
-            return jsonify({"success": True, "data": presets})
+            return {"success": True, "data": [dict(row) for row in cursor.fetchall()]}
+
+    try:
+        return cached_json_response('presets', load_presets)
     except Exception as e:
         logging.error(f"获取画师串失败: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1030,6 +1475,7 @@ def api_create_preset():
             """, (name, description, noob_text, nai_text))
 
             preset_id = cursor.lastrowid
+            write_preset_items(cursor, preset_id, noob_text, nai_text)
 
         return jsonify({"success": True, "data": {"id": preset_id}})
     except Exception as e:
@@ -1059,6 +1505,7 @@ def api_update_preset(preset_id):
             """, (name, description, noob_text, nai_text, preset_id))
 
             if cursor.rowcount > 0:
+                write_preset_items(cursor, preset_id, noob_text, nai_text)
                 return jsonify({"success": True})
             else:
                 return jsonify({"success": False, "error": "画师串不存在"}), 404
@@ -1066,6 +1513,74 @@ def api_update_preset(preset_id):
         logging.error(f"更新画师串失败: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+def resolve_prompt_texts(texts):
+    """
+    解析多段提示词并一次性匹配画师（按身份键批量查询）
+    texts: {字段名: 提示词}，返回 {字段名: [token, ...]}
+    每个 token 附带 artist_id / post_count / image_url，未匹配时为 None
+    """
+    parsed = {field: parse_prompt_artists(text or '') for field, text in texts.items()}
+    artists = get_artists_by_identity_keys([
+        artist_identity_key(token['name']) for tokens in parsed.values() for token in tokens
+    ])
+
+    for tokens in parsed.values():
+        for token in tokens:
+            artist = artists.get(artist_identity_key(token['name']))
+            token['artist_id'] = artist['id'] if artist else None
+            token['post_count'] = artist['post_count'] if artist else None
+            token['image_url'] = (f"/images/{artist['image_example']}"
+                                  if artist and artist['image_example'] else None)
+    return parsed
+
+@app.route('/api/presets/<int:preset_id>/resolve', methods=['POST'])
+@login_required
+def api_resolve_preset(preset_id):
+    """
+    获取画师串中的画师标签及匹配的画师（返回每个标签的画师 ID、作品数和图片）
+    读取保存时写入的条目表，画师重命名后仍指向同一画师
+    """
+    try:
+        data = get_preset_items(preset_id)
+        if data is None:
+            return jsonify({"success": False, "error": "画师串不存在"}), 404
+
+        for tokens in data.values():
+            for token in tokens:
+                image_example = token.pop('image_example')
+                token['image_url'] = f"/images/{image_example}" if image_example else None
+        return jsonify({"success": True, "data": data})
+    except Exception as e:
+        logging.error(f"解析画师串失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/presets/resolve', methods=['POST'])
+@login_required
+def api_resolve_preset_text():
+    """解析原始提示词文本（请求体: noob_text / nai_text / text 任意组合）"""
+    try:
+        data = request.json or {}
+        texts = {key[:-5] if key.endswith('_text') else key: data[key]
+                 for key in ('noob_text', 'nai_text', 'text') if isinstance(data.get(key), str)}
+        if not texts:
+            return jsonify({"success": False, "error": "未提供提示词文本"}), 400
+
+        return jsonify({"success": True, "data": resolve_prompt_texts(texts)})
+    except Exception as e:
+        logging.error(f"解析提示词失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/artists/<int:artist_id>/presets', methods=['GET'])
+@login_required
+def api_get_artist_presets(artist_id):
+    """获取使用了该画师的画师串"""
+    try:
+        scheduler.record_artist_view(artist_id)
+        return jsonify({"success": True, "data": get_presets_by_artist(artist_id)})
+    except Exception as e:
+        logging.error(f"获取画师所属画师串失败: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/api/presets/<int:preset_id>', methods=['DELETE'])
 @login_required
 def api_delete_preset(preset_id):
@@ -0,0 +1,245 @@
+"""
+画师筛选表达式：解析并编译为参数化 SQL 条件（画师表别名为 a）
+
+语法示例:
+    cat:Anime AND NOT cat:Sketch
+    posts>500 has:image           （相邻条件默认为 AND）
+    (cat:"Genshin Impact" OR cat:Anime) -skip:true
+    updated<30d                   （30 天内更新过；也支持 h/w 单位或 2024-01-01 日期）
+
+支持的条件:
+    cat:<名称>      属于该分类（名称不区分大小写，cat:none 表示未分类）
+    posts<op><数>   作品数比较，op 为 > >= < <= = !=（posts:N 等同 posts=N）
+    has:<字段>      image / link / posts / notes / noob / nai 非空
+    skip:<布尔>     是否跳过 Danbooru
+    incomplete:<布尔> 是否待补全（与列表页规则一致）
+    updated/created<op><时长或日期>
+    name:<文本>     名称包含该文本（按身份键匹配）；不带字段的词等同 name:
+"""
+import re
+from typing import List, Tuple, Any
+
+from database import INCOMPLETE_CONDITION
+from utils import artist_identity_key
+
+# 表达式长度上限
+MAX_FILTER_LENGTH = 1000
+
+# 括号和 NOT 的最大嵌套层数（递归下降解析，过深的嵌套会耗尽调用栈）
+MAX_FILTER_DEPTH = 32
+
+_TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<lparen>\()
+      | (?P<rparen>\))
+      | (?P<term>[A-Za-z_]+(?:>=|<=|!=|:|>|<|=)(?:"[^"]*"|[^\s()"]+)?)
+      | (?P<word>"[^"]*"|-|[^\s()"]+)
+    )
+''', re.VERBOSE)
+
+_TERM_PATTERN = re.compile(r'^([A-Za-z_]+)(>=|<=|!=|:|>|<|=)(.*)$', re.S)
+_DURATION_PATTERN = re.compile(r'^(\d+)([hdwmy])$', re.I)
+_DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+_DURATION_UNITS = {'h': ('hours', 1), 'd': ('days', 1), 'w': ('days', 7), 'm': ('months', 1), 'y': ('years', 1)}
+
+_HAS_FIELDS = {
+    'image': "IFNULL(a.image_example, '') != ''",
+    'link': "IFNULL(a.danbooru_link, '') != ''",
+    'posts': "IFNULL(a.post_count, 0) > 0",
+    'notes': "IFNULL(a.notes, '') != ''",
+    'noob': "IFNULL(a.name_noob, '') != ''",
+    'nai': "IFNULL(a.name_nai, '') != ''",
+}
+
+_COMPARE_OPS = {':': '=', '=': '=', '!=': '!=', '>': '>', '>=': '>=', '<': '<', '<=': '<='}
+
+_BOOLEAN_VALUES = {'true': True, 'yes': True, '1': True, 'false': False, 'no': False, '0': False}
+
+# 时间字段：比较"距今多久"时方向与比较时间戳相反（updated<30d 表示 30 天内）
+_TIME_FIELDS = {'updated': 'a.updated_at', 'created': 'a.created_at'}
+_REVERSED_OPS = {'>': '<', '>=': '<=', '<': '>', '<=': '>='}
+
+class FilterSyntaxError(ValueError):
+    """筛选表达式语法错误"""
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+def _tokenize(expr: str) -> List[Tuple[str, str]]:
+    tokens = []
+    pos = 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        match = _TOKEN_PATTERN.match(expr, pos)
+        if not match or match.end() == pos:
+            raise FilterSyntaxError(f"无法解析的筛选表达式: {expr[pos:pos + 20]}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'word' and value.upper() in ('AND', 'OR', 'NOT'):
+            kind = value.upper()
+        elif kind == 'word' and value == '-':
+            kind = 'NOT'
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+class _Parser:
+    """递归下降解析: or_expr := and_expr (OR and_expr)*; and_expr := not_expr ([AND] not_expr)*"""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.pos = 0
+        self.depth = 0
+        self.params: List[Any] = []
+
+    def peek(self) -> str:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else ''
+
+    def take(self) -> Tuple[str, str]:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def parse(self) -> str:
+        sql = self.parse_or()
+        if self.pos < len(self.tokens):
+            raise FilterSyntaxError(f"多余的内容: {self.tokens[self.pos][1]}")
+        return sql
+
+    def parse_or(self) -> str:
+        parts = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else "(" + " OR ".join(parts) + ")"
+
+    def parse_and(self) -> str:
+        parts = [self.parse_not()]
+        while self.peek() in ('AND', 'NOT', 'lparen', 'term', 'word'):
+            if self.peek() == 'AND':
+                self.take()
+            parts.append(self.parse_not())
+        return parts[0] if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+
+    def enter(self):
+        self.depth += 1
+        if self.depth > MAX_FILTER_DEPTH:
+            raise FilterSyntaxError(f"嵌套层数不能超过 {MAX_FILTER_DEPTH}")
+
+    def parse_not(self) -> str:
+        if self.peek() == 'NOT':
+            self.take()
+            self.enter()
+            sql = f"NOT ({self.parse_not()})"
+            self.depth -= 1
+            return sql
+        return self.parse_atom()
+
+    def parse_atom(self) -> str:
+        kind = self.peek()
+        if not kind:
+            raise FilterSyntaxError("筛选表达式不完整")
+        if kind == 'lparen':
+            self.take()
+            self.enter()
+            sql = self.parse_or()
+            if self.peek() != 'rparen':
+                raise FilterSyntaxError("缺少右括号")
+            self.take()
+            self.depth -= 1
+            return sql
+        if kind == 'term':
+            return self.compile_term(self.take()[1])
+        if kind == 'word':
+            return self.compile_name(_unquote(self.take()[1]))
+        raise FilterSyntaxError(f"意外的符号: {self.tokens[self.pos][1]}")
+
+    def compile_name(self, text: str) -> str:
+        key = artist_identity_key(text)
+        if not key:
+            raise FilterSyntaxError("名称条件不能为空")
+        escaped = key.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        self.params.append(f"%{escaped}%")
+        return "a.identity_key LIKE ? ESCAPE '\\'"
+
+    def compile_term(self, term: str) -> str:
+        field, op, value = _TERM_PATTERN.match(term).groups()
+        field = field.lower()
+        value = _unquote(value)
+        if not value:
+            raise FilterSyntaxError(f"条件缺少取值: {term}")
+
+        if field in ('cat', 'category'):
+            if op not in (':', '='):
+                raise FilterSyntaxError(f"分类条件只支持 cat:名称: {term}")
+            if value.lower() == 'none':
+                return "NOT EXISTS (SELECT 1 FROM artist_categories ac WHERE ac.artist_id = a.id)"
+            self.params.append(value)
+            return """EXISTS (
+                SELECT 1 FROM artist_categories ac
+                JOIN categories c ON c.id = ac.category_id
+                WHERE ac.artist_id = a.id AND c.name = ? COLLATE NOCASE
+            )"""
+
+        if field in ('posts', 'post_count'):
+            try:
+                number = int(value)
+            except ValueError:
+                raise FilterSyntaxError(f"作品数必须是整数: {term}")
+            self.params.append(number)
+            return f"IFNULL(a.post_count, 0) {_COMPARE_OPS[op]} ?"
+
+        if field == 'has':
+            if op != ':' or value.lower() not in _HAS_FIELDS:
+                raise FilterSyntaxError(f"has 只支持: {', '.join(_HAS_FIELDS)}")
+            return _HAS_FIELDS[value.lower()]
+
+        if field in ('skip', 'incomplete'):
+            if op not in (':', '=') or value.lower() not in _BOOLEAN_VALUES:
+                raise FilterSyntaxError(f"{field} 的取值必须是 true 或 false: {term}")
+            if field == 'skip':
+                sql = "IFNULL(a.skip_danbooru, 0) != 0"
+            else:
+                sql = INCOMPLETE_CONDITION.strip()
+            return sql if _BOOLEAN_VALUES[value.lower()] else f"NOT ({sql})"
+
+        if field in _TIME_FIELDS:
+            column = _TIME_FIELDS[field]
+            if op == ':':
+                op = '='
+            duration = _DURATION_PATTERN.match(value)
+            if duration:
+                amount, unit = duration.groups()
+                unit_name, factor = _DURATION_UNITS[unit.lower()]
+                if op not in _REVERSED_OPS:
+                    raise FilterSyntaxError(f"时长条件只支持 > >= < <=: {term}")
+                self.params.append(f"-{int(amount) * factor} {unit_name}")
+                return f"{column} {_REVERSED_OPS[op]} datetime('now', ?)"
+            if _DATE_PATTERN.match(value):
+                self.params.append(value)
+                if op in ('=', '!='):
+                    return f"date({column}) {_COMPARE_OPS[op]} ?"
+                return f"{column} {_COMPARE_OPS[op]} ?"
+            raise FilterSyntaxError(f"时间取值应为时长（如 30d）或日期（如 2024-01-01）: {term}")
+
+        if field == 'name':
+            return self.compile_name(value)
+
+        raise FilterSyntaxError(f"不支持的筛选字段: {field}")
+
+def compile_filter(expr: str) -> Tuple[str, List[Any]]:
+    """
+    将筛选表达式编译为 SQL 条件和参数
+    返回: (sql, params)，空表达式返回 ("", [])；语法错误抛出 FilterSyntaxError
+    """
+    if not expr or not expr.strip():
+        return "", []
+    if len(expr) > MAX_FILTER_LENGTH:
+        raise FilterSyntaxError("筛选表达式过长")
+
+    parser = _Parser(_tokenize(expr))
+    sql = parser.parse()
+    return sql, parser.params
@@ -0,0 +1,60 @@
+"""
+基准测试公共部分：临时数据目录、导入指定目录下的后端模块、统计 SQLite 连接数
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def make_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--backend', type=Path, default=BACKEND_DIR,
+                        help='被测的 backend 目录（对比改动前的版本时指向旧版本的检出目录）')
+    return parser
+
+
+def load_database(backend: Path):
+    """在临时数据目录中导入并初始化 backend/database.py"""
+    os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='artist-manager-bench-')
+    sys.path.insert(0, str(backend.resolve()))
+    import database
+    database.init_db()
+    return database
+
+
+class ConnectCounter:
+    """替换 sqlite3.connect，统计打开的连接数"""
+
+    def __init__(self):
+        self.count = 0
+        self._connect = sqlite3.connect
+
+    def __enter__(self):
+        def counting_connect(*args, **kwargs):
+            self.count += 1
+            return self._connect(*args, **kwargs)
+        sqlite3.connect = counting_connect
+        return self
+
+    def __exit__(self, *exc):
+        sqlite3.connect = self._connect
+
+
+@contextmanager
+def timed(label: str, counter: ConnectCounter = None):
+    """打印代码块的耗时（以及期间打开的连接数）"""
+    before = counter.count if counter else 0
+    start = time.perf_counter()
+    yield
+    elapsed = (time.perf_counter() - start) * 1000
+    if counter:
+        print(f"{label:<28} {counter.count - before:>7} connections {elapsed:>9.0f} ms")
+    else:
+        print(f"{label}: {elapsed:.0f} ms")
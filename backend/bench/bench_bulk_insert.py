@@ -0,0 +1,61 @@
+"""
+批量导入的基准测试：batch_create_artists 写入大量画师的耗时
+
+运行（在 backend 目录）:
+    python bench/bench_bulk_insert.py --artists 50000 --chunk 1000
+
+改动前 JSON 导入每 100 个画师调用一次 batch_create_artists，对比时使用 --chunk 100:
+    git worktree add /tmp/before <commit>
+    python bench/bench_bulk_insert.py --backend /tmp/before/backend --chunk 100
+
+--core-only 删除全文搜索触发器并跳过模糊搜索索引，只测量画师和分类关联的写入
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from _common import load_database, make_parser, timed
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--artists', type=int, default=50000)
+    parser.add_argument('--chunk', type=int, default=1000, help='每次调用 batch_create_artists 的画师数')
+    parser.add_argument('--core-only', action='store_true')
+    args = parser.parse_args()
+
+    database = load_database(args.backend)
+
+    if args.core_only:
+        with database.get_db() as conn:
+            triggers = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'artists_fts_%'")]
+            for name in triggers:
+                conn.execute(f"DROP TRIGGER {name}")
+        for name in ('_refresh_name_indexes', '_write_fuzzy_index'):
+            if hasattr(database, name):
+                setattr(database, name, lambda *args, **kwargs: None)
+
+    category_id = database.create_category('bench_category')
+    artists = [{
+        'category_ids': [category_id],
+        'name_noob': f"bench_artist_{i}",
+        'name_nai': f"artist:bench artist {i}",
+        'danbooru_link': f"https://danbooru.donmai.us/posts?tags=bench_artist_{i}",
+        'post_count': i % 5000,
+        'notes': '',
+        'skip_danbooru': False,
+    } for i in range(args.artists)]
+
+    label = f"{args.artists} artists, chunk {args.chunk}" + (' (core only)' if args.core_only else '')
+    with timed(label):
+        for i in range(0, len(artists), args.chunk):
+            database.batch_create_artists(artists[i:i + args.chunk])
+
+    with database.get_db() as conn:
+        count = conn.execute("SELECT COUNT(*) FROM artists").fetchone()[0]
+    print(f"artists in database: {count}")
+
+
+if __name__ == '__main__':
+    main()
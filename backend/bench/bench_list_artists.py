@@ -0,0 +1,53 @@
+"""
+画师列表查询的基准测试：统计 get_all_artists / get_artists_by_category 打开的连接数和耗时
+
+运行（在 backend 目录）:
+    python bench/bench_list_artists.py --artists 20000 --categories-per-artist 2
+
+与改动前的版本对比:
+    git worktree add /tmp/before <commit>
+    python bench/bench_list_artists.py --backend /tmp/before/backend
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from _common import ConnectCounter, load_database, make_parser, timed
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument('--artists', type=int, default=20000)
+    parser.add_argument('--categories', type=int, default=20, help='分类数量')
+    parser.add_argument('--categories-per-artist', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=3, help='每项查询的执行次数')
+    args = parser.parse_args()
+
+    database = load_database(args.backend)
+
+    category_ids = [database.create_category(f"bench_category_{i}") for i in range(args.categories)]
+    per_artist = min(args.categories_per_artist, len(category_ids))
+    database.batch_create_artists([{
+        'category_ids': [category_ids[(i + j) % len(category_ids)] for j in range(per_artist)],
+        'name_noob': f"bench_artist_{i}",
+        'name_nai': f"artist:bench artist {i}",
+        'danbooru_link': f"https://danbooru.donmai.us/posts?tags=bench_artist_{i}",
+        'post_count': i % 5000,
+    } for i in range(args.artists)])
+    print(f"{args.artists} artists, {args.categories} categories, {per_artist} categories per artist")
+
+    # 每次查询前关闭线程复用的连接，连接数与单个请求中打开的连接数一致
+    close_db = getattr(database, 'close_db', lambda: None)
+    with ConnectCounter() as counter:
+        for _ in range(args.repeat):
+            close_db()
+            with timed('get_all_artists', counter):
+                database.get_all_artists()
+        for _ in range(args.repeat):
+            close_db()
+            with timed('get_artists_by_category', counter):
+                database.get_artists_by_category(category_ids[0])
+
+
+if __name__ == '__main__':
+    main()
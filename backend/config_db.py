@@ -4,6 +4,7 @@
 """
 import sqlite3
 import secrets
+import threading
 import hashlib
 import os
 from contextlib import contextmanager
@@ -24,25 +25,75 @@ def hash_password(password: str, salt: str) -> str:
     return hashlib.sha256((password + salt).encode()).hexdigest()
 
 
+# 连接参数
+CONFIG_DB_BUSY_TIMEOUT_MS = 5000
+CONFIG_DB_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {CONFIG_DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA foreign_keys = ON",
+)
+
+# 每个线程复用一个连接（Flask 请求结束时由 close_config_db 关闭）
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """创建新连接并应用 PRAGMA 配置"""
+    conn = sqlite3.connect(CONFIG_DATABASE_PATH, timeout=CONFIG_DB_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    for pragma in CONFIG_DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
 @contextmanager
 def get_config_db():
-    """获取配置数据库连接的上下文管理器"""
-    conn = sqlite3.connect(CONFIG_DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """
+    获取配置数据库连接的上下文管理器
+    同一线程内复用连接；嵌套调用共享外层事务，仅最外层提交或回滚
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+        _local.depth = 0
+
+    _local.depth += 1
     try:
         yield conn
-        conn.commit()
+        if _local.depth == 1:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if _local.depth == 1:
+            conn.rollback()
         raise
     finally:
+        _local.depth -= 1
+
+
+def close_config_db():
+    """关闭当前线程缓存的配置数据库连接"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and not getattr(_local, 'depth', 0):
+        _local.conn = None
         conn.close()
 
 
+# 配置数据库结构版本（PRAGMA user_version）
+CONFIG_SCHEMA_VERSION = 1
+
+
 def init_config_db():
-    """初始化配置数据库表结构"""
+    """
+    初始化配置数据库表结构
+    通过 PRAGMA user_version 记录结构版本，已是最新版本时只读取一个整数即返回
+    """
     with get_config_db() as conn:
         cursor = conn.cursor()
+        current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if current_version >= CONFIG_SCHEMA_VERSION:
+            return
 
         # 创建管理员账号表
         cursor.execute("""
@@ -68,23 +119,28 @@ def init_config_db():
             )
         """)
 
-        # 检查是否已有配置，如果没有则创建默认配置
-        cursor.execute("SELECT id FROM admin_config WHERE id = 1")
-        if not cursor.fetchone():
-            # 生成随机盐值和密钥
-            salt = secrets.token_hex(16)
-            secret_key = secrets.token_hex(32)
-            password_hash = hash_password(DEFAULT_ADMIN_PASSWORD, salt)
+        _ensure_default_admin(cursor)
 
-            cursor.execute("""
-                INSERT INTO admin_config (id, username, password_hash, password_salt, secret_key)
-                VALUES (1, ?, ?, ?, ?)
-            """, (DEFAULT_ADMIN_USERNAME, password_hash, salt, secret_key))
+        cursor.execute(f"PRAGMA user_version = {CONFIG_SCHEMA_VERSION}")
+        conn.commit()
 
-            print(f"配置数据库初始化成功，默认用户名: {DEFAULT_ADMIN_USERNAME}")
-            print("请登录后修改默认密码！")
 
-        conn.commit()
+def _ensure_default_admin(cursor):
+    """检查是否已有配置，如果没有则创建默认管理员账号"""
+    cursor.execute("SELECT id FROM admin_config WHERE id = 1")
+    if not cursor.fetchone():
+        # 生成随机盐值和密钥
+        salt = secrets.token_hex(16)
+        secret_key = secrets.token_hex(32)
+        password_hash = hash_password(DEFAULT_ADMIN_PASSWORD, salt)
+
+        cursor.execute("""
+            INSERT INTO admin_config (id, username, password_hash, password_salt, secret_key)
+            VALUES (1, ?, ?, ?, ?)
+        """, (DEFAULT_ADMIN_USERNAME, password_hash, salt, secret_key))
+
+        print(f"配置数据库初始化成功，默认用户名: {DEFAULT_ADMIN_USERNAME}")
+        print("请登录后修改默认密码！")
 
 
 def get_admin_config() -> Optional[Dict[str, Any]]:
@@ -103,8 +159,9 @@ def get_secret_key() -> str:
     config = get_admin_config()
     if config:
         return config['secret_key']
-    # 如果没有配置，先初始化
-    init_config_db()
+    # 如果没有配置，先创建默认账号
+    with get_config_db() as conn:
+        _ensure_default_admin(conn.cursor())
     config = get_admin_config()
     return config['secret_key']
 
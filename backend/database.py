@@ -1,138 +1,762 @@
 """
 数据库模型和初始化
 """
+import atexit
+import logging
 import sqlite3
+import threading
+import time
 import uuid
 import os
+import json
+import base64
 from contextlib import contextmanager
 from typing import Optional, List, Dict, Any
 from pathlib import Path
 
+from utils import (
+    artist_identity_key, artist_identity_from_fields, artist_link_key, artist_field_keys, parse_prompt_artists
+)
+
 # 数据库文件路径（支持通过环境变量配置，默认为 backend 目录）
 DATA_DIR = Path(os.environ.get('DATA_DIR', Path(__file__).parent))
 DATABASE_PATH = DATA_DIR / "artists.db"
 
+# 连接参数：WAL 模式允许 SSE 任务写入时前端继续读取
+DB_BUSY_TIMEOUT_MS = 5000
+DB_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -16000",
+)
+
+# "待补全"判定（与前端 incomplete 筛选规则一致）：
+# 跳过 Danbooru 的画师只要求有图，其余画师需要图片、作品数和链接齐全
+def _incomplete_sql(ref: str) -> str:
+    """
+    生成"待补全"判定的 SQL 表达式（结果为 0/1）
+    ref 为画师表别名（如 a、new、old），为空时不加前缀（用于部分索引）
+    """
+    p = f"{ref}." if ref else ""
+    return f"""
+    (CASE WHEN IFNULL({p}skip_danbooru, 0) != 0
+          THEN IFNULL({p}image_example, '') = ''
+          ELSE IFNULL({p}image_example, '') = ''
+               OR IFNULL({p}post_count, 0) <= 0
+               OR IFNULL({p}danbooru_link, '') = ''
+     END)
+"""
+
+INCOMPLETE_CONDITION = _incomplete_sql('a')
+
+# "需要获取作品数据"判定（一键补全第二阶段）：未跳过、有链接，且缺少作品数或示例图
+def _needs_enrichment_sql(ref: str) -> str:
+    """生成"需要获取作品数据"判定的 SQL 表达式，ref 规则同 _incomplete_sql"""
+    p = f"{ref}." if ref else ""
+    return f"""
+    (IFNULL({p}skip_danbooru, 0) = 0
+     AND IFNULL({p}danbooru_link, '') != ''
+     AND (IFNULL({p}post_count, 0) <= 0 OR IFNULL({p}image_example, '') = ''))
+"""
+
+NEEDS_ENRICHMENT_CONDITION = _needs_enrichment_sql('a')
+
+# 分页排序方式: sort -> (排序键表达式, 是否降序)
+ARTIST_SORTS = {
+    'count_desc': ("IFNULL(a.post_count, 0)", True),
+    'count_asc': ("IFNULL(a.post_count, 0)", False),
+    'date_desc': ("a.created_at", True),
+    'date_asc': ("a.created_at", False),
+}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# 批量导入时每次提交的画师数量
+BULK_INSERT_BATCH_SIZE = 1000
+
+# 每个线程复用一个连接（Flask 请求结束时由 close_db 关闭）
+_local = threading.local()
+
+def _connect() -> sqlite3.Connection:
+    """创建新连接并应用 PRAGMA 配置"""
+    conn = sqlite3.connect(DATABASE_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
 @contextmanager
 def get_db():
-    """获取数据库连接的上下文管理器"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """
+    获取数据库连接的上下文管理器
+    同一线程内复用连接；嵌套调用共享外层事务，仅最外层提交或回滚
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+        _local.depth = 0
+
+    if _local.depth == 0:
+        _local.changes_before = conn.total_changes
+
+    _local.depth += 1
     try:
         yield conn
-        conn.commit()
+        if _local.depth == 1:
+            # 有写入时递增数据版本（用于列表缓存和 ETag 校验，跨进程可见）
+            if conn.total_changes != _local.changes_before:
+                conn.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'data_version'")
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if _local.depth == 1:
+            conn.rollback()
         raise
     finally:
+        _local.depth -= 1
+
+def get_data_version() -> int:
+    """获取当前数据版本号（任何写入提交后都会递增）"""
+    with get_db() as conn:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = 'data_version'").fetchone()
+        return row[0] if row else 0
+
+def close_db():
+    """关闭当前线程缓存的数据库连接"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and not getattr(_local, 'depth', 0):
+        _local.conn = None
         conn.close()
 
 def init_db():
-    """初始化数据库表结构"""
+    """
+    初始化数据库表结构
+    通过 PRAGMA user_version 记录结构版本，已是最新版本时只读取一个整数即返回
+    """
     with get_db() as conn:
         cursor = conn.cursor()
+        current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if current_version >= SCHEMA_VERSION:
+            return
+
+        # sqlite3 模块不会为 DDL 自动开启事务，每个迁移连同版本号显式放在同一事务中，
+        # 中途失败时整体回滚，下次启动从该版本重新执行
+        if conn.in_transaction:
+            conn.commit()
+        for version, migrate in MIGRATIONS:
+            if version > current_version:
+                cursor.execute("BEGIN")
+                try:
+                    migrate(cursor)
+                    cursor.execute(f"PRAGMA user_version = {version}")
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+                print(f"数据库结构已升级到版本 {version}")
 
-        # 创建分类表
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                display_order INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+        print("数据库初始化成功")
 
-        # 创建画师表（新版本：无 category_id 字段）
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS artists (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                uuid TEXT UNIQUE,
-                name_noob TEXT,
-                name_nai TEXT,
-                danbooru_link TEXT,
-                post_count INTEGER,
-                notes TEXT,
-                image_example TEXT,
-                skip_danbooru INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+def _migrate_v1(cursor):
+    """
+    版本 1：基础表结构、索引和搜索索引
+    兼容引入版本号之前创建的数据库（按需补齐字段）
+    """
+    # 创建元数据表（保存数据版本号等全局状态）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO app_meta (key, value) VALUES ('data_version', 0)")
+
+    # 创建分类表
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            display_order INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 创建画师表（新版本：无 category_id 字段）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS artists (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uuid TEXT UNIQUE,
+            name_noob TEXT,
+            name_nai TEXT,
+            danbooru_link TEXT,
+            post_count INTEGER,
+            notes TEXT,
+            image_example TEXT,
+            skip_danbooru INTEGER DEFAULT 0,
+            identity_key TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 添加 skip_danbooru 字段（如果表已存在但没有此字段）
+    try:
+        cursor.execute("SELECT skip_danbooru FROM artists LIMIT 1")
+    except sqlite3.OperationalError:
+        cursor.execute("ALTER TABLE artists ADD COLUMN skip_danbooru INTEGER DEFAULT 0")
+        print("已添加 skip_danbooru 字段到 artists 表")
+
+    # 添加 uuid 字段（如果表已存在但没有此字段）
+    try:
+        cursor.execute("SELECT uuid FROM artists LIMIT 1")
+    except sqlite3.OperationalError:
+        # SQLite 不支持在 ADD COLUMN 中使用 UNIQUE 约束（除非是空表），所以先添加普通列
+        cursor.execute("ALTER TABLE artists ADD COLUMN uuid TEXT")
+
+        # 创建唯一索引
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_artists_uuid ON artists(uuid)")
+        print("已添加 uuid 字段到 artists 表并更新现有记录")
+
+    # 为现有记录生成 UUID4（单条语句批量生成）
+    cursor.execute("""
+        UPDATE artists
+        SET uuid = lower(
+            hex(randomblob(4)) || '-' || hex(randomblob(2)) || '-4' ||
+            substr(hex(randomblob(2)), 2) || '-' ||
+            substr('89ab', 1 + (abs(random()) % 4), 1) || substr(hex(randomblob(2)), 2) || '-' ||
+            hex(randomblob(6))
+        )
+        WHERE uuid IS NULL
+    """)
+
+    # 添加 identity_key 字段（规范化身份键，用于去重）
+    try:
+        cursor.execute("SELECT identity_key FROM artists LIMIT 1")
+    except sqlite3.OperationalError:
+        cursor.execute("ALTER TABLE artists ADD COLUMN identity_key TEXT")
+        cursor.execute("SELECT id, name_noob, name_nai, danbooru_link FROM artists")
+        cursor.executemany(
+            "UPDATE artists SET identity_key = ? WHERE id = ?",
+            [(artist_identity_from_fields(row['name_noob'], row['name_nai'], row['danbooru_link']) or None, row['id'])
+             for row in cursor.fetchall()]
+        )
+        print("已添加 identity_key 字段到 artists 表并更新现有记录")
+
+    # 身份键索引（已有库中可能存在重复画师，因此不设为唯一索引）
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_artists_identity_key
+        ON artists(identity_key)
+    """)
+
+    # 创建画师-分类关联表（多对多）
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS artist_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            artist_id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (artist_id) REFERENCES artists(id) ON DELETE CASCADE,
+            FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE,
+            UNIQUE(artist_id, category_id)
+        )
+    """)
+
+    # 创建索引
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_artist_categories_artist
+        ON artist_categories(artist_id)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_artist_categories_category
+        ON artist_categories(category_id)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_artists_post_count
+        ON artists(post_count DESC)
+    """)
+
+    # 分页排序索引（键集分页，作品数为空时按 0 排序）
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_artists_post_count_id
+        ON artists(IFNULL(post_count, 0), id)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_artists_created_at_id
+        ON artists(created_at, id)
+    """)
+
+    # 创建画师串表 (用于保存常用的画师组合)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS artist_presets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            noob_text TEXT DEFAULT '',
+            nai_text TEXT DEFAULT '',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # 创建全文搜索索引
+    _init_search_index(cursor)
+
+    # 创建模糊匹配索引
+    _init_fuzzy_index(cursor)
+
+    # 确保有"未分类"选项（name 唯一索引）
+    cursor.execute("INSERT OR IGNORE INTO categories (name) VALUES ('未分类')")
+
+def _add_column_if_missing(cursor, table: str, column: str, definition: str):
+    """表中没有该列时才添加（兼容此前未在事务中执行、只完成了一半的迁移）"""
+    columns = {row['name'] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _migrate_v2(cursor):
+    """版本 2：分类统计计数列（由触发器维护）"""
+    for column in ('artist_count', 'total_post_count', 'max_post_count', 'incomplete_count'):
+        _add_column_if_missing(cursor, 'categories', column, "INTEGER NOT NULL DEFAULT 0")
+
+    _create_category_stats_triggers(cursor)
+    _rebuild_category_stats(cursor)
+
+def _migrate_v3(cursor):
+    """版本 3：增量同步变更日志（记录画师/分类的最后变更版本与删除墓碑）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS change_log (
+            kind TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, item_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_version ON change_log(kind, version)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_artists_updated_at ON artists(updated_at)")
+    _create_change_log_triggers(cursor)
+
+def _migrate_v4(cursor):
+    """版本 4：画师串条目表（按画师反查画师串）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS artist_preset_items (
+            preset_id INTEGER NOT NULL,
+            field TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            artist_id INTEGER,
+            weight REAL NOT NULL DEFAULT 1.0,
+            raw_token TEXT NOT NULL,
+            name TEXT NOT NULL,
+            identity_key TEXT NOT NULL,
+            PRIMARY KEY (preset_id, field, position),
+            FOREIGN KEY (preset_id) REFERENCES artist_presets(id) ON DELETE CASCADE,
+            FOREIGN KEY (artist_id) REFERENCES artists(id) ON DELETE SET NULL
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_preset_items_artist ON artist_preset_items(artist_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_preset_items_identity_key ON artist_preset_items(identity_key)")
+
+    # 新建画师或画师身份键变化时，关联此前未匹配的条目；已关联的条目跟随画师（重命名后仍指向同一画师）
+    for name, event in (('artists_preset_items_insert', "AFTER INSERT ON artists"),
+                        ('artists_preset_items_rename', "AFTER UPDATE OF identity_key ON artists")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name} {event}
+            WHEN new.identity_key IS NOT NULL BEGIN
+                UPDATE artist_preset_items SET artist_id = new.id
+                WHERE artist_id IS NULL AND identity_key = new.identity_key;
+            END
         """)
+    # 删除画师（如合并重复项）时，条目改为指向同身份键的其他画师
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS artists_preset_items_delete
+        BEFORE DELETE ON artists BEGIN
+            UPDATE artist_preset_items SET artist_id = (
+                SELECT MIN(a.id) FROM artists a
+                WHERE a.identity_key = artist_preset_items.identity_key AND a.id != old.id
+            )
+            WHERE artist_id = old.id;
+        END
+    """)
+
+    cursor.execute("SELECT id, noob_text, nai_text FROM artist_presets")
+    presets = cursor.fetchall()
+    for preset in presets:
+        write_preset_items(cursor, preset['id'], preset['noob_text'], preset['nai_text'])
+    if presets:
+        print(f"已为 {len(presets)} 个画师串建立条目索引")
+
+def _migrate_v5(cursor):
+    """
+    版本 5：待补全 / 需要获取作品数据的部分索引
+    查询条件需与 INCOMPLETE_CONDITION / NEEDS_ENRICHMENT_CONDITION 完全一致才会使用这些索引
+    """
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_artists_incomplete ON artists(id) WHERE {_incomplete_sql('')}")
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_artists_needs_enrichment
+        ON artists(id) WHERE {_needs_enrichment_sql('')}
+    """)
 
-        # 添加 skip_danbooru 字段（如果表已存在但没有此字段）
-        try:
-            cursor.execute("SELECT skip_danbooru FROM artists LIMIT 1")
-        except sqlite3.OperationalError:
-            cursor.execute("ALTER TABLE artists ADD COLUMN skip_danbooru INTEGER DEFAULT 0")
-            print("已添加 skip_danbooru 字段到 artists 表")
+def _migrate_v6(cursor):
+    """
+    版本 6：作品数据的获取记录（定时刷新按陈旧程度挑选画师）
+    last_fetched_at 为最近一次尝试获取的时间，fetch_status 为其结果；已有画师保持为空，视为最陈旧
+    """
+    _add_column_if_missing(cursor, 'artists', 'last_fetched_at', "TIMESTAMP")
+    _add_column_if_missing(cursor, 'artists', 'fetch_status', "TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_artists_last_fetched_at ON artists(last_fetched_at)")
 
-        # 添加 uuid 字段（如果表已存在但没有此字段）
-        try:
-            cursor.execute("SELECT uuid FROM artists LIMIT 1")
-        except sqlite3.OperationalError:
-            # SQLite 不支持在 ADD COLUMN 中使用 UNIQUE 约束（除非是空表），所以先添加普通列
-            cursor.execute("ALTER TABLE artists ADD COLUMN uuid TEXT")
-            
-            # 为现有记录生成UUID
-            import uuid
-            cursor.execute("SELECT id FROM artists WHERE uuid IS NULL")
-            rows = cursor.fetchall()
-            for row in rows:
-                new_uuid = str(uuid.uuid4())
-                cursor.execute("UPDATE artists SET uuid = ? WHERE id = ?", (new_uuid, row['id']))
-            
-            # 创建唯一索引
-            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_artists_uuid ON artists(uuid)")
-            print("已添加 uuid 字段到 artists 表并更新现有记录")
-
-        # 创建画师-分类关联表（多对多）
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS artist_categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                artist_id INTEGER NOT NULL,
-                category_id INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (artist_id) REFERENCES artists(id) ON DELETE CASCADE,
-                FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE CASCADE,
-                UNIQUE(artist_id, category_id)
+def _migrate_v7(cursor):
+    """
+    版本 7：按字段分别保存的身份键（NOOB 名称、NAI 名称、链接标签）及其索引
+    identity_key 只取第一个非空字段，查重需比较每个字段，才能匹配只有 NAI 名称或链接相同的画师
+    """
+    for column in ARTIST_KEY_COLUMNS:
+        _add_column_if_missing(cursor, 'artists', column, "TEXT")
+
+    cursor.execute("SELECT id, name_noob, name_nai, danbooru_link FROM artists")
+    rows = cursor.fetchall()
+    cursor.executemany(
+        "UPDATE artists SET noob_key = ?, nai_key = ?, link_key = ? WHERE id = ?",
+        [(*_artist_field_key_values(row['name_noob'], row['name_nai'], row['danbooru_link']), row['id'])
+         for row in rows]
+    )
+    for column in ARTIST_KEY_COLUMNS:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_artists_{column} ON artists({column})")
+    if rows:
+        print(f"已为 {len(rows)} 个画师生成按字段的身份键")
+
+def _migrate_v8(cursor):
+    """
+    版本 8：画师身份键变化时，已关联的条目同步新的名称和身份键
+    （版本 4 的触发器只关联未匹配的条目，已关联条目保留旧名称，重新保存画师串时会与画师断开）
+    画师串的 noob_text / nai_text 是用户输入的原文，不随画师改名改写
+    """
+    # 条目名称与身份键同源（NOOB 名称优先，其次 NAI 名称），按搜索索引的名称规范化规则清洗；
+    # 链接生成的身份键没有对应名称，保留原名称
+    def field_name(column):
+        return f"TRIM({_search_name_sql(f'new.{column}')})"
+
+    cursor.execute("DROP TRIGGER IF EXISTS artists_preset_items_rename")
+    cursor.execute(f"""
+        CREATE TRIGGER artists_preset_items_rename AFTER UPDATE OF identity_key ON artists
+        WHEN new.identity_key IS NOT NULL BEGIN
+            UPDATE artist_preset_items SET
+                identity_key = new.identity_key,
+                name = CASE
+                    WHEN {field_name('name_noob')} != '' THEN {field_name('name_noob')}
+                    WHEN {field_name('name_nai')} != '' THEN {field_name('name_nai')}
+                    ELSE name
+                END
+            WHERE artist_id = new.id AND identity_key != new.identity_key;
+            UPDATE artist_preset_items SET artist_id = new.id
+            WHERE artist_id IS NULL AND identity_key = new.identity_key;
+        END
+    """)
+
+# 结构迁移列表: (版本号, 迁移函数)，按版本号递增追加
+MIGRATIONS = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+    (5, _migrate_v5),
+    (6, _migrate_v6),
+    (7, _migrate_v7),
+    (8, _migrate_v8),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def _category_max_post_count_sql(category_ref: str) -> str:
+    """重新计算分类内最大作品数的子查询"""
+    return f"""(
+        SELECT IFNULL(MAX(IFNULL(a.post_count, 0)), 0)
+        FROM artist_categories ac
+        JOIN artists a ON a.id = ac.artist_id
+        WHERE ac.category_id = {category_ref}
+    )"""
+
+def _create_category_stats_triggers(cursor):
+    """
+    创建维护分类统计列的触发器：
+    artist_count / total_post_count / max_post_count / incomplete_count
+    计数和总和增量更新；最大值仅在当前最大值画师减少或移出时重新计算
+    """
+    # 删除画师前先删除其分类关联，使关联触发器仍能读取画师的作品数等字段
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS artists_category_stats_delete
+        BEFORE DELETE ON artists BEGIN
+            DELETE FROM artist_categories WHERE artist_id = old.id;
+        END
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS artist_categories_stats_insert
+        AFTER INSERT ON artist_categories BEGIN
+            UPDATE categories SET
+                artist_count = artist_count + 1,
+                total_post_count = total_post_count + IFNULL(
+                    (SELECT IFNULL(a.post_count, 0) FROM artists a WHERE a.id = new.artist_id), 0),
+                max_post_count = MAX(max_post_count, IFNULL(
+                    (SELECT IFNULL(a.post_count, 0) FROM artists a WHERE a.id = new.artist_id), 0)),
+                incomplete_count = incomplete_count + IFNULL(
+                    (SELECT {_incomplete_sql('a')} FROM artists a WHERE a.id = new.artist_id), 0)
+            WHERE id = new.category_id;
+        END
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS artist_categories_stats_delete
+        AFTER DELETE ON artist_categories BEGIN
+            UPDATE categories SET
+                artist_count = artist_count - 1,
+                total_post_count = total_post_count - IFNULL(
+                    (SELECT IFNULL(a.post_count, 0) FROM artists a WHERE a.id = old.artist_id), 0),
+                incomplete_count = incomplete_count - IFNULL(
+                    (SELECT {_incomplete_sql('a')} FROM artists a WHERE a.id = old.artist_id), 0),
+                max_post_count = CASE
+                    WHEN IFNULL((SELECT IFNULL(a.post_count, 0) FROM artists a WHERE a.id = old.artist_id), 0)
+                         >= max_post_count
+                    THEN {_category_max_post_count_sql('categories.id')}
+                    ELSE max_post_count
+                END
+            WHERE id = old.category_id;
+        END
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS artists_category_stats_update
+        AFTER UPDATE OF post_count, image_example, skip_danbooru, danbooru_link ON artists
+        BEGIN
+            UPDATE categories SET
+                total_post_count = total_post_count
+                    + IFNULL(new.post_count, 0) - IFNULL(old.post_count, 0),
+                incomplete_count = incomplete_count
+                    + {_incomplete_sql('new')} - {_incomplete_sql('old')},
+                max_post_count = CASE
+                    WHEN IFNULL(new.post_count, 0) >= max_post_count THEN IFNULL(new.post_count, 0)
+                    WHEN IFNULL(old.post_count, 0) >= max_post_count
+                    THEN {_category_max_post_count_sql('categories.id')}
+                    ELSE max_post_count
+                END
+            WHERE id IN (SELECT category_id FROM artist_categories WHERE artist_id = new.id);
+        END
+    """)
+
+def _rebuild_category_stats(cursor):
+    """全量重新计算所有分类的统计列"""
+    cursor.execute(f"""
+        UPDATE categories SET
+            (artist_count, total_post_count, max_post_count, incomplete_count) = (
+                SELECT COUNT(*),
+                       IFNULL(SUM(IFNULL(a.post_count, 0)), 0),
+                       IFNULL(MAX(IFNULL(a.post_count, 0)), 0),
+                       IFNULL(SUM({_incomplete_sql('a')}), 0)
+                FROM artist_categories ac
+                JOIN artists a ON a.id = ac.artist_id
+                WHERE ac.category_id = categories.id
             )
-        """)
+    """)
 
-        # 创建索引
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_artist_categories_artist
-            ON artist_categories(artist_id)
-        """)
+def rebuild_category_stats() -> int:
+    """重建分类统计列（管理命令），返回分类数量"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        _rebuild_category_stats(cursor)
+        return cursor.rowcount
 
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_artist_categories_category
-            ON artist_categories(category_id)
-        """)
+# 当前写事务提交后的数据版本号（get_db 在提交时将 data_version 加一）
+_PENDING_VERSION_SQL = "(SELECT value FROM app_meta WHERE key = 'data_version') + 1"
 
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_artists_post_count
-            ON artists(post_count DESC)
-        """)
+def _change_log_sql(kind: str, item_ref: str, deleted: int = 0) -> str:
+    """生成写入变更日志的语句（同一项只保留最后一次变更）"""
+    return f"""
+        INSERT OR REPLACE INTO change_log (kind, item_id, version, deleted)
+        VALUES ('{kind}', {item_ref}, {_PENDING_VERSION_SQL}, {deleted});
+    """
+
+def _create_change_log_triggers(cursor):
+    """
+    创建维护变更日志的触发器
+    画师的字段修改和分类关联变化都记为画师变更；删除时写入墓碑
+    """
+    triggers = {
+        'artists_change_insert': ("AFTER INSERT ON artists", _change_log_sql('artist', 'new.id')),
+        'artists_change_update': ("AFTER UPDATE ON artists", _change_log_sql('artist', 'new.id')),
+        'artists_change_delete': ("AFTER DELETE ON artists", _change_log_sql('artist', 'old.id', 1)),
+        'artist_categories_change_insert': (
+            "AFTER INSERT ON artist_categories", _change_log_sql('artist', 'new.artist_id')),
+        # 画师删除时先删除关联，墓碑由随后的 artists_change_delete 覆盖
+        'artist_categories_change_delete': (
+            "AFTER DELETE ON artist_categories", _change_log_sql('artist', 'old.artist_id')),
+        'categories_change_insert': ("AFTER INSERT ON categories", _change_log_sql('category', 'new.id')),
+        'categories_change_update': ("AFTER UPDATE ON categories", _change_log_sql('category', 'new.id')),
+        'categories_change_delete': ("AFTER DELETE ON categories", _change_log_sql('category', 'old.id', 1)),
+    }
+    for name, (event, body) in triggers.items():
+        cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+def _search_name_sql(column: str) -> str:
+    """
+    生成名称规范化的 SQL 表达式（与 clean_artist_name 规则一致）：
+    去除 artist: 前缀、还原括号转义、下划线转空格
+    """
+    value = f"IFNULL({column}, '')"
+    value = f"CASE WHEN {value} LIKE 'artist:%' THEN substr({value}, 8) ELSE {value} END"
+    return f"replace(replace(replace({value}, '\\(', '('), '\\)', ')'), '_', ' ')"
 
-        # 创建画师串表 (用于保存常用的画师组合)
+def _init_search_index(cursor):
+    """
+    创建 FTS5 全文搜索表及同步触发器
+    使用 trigram 分词以支持子串匹配（与前端 includes 搜索行为一致，并支持中文备注）
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'artists_fts'")
+    if cursor.fetchone():
+        return
+
+    try:
         cursor.execute("""
-            CREATE TABLE IF NOT EXISTS artist_presets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT,
-                noob_text TEXT DEFAULT '',
-                nai_text TEXT DEFAULT '',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            CREATE VIRTUAL TABLE artists_fts USING fts5(
+                name_noob, name_nai, notes,
+                tokenize = 'trigram'
             )
         """)
+    except sqlite3.OperationalError as e:
+        print(f"当前 SQLite 不支持 FTS5 trigram，搜索将退化为 LIKE 查询: {e}")
+        return
+
+    def index_values(ref: str) -> str:
+        return f"{_search_name_sql(f'{ref}.name_noob')}, {_search_name_sql(f'{ref}.name_nai')}, IFNULL({ref}.notes, '')"
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS artists_fts_insert AFTER INSERT ON artists BEGIN
+            INSERT INTO artists_fts (rowid, name_noob, name_nai, notes)
+            VALUES (new.id, {index_values('new')});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS artists_fts_update
+        AFTER UPDATE OF name_noob, name_nai, notes ON artists BEGIN
+            DELETE FROM artists_fts WHERE rowid = old.id;
+            INSERT INTO artists_fts (rowid, name_noob, name_nai, notes)
+            VALUES (new.id, {index_values('new')});
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS artists_fts_delete AFTER DELETE ON artists BEGIN
+            DELETE FROM artists_fts WHERE rowid = old.id;
+        END
+    """)
+
+    # 为已有数据建立索引
+    cursor.execute(f"""
+        INSERT INTO artists_fts (rowid, name_noob, name_nai, notes)
+        SELECT a.id, {index_values('a')} FROM artists a
+    """)
+    print("已创建画师全文搜索索引")
+
+# 按字段分别保存的身份键列（与 name_noob、name_nai、danbooru_link 对应）
+ARTIST_KEY_COLUMNS = ('noob_key', 'nai_key', 'link_key')
+
+def _artist_field_key_values(name_noob: str, name_nai: str, danbooru_link: str) -> tuple:
+    """各字段的身份键（空值保存为 NULL，不参与匹配）"""
+    return (artist_identity_key(name_noob) or None,
+            artist_identity_key(name_nai) or None,
+            artist_link_key(danbooru_link) or None)
+
+def _fuzzy_key(name: str) -> str:
+    """生成模糊匹配键：身份键去除所有空白（与前端 compactForSearch 一致）"""
+    return artist_identity_key(name).replace(' ', '')
+
+def _trigrams(text: str) -> set:
+    """生成带首尾填充的三元组集合"""
+    if not text:
+        return set()
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _init_fuzzy_index(cursor):
+    """创建三元组倒排索引表，首次创建时为已有画师建立索引"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'artist_fuzzy_keys'")
+    if cursor.fetchone():
+        return
+
+    cursor.execute("""
+        CREATE TABLE artist_fuzzy_keys (
+            artist_id INTEGER PRIMARY KEY,
+            fuzzy_key TEXT NOT NULL,
+            trigram_count INTEGER NOT NULL,
+            FOREIGN KEY (artist_id) REFERENCES artists(id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE artist_trigrams (
+            trigram TEXT NOT NULL,
+            artist_id INTEGER NOT NULL,
+            PRIMARY KEY (trigram, artist_id),
+            FOREIGN KEY (artist_id) REFERENCES artists(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_artist_trigrams_artist
+        ON artist_trigrams(artist_id)
+    """)
+
+    cursor.execute("SELECT id FROM artists")
+    artist_ids = [row['id'] for row in cursor.fetchall()]
+    if artist_ids:
+        _refresh_name_indexes(cursor, artist_ids)
+        print(f"已为 {len(artist_ids)} 个画师建立模糊匹配索引")
+
+def _refresh_name_indexes(cursor, artist_ids: List[int]):
+    """按画师当前名称更新身份键并重建其三元组索引（增量更新）"""
+    for i in range(0, len(artist_ids), 500):
+        chunk = artist_ids[i:i + 500]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor.execute(f"DELETE FROM artist_trigrams WHERE artist_id IN ({placeholders})", chunk)
+        cursor.execute(f"DELETE FROM artist_fuzzy_keys WHERE artist_id IN ({placeholders})", chunk)
+        cursor.execute(f"""
+            SELECT id, name_noob, name_nai, danbooru_link
+            FROM artists WHERE id IN ({placeholders})
+        """, chunk)
+        rows = cursor.fetchall()
+
+        cursor.executemany(
+            "UPDATE artists SET identity_key = ?, noob_key = ?, nai_key = ?, link_key = ? WHERE id = ?",
+            [(artist_identity_from_fields(row['name_noob'], row['name_nai'], row['danbooru_link']) or None,
+              *_artist_field_key_values(row['name_noob'], row['name_nai'], row['danbooru_link']), row['id'])
+             for row in rows]
+        )
 
-        # 确保有"未分类"选项
-        cursor.execute("SELECT id FROM categories WHERE name = '未分类'")
-        if not cursor.fetchone():
-            cursor.execute("INSERT INTO categories (name) VALUES ('未分类')")
-
-        conn.commit()
-        print("数据库初始化成功")
+        _write_fuzzy_index(cursor, [(row['id'], row['name_noob'] or row['name_nai'] or '') for row in rows])
+
+def _write_fuzzy_index(cursor, entries: List[tuple]):
+    """写入三元组索引（调用方需保证这些画师的旧索引已清除）entries: [(artist_id, name), ...]"""
+    key_rows = []
+    trigram_rows = []
+    for artist_id, name in entries:
+        key = _fuzzy_key(name)
+        grams = _trigrams(key)
+        if not grams:
+            continue
+        key_rows.append((artist_id, key, len(grams)))
+        trigram_rows.extend((gram, artist_id) for gram in grams)
+
+    cursor.executemany(
+        "INSERT INTO artist_fuzzy_keys (artist_id, fuzzy_key, trigram_count) VALUES (?, ?, ?)",
+        key_rows
+    )
+    # 按主键顺序写入，减少 B 树页分裂
+    trigram_rows.sort()
+    cursor.executemany(
+        "INSERT INTO artist_trigrams (trigram, artist_id) VALUES (?, ?)",
+        trigram_rows
+    )
 
 def create_category(name: str) -> int:
     """创建新分类"""
@@ -155,16 +779,10 @@ def update_category(category_id: int, name: str) -> bool:
         return cursor.rowcount > 0
 
 def get_all_categories() -> List[Dict[str, Any]]:
-    """获取所有分类"""
+    """获取所有分类（统计列由触发器维护）"""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT c.*, COUNT(DISTINCT ac.artist_id) as artist_count
-            FROM categories c
-            LEFT JOIN artist_categories ac ON c.id = ac.category_id
-            GROUP BY c.id
-            ORDER BY c.id
-        """)
+        cursor.execute("SELECT * FROM categories ORDER BY id")
         return [dict(row) for row in cursor.fetchall()]
 
 def get_artist_categories(artist_id: int) -> List[Dict[str, Any]]:
@@ -180,6 +798,49 @@ def get_artist_categories(artist_id: int) -> List[Dict[str, Any]]:
         """, (artist_id,))
         return [dict(row) for row in cursor.fetchall()]
 
+def _load_artist_categories_map(cursor, artist_ids: Optional[List[int]] = None) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    批量加载画师的分类信息（避免逐个画师查询）
+    artist_ids 为 None 时加载全部关联
+    返回: {artist_id: [category_dict, ...]}
+    """
+    sql = """
+        SELECT ac.artist_id AS _artist_id, c.*
+        FROM artist_categories ac
+        JOIN categories c ON c.id = ac.category_id
+    """
+    rows = []
+    if artist_ids is None:
+        cursor.execute(sql + " ORDER BY ac.artist_id, c.id")
+        rows = cursor.fetchall()
+    else:
+        # 分块查询，避免超过 SQLite 参数数量上限
+        for i in range(0, len(artist_ids), 500):
+            chunk = artist_ids[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(sql + f" WHERE ac.artist_id IN ({placeholders}) ORDER BY ac.artist_id, c.id", chunk)
+            rows.extend(cursor.fetchall())
+
+    categories_map: Dict[int, List[Dict[str, Any]]] = {}
+    for row in rows:
+        category = dict(row)
+        artist_id = category.pop('_artist_id')
+        categories_map.setdefault(artist_id, []).append(category)
+    return categories_map
+
+def _attach_categories(artists: List[Dict[str, Any]], categories_map: Dict[int, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """为画师列表填充 categories / category_name / category_id 字段"""
+    for artist in artists:
+        artist['categories'] = categories_map.get(artist['id'], [])
+        # 保留 category_name 字段以兼容前端（显示所有分类）
+        if artist['categories']:
+            artist['category_name'] = ', '.join([c['name'] for c in artist['categories']])
+            artist['category_id'] = artist['categories'][0]['id']  # 兼容性字段
+        else:
+            artist['category_name'] = '未分类'
+            artist['category_id'] = None
+    return artists
+
 def set_artist_categories(artist_id: int, category_ids: List[int]) -> bool:
     """设置画师的分类（替换现有分类）"""
     with get_db() as conn:
@@ -246,6 +907,8 @@ def create_artist(category_ids: List[int], name_noob: str = "", name_nai: str =
                 VALUES (?, ?)
             """, (artist_id, category_id))
 
+        _refresh_name_indexes(cursor, [artist_id])
+
         return artist_id
 
 def get_artists_by_category(category_id: int, sort_by: str = "post_count") -> List[Dict[str, Any]]:
@@ -264,18 +927,9 @@ def get_artists_by_category(category_id: int, sort_by: str = "post_count") -> Li
 
         artists = [dict(row) for row in cursor.fetchall()]
 
-        # 为每个画师添加分类信息
-        for artist in artists:
-            artist['categories'] = get_artist_categories(artist['id'])
-            # 保留 category_name 字段以兼容前端（显示第一个分类）
-            if artist['categories']:
-                artist['category_name'] = ', '.join([c['name'] for c in artist['categories']])
-                artist['category_id'] = artist['categories'][0]['id']  # 兼容性字段
-            else:
-                artist['category_name'] = '未分类'
-                artist['category_id'] = None
-
-        return artists
+        # 一次性加载分类信息
+        categories_map = _load_artist_categories_map(cursor, [a['id'] for a in artists])
+        return _attach_categories(artists, categories_map)
 
 def get_all_artists() -> List[Dict[str, Any]]:
     """获取所有画师（支持多分类）"""
@@ -288,18 +942,374 @@ def get_all_artists() -> List[Dict[str, Any]]:
 
         artists = [dict(row) for row in cursor.fetchall()]
 
-        # 为每个画师添加分类信息
-        for artist in artists:
-            artist['categories'] = get_artist_categories(artist['id'])
-            # 保留 category_name 字段以兼容前端（显示所有分类）
-            if artist['categories']:
-                artist['category_name'] = ', '.join([c['name'] for c in artist['categories']])
-                artist['category_id'] = artist['categories'][0]['id']  # 兼容性字段
+        # 一次性加载全部分类关联
+        categories_map = _load_artist_categories_map(cursor)
+        return _attach_categories(artists, categories_map)
+
+def _encode_cursor(sort_value: Any, artist_id: int) -> str:
+    """将分页位置编码为不透明游标"""
+    raw = json.dumps([sort_value, artist_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor_token: str) -> tuple:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor_token + '=' * (-len(cursor_token) % 4)
+        sort_value, artist_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(artist_id, int):
+        raise ValueError("无效的分页游标")
+    return sort_value, artist_id
+
+def list_artists(limit: int = DEFAULT_PAGE_SIZE, cursor_token: Optional[str] = None,
+                 sort: str = "count_desc", category_id: Optional[int] = None,
+                 incomplete: bool = False,
+                 filter_condition: Optional[tuple] = None) -> Dict[str, Any]:
+    """
+    分页获取画师（键集分页）
+    filter_condition: artist_filter.compile_filter 编译出的 (sql, params)
+    返回: {
+        'items': [...],
+        'next_cursor': str 或 None,
+        'total': 符合筛选条件的画师总数
+    }
+    """
+    if sort not in ARTIST_SORTS:
+        raise ValueError(f"不支持的排序方式: {sort}")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    sort_expr, descending = ARTIST_SORTS[sort]
+
+    conditions = []
+    params: List[Any] = []
+    if category_id:
+        conditions.append("""EXISTS (
+            SELECT 1 FROM artist_categories ac
+            WHERE ac.artist_id = a.id AND ac.category_id = ?
+        )""")
+        params.append(category_id)
+    if incomplete:
+        conditions.append(INCOMPLETE_CONDITION)
+    if filter_condition and filter_condition[0]:
+        conditions.append(filter_condition[0])
+        params.extend(filter_condition[1])
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor.execute(f"SELECT COUNT(*) FROM artists a {where_clause}", params)
+        total = cursor.fetchone()[0]
+
+        page_conditions = list(conditions)
+        page_params = list(params)
+        if cursor_token:
+            sort_value, last_id = _decode_cursor(cursor_token)
+            op = "<" if descending else ">"
+            # 额外的单列边界让 SQLite 对表达式索引做范围查找而不是全扫描
+            page_conditions.append(f"{sort_expr} {op}= ?")
+            page_conditions.append(f"({sort_expr}, a.id) {op} (?, ?)")
+            page_params.extend([sort_value, sort_value, last_id])
+
+        direction = "DESC" if descending else "ASC"
+        page_where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+        cursor.execute(f"""
+            SELECT a.*, {sort_expr} AS _sort_value
+            FROM artists a
+            {page_where}
+            ORDER BY {sort_expr} {direction}, a.id {direction}
+            LIMIT ?
+        """, page_params + [limit + 1])
+        rows = [dict(row) for row in cursor.fetchall()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1]['_sort_value'], rows[-1]['id'])
+        for row in rows:
+            row.pop('_sort_value')
+
+        categories_map = _load_artist_categories_map(cursor, [a['id'] for a in rows])
+        return {
+            'items': _attach_categories(rows, categories_map),
+            'next_cursor': next_cursor,
+            'total': total
+        }
+
+def get_artist_changes(since: int) -> Dict[str, Any]:
+    """
+    获取指定数据版本之后的变更（增量同步）
+    返回: {
+        'version': 当前数据版本号，作为下次请求的 since,
+        'reset': since 无效（大于当前版本）时为 True，此时 items 为全部画师,
+        'items': 新建或修改的画师,
+        'deleted_ids': 已删除的画师 ID,
+        'categories': 新建或修改的分类,
+        'deleted_category_ids': 已删除的分类 ID
+    }
+    """
+    since = int(since)
+    if since < 0:
+        raise ValueError("无效的同步版本号")
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # 先读取版本号再读取变更：期间新提交的变更会在下次同步中重复返回，但不会遗漏
+        row = cursor.execute("SELECT value FROM app_meta WHERE key = 'data_version'").fetchone()
+        version = row[0] if row else 0
+        reset = since > version
+        if reset:
+            since = 0
+
+        def changed(kind):
+            cursor.execute("""
+                SELECT item_id, deleted FROM change_log
+                WHERE kind = ? AND version > ?
+            """, (kind, since))
+            rows = cursor.fetchall()
+            return ([r['item_id'] for r in rows if not r['deleted']],
+                    [r['item_id'] for r in rows if r['deleted']])
+
+        if since == 0:
+            # 全量同步：直接返回所有画师和分类
+            cursor.execute("SELECT * FROM artists ORDER BY id")
+            artists = [dict(r) for r in cursor.fetchall()]
+            cursor.execute("SELECT * FROM categories ORDER BY id")
+            categories = [dict(r) for r in cursor.fetchall()]
+            deleted_ids, deleted_category_ids = [], []
+        else:
+            artist_ids, deleted_ids = changed('artist')
+            category_ids, deleted_category_ids = changed('category')
+            artists = []
+            for i in range(0, len(artist_ids), 500):
+                chunk = artist_ids[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f"SELECT * FROM artists WHERE id IN ({placeholders})", chunk)
+                artists.extend(dict(r) for r in cursor.fetchall())
+            artists.sort(key=lambda a: a['id'])
+            categories = []
+            if category_ids:
+                placeholders = ','.join('?' * len(category_ids))
+                cursor.execute(f"SELECT * FROM categories WHERE id IN ({placeholders}) ORDER BY id",
+                               category_ids)
+                categories = [dict(r) for r in cursor.fetchall()]
+
+        categories_map = _load_artist_categories_map(cursor, [a['id'] for a in artists])
+        return {
+            'version': version,
+            'reset': reset,
+            'items': _attach_categories(artists, categories_map),
+            'deleted_ids': deleted_ids,
+            'categories': categories,
+            'deleted_category_ids': deleted_category_ids
+        }
+
+# 待补全列表的筛选方式: mode -> 条件（均有对应的部分索引）
+INCOMPLETE_MODES = {
+    'incomplete': INCOMPLETE_CONDITION,
+    'enrichment': NEEDS_ENRICHMENT_CONDITION,
+}
+
+def list_incomplete_artists(limit: int = DEFAULT_PAGE_SIZE, cursor_token: Optional[str] = None,
+                            mode: str = 'incomplete') -> Dict[str, Any]:
+    """
+    按 ID 分页获取待补全画师（走部分索引，只访问待补全的行）
+    mode: incomplete（与前端"待补全"规则一致）/ enrichment（需要获取作品数据）
+    返回: {'items': [...], 'next_cursor': str 或 None, 'total': int}
+    """
+    if mode not in INCOMPLETE_MODES:
+        raise ValueError(f"不支持的筛选方式: {mode}")
+    condition = INCOMPLETE_MODES[mode]
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    after_id = _decode_cursor(cursor_token)[1] if cursor_token else 0
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        total = cursor.execute(f"SELECT COUNT(*) FROM artists a WHERE {condition}").fetchone()[0]
+        cursor.execute(f"""
+            SELECT a.* FROM artists a
+            WHERE {condition} AND a.id > ?
+            ORDER BY a.id
+            LIMIT ?
+        """, (after_id, limit + 1))
+        rows = [dict(row) for row in cursor.fetchall()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1]['id'], rows[-1]['id'])
+
+        categories_map = _load_artist_categories_map(cursor, [a['id'] for a in rows])
+        return {
+            'items': _attach_categories(rows, categories_map),
+            'next_cursor': next_cursor,
+            'total': total
+        }
+
+def get_enrichment_candidates() -> List[Dict[str, Any]]:
+    """获取需要获取作品数据的画师（一键补全第二阶段），走部分索引"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT a.id, a.uuid, a.name_noob, a.name_nai, a.danbooru_link
+            FROM artists a
+            WHERE {NEEDS_ENRICHMENT_CONDITION}
+            ORDER BY a.id
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+
+def get_library_stats() -> Dict[str, Any]:
+    """
+    画师库统计（几条聚合查询，不加载画师列表）
+    post_count_histogram 按数量级分桶: '0'、'1-9'、'10-99'、'100-999'……
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*) AS total,
+                   IFNULL(SUM({INCOMPLETE_CONDITION}), 0) AS incomplete,
+                   IFNULL(SUM(IFNULL(a.skip_danbooru, 0) != 0), 0) AS skip_danbooru,
+                   IFNULL(SUM(IFNULL(a.danbooru_link, '') = ''), 0) AS missing_link,
+                   IFNULL(SUM(IFNULL(a.image_example, '') = ''), 0) AS missing_image,
+                   IFNULL(SUM(IFNULL(a.post_count, 0) <= 0), 0) AS missing_post_count,
+                   IFNULL(SUM(IFNULL(a.post_count, 0)), 0) AS total_post_count,
+                   MAX(a.updated_at) AS last_updated_at,
+                   MAX(a.last_fetched_at) AS last_fetched_at,
+                   IFNULL(SUM(a.fetch_status = 'failed'), 0) AS fetch_failed
+            FROM artists a
+        """)
+        artists = dict(cursor.fetchone())
+
+        artists['uncategorized'] = cursor.execute("""
+            SELECT COUNT(*) FROM artists a
+            WHERE NOT EXISTS (SELECT 1 FROM artist_categories ac WHERE ac.artist_id = a.id)
+        """).fetchone()[0]
+        artists['complete'] = artists['total'] - artists['incomplete']
+
+        # 作品数位数即为数量级分桶
+        cursor.execute("""
+            SELECT CASE WHEN IFNULL(post_count, 0) <= 0 THEN 0
+                        ELSE length(CAST(post_count AS TEXT)) END AS digits,
+                   COUNT(*) AS count
+            FROM artists
+            GROUP BY digits
+            ORDER BY digits
+        """)
+        histogram = []
+        for row in cursor.fetchall():
+            digits = row['digits']
+            label = '0' if digits == 0 else f"{10 ** (digits - 1)}-{10 ** digits - 1}"
+            histogram.append({'bucket': label, 'count': row['count']})
+
+        categories = cursor.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+        presets = cursor.execute("SELECT COUNT(*) FROM artist_presets").fetchone()[0]
+
+        return {
+            'artists': artists,
+            'categories': categories,
+            'presets': presets,
+            'post_count_histogram': histogram
+        }
+
+def search_artists(query: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    全文搜索画师（名称与备注）
+    支持 NOOB 格式的括号转义和 NAI 格式的 artist: 前缀
+    返回按相关度排序的画师列表，每项附带 highlights 字段（<mark> 标记匹配片段）
+    """
+    term = artist_identity_key(query)
+    if not term:
+        return []
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'artists_fts'")
+        has_fts = cursor.fetchone() is not None
+
+        if has_fts:
+            if len(term) >= 3:
+                # trigram 子串匹配，名称列权重高于备注
+                match_clause = "artists_fts MATCH ?"
+                match_param = '"' + term.replace('"', '""') + '"'
+                order_clause = "bm25(artists_fts, 10.0, 10.0, 1.0), IFNULL(a.post_count, 0) DESC"
             else:
-                artist['category_name'] = '未分类'
-                artist['category_id'] = None
+                # 少于 3 个字符时 trigram 无法建立索引，回退为 LIKE
+                escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                match_clause = ("(f.name_noob LIKE ? ESCAPE '\\' OR f.name_nai LIKE ? ESCAPE '\\' "
+                                "OR f.notes LIKE ? ESCAPE '\\')")
+                match_param = f"%{escaped}%"
+                order_clause = "IFNULL(a.post_count, 0) DESC"
+            params = [match_param] * match_clause.count('?')
+
+            cursor.execute(f"""
+                SELECT a.*,
+                       highlight(artists_fts, 0, '<mark>', '</mark>') AS _hl_noob,
+                       highlight(artists_fts, 1, '<mark>', '</mark>') AS _hl_nai,
+                       snippet(artists_fts, 2, '<mark>', '</mark>', '…', 24) AS _hl_notes
+                FROM artists_fts f
+                JOIN artists a ON a.id = f.rowid
+                WHERE {match_clause}
+                ORDER BY {order_clause}
+                LIMIT ?
+            """, params + [limit])
+        else:
+            pattern = f"%{term}%"
+            cursor.execute("""
+                SELECT a.*, NULL AS _hl_noob, NULL AS _hl_nai, NULL AS _hl_notes
+                FROM artists a
+                WHERE a.name_noob LIKE ? OR a.name_nai LIKE ? OR a.notes LIKE ?
+                ORDER BY IFNULL(a.post_count, 0) DESC
+                LIMIT ?
+            """, (pattern, pattern, pattern, limit))
+
+        artists = []
+        for row in cursor.fetchall():
+            artist = dict(row)
+            artist['highlights'] = {
+                'name_noob': artist.pop('_hl_noob'),
+                'name_nai': artist.pop('_hl_nai'),
+                'notes': artist.pop('_hl_notes')
+            }
+            artists.append(artist)
+
+        categories_map = _load_artist_categories_map(cursor, [a['id'] for a in artists])
+        return _attach_categories(artists, categories_map)
 
-        return artists
+def fuzzy_search_artists(query: str, limit: int = 20, min_score: float = 0.2) -> List[Dict[str, Any]]:
+    """
+    模糊搜索画师（容忍拼写错误）
+    基于三元组倒排索引计算 Jaccard 相似度，返回按相似度降序的画师列表，每项附带 score 字段
+    """
+    key = _fuzzy_key(query)
+    grams = _trigrams(key)
+    if not grams:
+        return []
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        placeholders = ", ".join("?" * len(grams))
+        cursor.execute(f"""
+            WITH matches AS (
+                SELECT artist_id, COUNT(*) AS shared
+                FROM artist_trigrams
+                WHERE trigram IN ({placeholders})
+                GROUP BY artist_id
+            )
+            SELECT a.*,
+                   CAST(m.shared AS REAL) / (? + k.trigram_count - m.shared) AS score
+            FROM matches m
+            JOIN artist_fuzzy_keys k ON k.artist_id = m.artist_id
+            JOIN artists a ON a.id = m.artist_id
+            WHERE CAST(m.shared AS REAL) / (? + k.trigram_count - m.shared) >= ?
+            ORDER BY score DESC, IFNULL(a.post_count, 0) DESC
+            LIMIT ?
+        """, list(grams) + [len(grams), len(grams), min_score, limit])
+        artists = [dict(row) for row in cursor.fetchall()]
+
+        categories_map = _load_artist_categories_map(cursor, [a['id'] for a in artists])
+        return _attach_categories(artists, categories_map)
 
 def update_artist(artist_id: int, **kwargs) -> bool:
     """更新画师信息（支持多分类）"""
@@ -339,7 +1349,12 @@ def update_artist(artist_id: int, **kwargs) -> bool:
             SET {set_clause}
             WHERE id = ?
         """, values)
-        return cursor.rowcount > 0
+        updated = cursor.rowcount > 0
+
+        if updated and any(k in updates for k in ('name_noob', 'name_nai', 'danbooru_link')):
+            _refresh_name_indexes(cursor, [artist_id])
+
+        return updated
 
 def delete_artist(artist_id: int) -> bool:
     """删除画师"""
@@ -359,129 +1374,320 @@ def get_artist_by_id(artist_id: int) -> Optional[Dict[str, Any]]:
 
         artist = dict(row)
 
-        # 添加分类信息
-        artist['categories'] = get_artist_categories(artist_id)
-
-        # 保留 category_name 字段以兼容前端（显示所有分类）
-        if artist['categories']:
-            artist['category_name'] = ', '.join([c['name'] for c in artist['categories']])
-            artist['category_id'] = artist['categories'][0]['id']  # 兼容性字段
-        else:
-            artist['category_name'] = '未分类'
-            artist['category_id'] = None
-
-        return artist
+        # 添加分类信息（复用当前连接）
+        categories_map = _load_artist_categories_map(cursor, [artist_id])
+        return _attach_categories([artist], categories_map)[0]
 
 def check_artist_exists(name_noob: str = "", name_nai: str = "", danbooru_link: str = "") -> Optional[Dict[str, Any]]:
-    """检查画师是否已存在"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        conditions = []
-        params = []
-        
-        if name_noob:
-            conditions.append("name_noob = ?")
-            params.append(name_noob)
-            
-        if name_nai:
-            conditions.append("name_nai = ?")
-            params.append(name_nai)
-            
-        if danbooru_link:
-            conditions.append("danbooru_link = ?")
-            params.append(danbooru_link)
-            
-        if not conditions:
-            return None
-            
-        query = f"SELECT * FROM artists WHERE {' OR '.join(conditions)} LIMIT 1"
-        cursor.execute(query, params)
+    """
+    检查画师是否已存在（按规范化身份键匹配，忽略大小写、转义和 artist: 前缀）
+    任一字段的身份键与已有画师的任一字段相同即视为已存在（走各字段身份键的索引）
+    """
+    keys = artist_field_keys(name_noob, name_nai, danbooru_link)
+    if not keys:
+        return None
+
+    placeholders = ", ".join("?" * len(keys))
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT * FROM artists
+            WHERE noob_key IN ({placeholders})
+               OR nai_key IN ({placeholders})
+               OR link_key IN ({placeholders})
+            ORDER BY id LIMIT 1
+        """, keys * 3)
         row = cursor.fetchone()
-        
+
         if row:
             return dict(row)
         return None
 
-def find_duplicate_artists() -> List[Dict[str, Any]]:
-    """查找重复的画师"""
+def get_artists_by_identity_keys(keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    按身份键批量查找画师（走 identity_key 索引）
+    返回: {identity_key: artist_dict}，存在重复画师时取最早创建的一个
+    """
+    keys = list(dict.fromkeys(k for k in keys if k))
+    result: Dict[str, Dict[str, Any]] = {}
+    if not keys:
+        return result
+
     with get_db() as conn:
         cursor = conn.cursor()
-        # 基于danbooru链接或画师名称查找重复
-        cursor.execute("""
-            WITH artist_identities AS (
-                SELECT
-                    id,
-                    COALESCE(NULLIF(danbooru_link, ''),
-                             NULLIF(name_noob, ''),
-                             NULLIF(name_nai, '')) as identity
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"""
+                SELECT id, name_noob, name_nai, post_count, image_example, skip_danbooru, identity_key
                 FROM artists
-                WHERE COALESCE(NULLIF(danbooru_link, ''),
-                              NULLIF(name_noob, ''),
-                              NULLIF(name_nai, '')) IS NOT NULL
-            )
-            SELECT a.*
-            FROM artists a
-            WHERE EXISTS (
-                SELECT 1
-                FROM artist_identities ai1
-                JOIN artist_identities ai2 ON ai1.identity = ai2.identity
-                WHERE ai1.id = a.id
-                  AND ai1.id != ai2.id
-            )
-            ORDER BY
-                COALESCE(a.danbooru_link, a.name_noob, a.name_nai),
-                a.id
-        """)
+                WHERE identity_key IN ({placeholders})
+                ORDER BY id
+            """, chunk)
+            for row in cursor.fetchall():
+                result.setdefault(row['identity_key'], dict(row))
+    return result
+
+def write_preset_items(cursor, preset_id: int, noob_text: str, nai_text: str):
+    """解析画师串文本并重写其条目（在创建/更新画师串的事务内调用）"""
+    cursor.execute("DELETE FROM artist_preset_items WHERE preset_id = ?", (preset_id,))
+
+    rows = []
+    for field, text in (('noob', noob_text), ('nai', nai_text)):
+        for position, token in enumerate(parse_prompt_artists(text or '')):
+            key = artist_identity_key(token['name'])
+            if key:
+                rows.append((preset_id, field, position, token['weight'], token['raw'], token['name'], key))
+    if not rows:
+        return
+
+    cursor.executemany("""
+        INSERT INTO artist_preset_items
+            (preset_id, field, position, artist_id, weight, raw_token, name, identity_key)
+        VALUES (?, ?, ?, (SELECT MIN(id) FROM artists WHERE identity_key = ?), ?, ?, ?, ?)
+    """, [(preset_id, field, position, key, weight, raw, name, key)
+          for preset_id, field, position, weight, raw, name, key in rows])
+
+def get_preset_items(preset_id: int) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    """
+    获取画师串的条目及其关联画师的当前信息
+    返回: {'noob': [...], 'nai': [...]}，画师串不存在时返回 None
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        if not cursor.execute("SELECT 1 FROM artist_presets WHERE id = ?", (preset_id,)).fetchone():
+            return None
 
-        artists = [dict(row) for row in cursor.fetchall()]
+        cursor.execute("""
+            SELECT i.field, i.raw_token AS raw, i.name, i.weight, i.artist_id,
+                   a.name_noob, a.name_nai, a.post_count, a.image_example
+            FROM artist_preset_items i
+            LEFT JOIN artists a ON a.id = i.artist_id
+            WHERE i.preset_id = ?
+            ORDER BY i.field, i.position
+        """, (preset_id,))
+        result: Dict[str, List[Dict[str, Any]]] = {'noob': [], 'nai': []}
+        for row in cursor.fetchall():
+            item = dict(row)
+            result[item.pop('field')].append(item)
+        return result
 
-        # 为每个画师添加分类信息
-        for artist in artists:
-            artist['categories'] = get_artist_categories(artist['id'])
-            if artist['categories']:
-                artist['category_name'] = ', '.join([c['name'] for c in artist['categories']])
-            else:
-                artist['category_name'] = '未分类'
+def get_presets_by_artist(artist_id: int) -> List[Dict[str, Any]]:
+    """反查使用了指定画师的画师串（走 artist_id 索引）"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT p.id, p.name, p.description, p.updated_at,
+                   GROUP_CONCAT(DISTINCT i.field) AS fields, MAX(i.weight) AS max_weight
+            FROM artist_preset_items i
+            JOIN artist_presets p ON p.id = i.preset_id
+            WHERE i.artist_id = ?
+            GROUP BY p.id
+            ORDER BY p.updated_at DESC
+        """, (artist_id,))
+        presets = []
+        for row in cursor.fetchall():
+            preset = dict(row)
+            preset['fields'] = preset['fields'].split(',') if preset['fields'] else []
+            presets.append(preset)
+        return presets
+
+def _duplicate_groups(cursor) -> List[List[int]]:
+    """
+    重复画师分组：任一字段的身份键相同（NOOB 名称、NAI 名称、链接标签之间交叉比较）即视为重复，
+    按共享的身份键传递合并（与 check_artist_exists 的匹配规则一致）
+    返回: 按组内最小 ID 排序的分组，每组为升序的画师 ID 列表（至少两个）
+    """
+    cursor.execute("""
+        WITH field_keys(key, artist_id) AS (
+            SELECT noob_key, id FROM artists WHERE noob_key IS NOT NULL
+            UNION
+            SELECT nai_key, id FROM artists WHERE nai_key IS NOT NULL
+            UNION
+            SELECT link_key, id FROM artists WHERE link_key IS NOT NULL
+        )
+        SELECT key, artist_id FROM field_keys
+        WHERE key IN (SELECT key FROM field_keys GROUP BY key HAVING COUNT(*) > 1)
+        ORDER BY key, artist_id
+    """)
+
+    # 并查集：同一身份键下的画师并入该键第一个画师所在的组
+    parent: Dict[int, int] = {}
+
+    def find(artist_id: int) -> int:
+        root = parent.setdefault(artist_id, artist_id)
+        while root != parent[root]:
+            root = parent[root]
+        while parent[artist_id] != root:
+            parent[artist_id], artist_id = root, parent[artist_id]
+        return root
+
+    first_by_key: Dict[str, int] = {}
+    for row in cursor.fetchall():
+        first = first_by_key.setdefault(row['key'], row['artist_id'])
+        a, b = find(first), find(row['artist_id'])
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    groups: Dict[int, List[int]] = {}
+    for artist_id in parent:
+        groups.setdefault(find(artist_id), []).append(artist_id)
+    return sorted((sorted(ids) for ids in groups.values() if len(ids) > 1), key=lambda ids: ids[0])
+
+def find_duplicate_artists(limit: int = 50, cursor_token: Optional[str] = None) -> Dict[str, Any]:
+    """
+    查找重复的画师（任一字段的身份键相同即为重复，见 _duplicate_groups）
+    返回: {
+        'groups': [{
+            'identity_key': str,          # 保留项的身份键
+            'canonical': artist_dict,     # 保留项（最早创建的画师）
+            'duplicates': [artist_dict]   # 其余重复项
+        }, ...],
+        'next_cursor': str 或 None,
+        'total_groups': 重复分组总数
+    }
+    分组按保留项 ID 排序，游标为上一页最后一组保留项的 ID
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        all_groups = _duplicate_groups(cursor)
+        total_groups = len(all_groups)
+
+        if cursor_token:
+            _, last_id = _decode_cursor(cursor_token)
+            all_groups = [ids for ids in all_groups if ids[0] > last_id]
+
+        page = all_groups[:limit]
+        next_cursor = _encode_cursor(None, page[-1][0]) if len(all_groups) > limit else None
+
+        artist_ids = [artist_id for ids in page for artist_id in ids]
+        artists_by_id = {}
+        if artist_ids:
+            placeholders = ", ".join("?" * len(artist_ids))
+            cursor.execute(f"SELECT * FROM artists WHERE id IN ({placeholders})", artist_ids)
+            artists_by_id = {row['id']: dict(row) for row in cursor.fetchall()}
+
+        # 一次性加载分类信息
+        artists = list(artists_by_id.values())
+        categories_map = _load_artist_categories_map(cursor, [a['id'] for a in artists])
+        _attach_categories(artists, categories_map)
+
+        groups = []
+        for ids in page:
+            canonical = artists_by_id[ids[0]]
+            groups.append({
+                'identity_key': canonical['identity_key'],
+                'canonical': canonical,
+                'duplicates': [artists_by_id[artist_id] for artist_id in ids[1:]]
+            })
+
+        return {
+            'groups': groups,
+            'next_cursor': next_cursor,
+            'total_groups': total_groups
+        }
 
-        return artists
+def merge_duplicate_artists(merges: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    合并重复画师（单个事务）：将被合并画师的分类关联转移到保留项后删除被合并画师
+    merges: [{'keep_id': int, 'remove_ids': [int, ...]}, ...]
+            为 None 时合并所有重复分组，每组保留最早创建的画师
+    只会删除与保留项属于同一重复分组的画师
+    返回: {'merged_groups': int, 'removed_count': int, 'removed_images': [被删除画师的图片文件名]}
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        groups = _duplicate_groups(cursor)
+        if merges is None:
+            pairs = [(ids[0], ids[1:]) for ids in groups]
+        else:
+            group_by_id = {artist_id: ids for ids in groups for artist_id in ids}
+            pairs = []
+            for m in merges:
+                keep_id = m.get('keep_id')
+                if not keep_id or keep_id not in group_by_id:
+                    continue
+                members = set(group_by_id[keep_id])
+                remove_ids = [int(i) for i in m.get('remove_ids', [])]
+                pairs.append((keep_id, [i for i in dict.fromkeys(remove_ids) if i in members and i != keep_id]))
+
+        merged_groups = 0
+        removed_count = 0
+        removed_images = []
+
+        for keep_id, loser_ids in pairs:
+            if not loser_ids:
+                continue
+            cursor.execute("SELECT image_example FROM artists WHERE id = ?", (keep_id,))
+            keeper = cursor.fetchone()
+            if not keeper:
+                continue
+
+            placeholders = ", ".join("?" * len(loser_ids))
+            cursor.execute(f"SELECT id, image_example FROM artists WHERE id IN ({placeholders})", loser_ids)
+            losers = cursor.fetchall()
+            if not losers:
+                continue
+
+            # 转移分类关联
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO artist_categories (artist_id, category_id)
+                SELECT DISTINCT ?, category_id FROM artist_categories
+                WHERE artist_id IN ({placeholders})
+            """, [keep_id] + loser_ids)
+
+            cursor.execute(f"DELETE FROM artists WHERE id IN ({placeholders})", loser_ids)
+
+            removed_images.extend(
+                row['image_example'] for row in losers
+                if row['image_example'] and row['image_example'] != keeper['image_example']
+            )
+            merged_groups += 1
+            removed_count += len(losers)
+
+        return {
+            'merged_groups': merged_groups,
+            'removed_count': removed_count,
+            'removed_images': removed_images
+        }
 
 def get_all_artists_for_dedup() -> Dict[str, Dict[str, Any]]:
     """
-    获取所有画师数据用于去重检测
+    获取所有画师的身份键用于去重检测（每个画师按字段分别登记身份键）
     返回: {
-        'by_noob': {name_noob: artist_dict},
-        'by_nai': {name_nai: artist_dict},
-        'by_link': {danbooru_link: artist_dict}
+        'by_identity': {identity_key: {'id': artist_id, 'identity_key': identity_key}}
     }
+    存在多个画师时取最早创建的一个
     """
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM artists")
-
-        by_noob = {}
-        by_nai = {}
-        by_link = {}
+        cursor.execute("SELECT id, identity_key, noob_key, nai_key, link_key FROM artists ORDER BY id")
 
+        by_identity = {}
         for row in cursor.fetchall():
-            artist = dict(row)
-            if artist.get('name_noob'):
-                by_noob[artist['name_noob']] = artist
-            if artist.get('name_nai'):
-                by_nai[artist['name_nai']] = artist
-            if artist.get('danbooru_link'):
-                by_link[artist['danbooru_link']] = artist
+            entry = {'id': row['id'], 'identity_key': row['identity_key']}
+            for column in ARTIST_KEY_COLUMNS:
+                if row[column]:
+                    by_identity.setdefault(row[column], entry)
 
         return {
-            'by_noob': by_noob,
-            'by_nai': by_nai,
-            'by_link': by_link
+            'by_identity': by_identity
         }
 
 
-def batch_create_artists(artists_data: List[Dict[str, Any]]) -> List[int]:
+def _bulk_uuid4(count: int) -> List[str]:
+    """一次性读取随机字节批量生成 UUID4"""
+    random_bytes = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=random_bytes[i * 16:(i + 1) * 16], version=4)) for i in range(count)]
+
+def batch_create_artists(artists_data: List[Dict[str, Any]],
+                         batch_size: int = BULK_INSERT_BATCH_SIZE) -> List[int]:
     """
-    批量创建画师
+    批量创建画师（executemany 批量写入，每 batch_size 个画师提交一次）
     artists_data: [{
         'category_ids': [...],
         'name_noob': '',
@@ -492,24 +1698,26 @@ def batch_create_artists(artists_data: List[Dict[str, Any]]) -> List[int]:
         'image_example': '',
         'skip_danbooru': False
     }, ...]
-    返回: 新创建的画师ID列表
+    返回: 新创建的画师ID列表（与输入顺序一致）
     """
     if not artists_data:
         return []
 
     created_ids = []
 
-    with get_db() as conn:
-        cursor = conn.cursor()
+    for start in range(0, len(artists_data), batch_size):
+        batch = artists_data[start:start + batch_size]
+        uuids = _bulk_uuid4(len(batch))
 
-        for artist in artists_data:
-            artist_uuid = str(uuid.uuid4())
+        with get_db() as conn:
+            cursor = conn.cursor()
 
-            cursor.execute("""
+            cursor.executemany("""
                 INSERT INTO artists
-                (uuid, name_noob, name_nai, danbooru_link, post_count, notes, image_example, skip_danbooru)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+                (uuid, name_noob, name_nai, danbooru_link, post_count, notes, image_example,
+                 skip_danbooru, identity_key, noob_key, nai_key, link_key)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(
                 artist_uuid,
                 artist.get('name_noob', ''),
                 artist.get('name_nai', ''),
@@ -517,20 +1725,41 @@ def batch_create_artists(artists_data: List[Dict[str, Any]]) -> List[int]:
                 artist.get('post_count'),
                 artist.get('notes', ''),
                 artist.get('image_example', ''),
-                1 if artist.get('skip_danbooru') else 0
-            ))
-
-            artist_id = cursor.lastrowid
-            created_ids.append(artist_id)
+                1 if artist.get('skip_danbooru') else 0,
+                artist_identity_from_fields(
+                    artist.get('name_noob', ''), artist.get('name_nai', ''), artist.get('danbooru_link', '')
+                ) or None,
+                *_artist_field_key_values(
+                    artist.get('name_noob', ''), artist.get('name_nai', ''), artist.get('danbooru_link', '')
+                )
+            ) for artist_uuid, artist in zip(uuids, batch)])
+
+            # 同一写事务内 AUTOINCREMENT 分配的 ID 连续，按 ID 区间取回并通过 UUID 对应
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'artists'")
+            last_id = cursor.fetchone()[0]
+            cursor.execute(
+                "SELECT id, uuid FROM artists WHERE id BETWEEN ? AND ?",
+                (last_id - len(batch) + 1, last_id)
+            )
+            id_by_uuid = {row['uuid']: row['id'] for row in cursor.fetchall()}
+            batch_ids = [id_by_uuid[artist_uuid] for artist_uuid in uuids]
 
             # 添加分类关联
-            for category_id in artist.get('category_ids', []):
-                cursor.execute("""
-                    INSERT INTO artist_categories (artist_id, category_id)
-                    VALUES (?, ?)
-                """, (artist_id, category_id))
+            cursor.executemany("""
+                INSERT INTO artist_categories (artist_id, category_id)
+                VALUES (?, ?)
+            """, [(artist_id, category_id)
+                  for artist_id, artist in zip(batch_ids, batch)
+                  for category_id in artist.get('category_ids', [])])
+
+            _write_fuzzy_index(cursor, [
+                (artist_id, artist.get('name_noob') or artist.get('name_nai') or '')
+                for artist_id, artist in zip(batch_ids, batch)
+            ])
+
+        created_ids.extend(batch_ids)
 
-        return created_ids
+    return created_ids
 
 
 def batch_update_artists(updates: List[Dict[str, Any]]) -> int:
@@ -543,59 +1772,289 @@ def batch_update_artists(updates: List[Dict[str, Any]]) -> int:
         'name_nai': '',
         ...
     }, ...]
-    返回: 更新的画师数量
+    只写入实际发生变化的字段和分类关联：按变更字段组合分组后用 executemany 执行，
+    值未变化的画师完全跳过（不会更新 updated_at）
+    返回: 实际发生变化的画师数量
     """
     if not updates:
         return 0
 
     allowed_fields = ['name_noob', 'name_nai', 'danbooru_link', 'post_count',
                       'notes', 'image_example', 'skip_danbooru']
-    updated_count = 0
+    updated_ids = set()
+    renamed_ids = []
 
     with get_db() as conn:
         cursor = conn.cursor()
 
+        # 预加载当前数据
+        artist_ids = list({update['id'] for update in updates if update.get('id')})
+        current_rows = {}
+        for i in range(0, len(artist_ids), 500):
+            chunk = artist_ids[i:i + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(f"SELECT * FROM artists WHERE id IN ({placeholders})", chunk)
+            current_rows.update({row['id']: dict(row) for row in cursor.fetchall()})
+        current_categories = _load_artist_categories_map(cursor, list(current_rows.keys()))
+
+        # 计算字段差异（按变更字段组合分组）和分类关联差异
+        field_groups: Dict[tuple, List[list]] = {}
+        links_to_delete = []
+        links_to_insert = []
+
         for update in updates:
             artist_id = update.get('id')
-            if not artist_id:
+            current = current_rows.get(artist_id)
+            if not current:
                 continue
 
-            # 处理分类更新
             category_ids = update.get('category_ids')
             if category_ids is not None:
-                cursor.execute("DELETE FROM artist_categories WHERE artist_id = ?", (artist_id,))
-                for category_id in category_ids:
-                    cursor.execute("""
-                        INSERT INTO artist_categories (artist_id, category_id)
-                        VALUES (?, ?)
-                    """, (artist_id, category_id))
-
-            # 处理其他字段更新
-            field_updates = {k: v for k, v in update.items() if k in allowed_fields}
+                old_ids = {c['id'] for c in current_categories.get(artist_id, [])}
+                new_ids = set(category_ids)
+                if old_ids != new_ids:
+                    links_to_delete.extend((artist_id, cid) for cid in old_ids - new_ids)
+                    links_to_insert.extend((artist_id, cid) for cid in new_ids - old_ids)
+                    current_categories[artist_id] = [{'id': cid} for cid in new_ids]
+                    updated_ids.add(artist_id)
 
+            field_updates = {k: v for k, v in update.items() if k in allowed_fields}
             if 'skip_danbooru' in field_updates:
                 field_updates['skip_danbooru'] = 1 if field_updates['skip_danbooru'] else 0
 
-            if field_updates:
-                set_clause = ", ".join([f"{k} = ?" for k in field_updates.keys()])
-                set_clause += ", updated_at = CURRENT_TIMESTAMP"
+            changed = {k: v for k, v in field_updates.items() if current.get(k) != v}
+            if not changed:
+                continue
+
+            current.update(changed)
+            fields = tuple(sorted(changed))
+            field_groups.setdefault(fields, []).append([changed[k] for k in fields] + [artist_id])
+            updated_ids.add(artist_id)
+            if any(k in changed for k in ('name_noob', 'name_nai', 'danbooru_link')):
+                renamed_ids.append(artist_id)
+
+        for fields, rows in field_groups.items():
+            set_clause = ", ".join(f"{k} = ?" for k in fields)
+            cursor.executemany(f"""
+                UPDATE artists
+                SET {set_clause}, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, rows)
+
+        cursor.executemany(
+            "DELETE FROM artist_categories WHERE artist_id = ? AND category_id = ?",
+            links_to_delete
+        )
+        cursor.executemany(
+            "INSERT INTO artist_categories (artist_id, category_id) VALUES (?, ?)",
+            links_to_insert
+        )
+
+        _refresh_name_indexes(cursor, renamed_ids)
+
+        return len(updated_ids)
 
-                values = list(field_updates.values())
-                values.append(artist_id)
 
-                cursor.execute(f"""
-                    UPDATE artists
-                    SET {set_clause}
-                    WHERE id = ?
-                """, values)
+def bulk_update_post_counts(counts: Dict[int, int]) -> int:
+    """在一个事务中批量写入作品数量，仅更新数值有变化的画师，返回更新数量"""
+    if not counts:
+        return 0
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            UPDATE artists
+            SET post_count = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND post_count IS NOT ?
+        """, [(count, artist_id, count) for artist_id, count in sorted(counts.items())])
+        return cursor.rowcount
+
+# 作品数据获取结果（fetch_status 列）：ok 成功；no_image 获取到作品数但没有示例图；failed 未获取到作品数；
+# deferred 定时刷新的请求预算不足，本周期未查询（与 failed 一样超过重试间隔后再刷新）
+FETCH_STATUSES = ('ok', 'no_image', 'failed', 'deferred')
+
+def record_fetch_results(statuses: Dict[int, str]):
+    """记录画师作品数据的获取时间和结果（不更新 updated_at）"""
+    if not statuses:
+        return
+    with get_db() as conn:
+        conn.executemany("""
+            UPDATE artists SET last_fetched_at = CURRENT_TIMESTAMP, fetch_status = ?
+            WHERE id = ?
+        """, [(status, artist_id) for artist_id, status in sorted(statuses.items())])
 
-                if cursor.rowcount > 0:
-                    updated_count += 1
-            elif category_ids is not None:
-                updated_count += 1
+def get_stale_artists(limit: int, max_age_days: float, retry_hours: float,
+                      priority_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """
+    挑选需要刷新作品数的画师（未跳过且有链接）：
+    从未获取过或超过 max_age_days 未获取的画师；上次获取失败或被推迟的画师和 priority_ids 中的画师
+    （如最近查看过的）超过 retry_hours 即可再次刷新
+    排序：priority_ids 中的画师优先，其余按"陈旧天数 × 作品数位数"降序，
+    作品数多的画师数值变化快，陈旧程度相同时先刷新
+    """
+    priority = json.dumps(priority_ids or [])
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            WITH priority(id) AS (SELECT value FROM json_each(?))
+            SELECT a.id, a.danbooru_link, a.post_count, a.last_fetched_at, a.fetch_status
+            FROM artists a
+            WHERE IFNULL(a.skip_danbooru, 0) = 0 AND IFNULL(a.danbooru_link, '') != ''
+              AND (a.last_fetched_at IS NULL
+                   OR a.last_fetched_at < datetime('now', ?)
+                   OR ((a.fetch_status IN ('failed', 'deferred') OR a.id IN priority)
+                       AND a.last_fetched_at < datetime('now', ?)))
+            ORDER BY a.id IN priority DESC,
+                     (julianday('now') - julianday(IFNULL(a.last_fetched_at, IFNULL(a.created_at, '2000-01-01'))))
+                         * length(CAST(MAX(IFNULL(a.post_count, 0), 1) AS TEXT)) DESC,
+                     a.id
+            LIMIT ?
+        """, (priority, f"-{max_age_days * 24} hours", f"-{retry_hours} hours", limit))
+        return [dict(row) for row in cursor.fetchall()]
 
-        return updated_count
+# 写入队列 flush/close 默认的最长等待时间（秒）
+WRITE_QUEUE_TIMEOUT = 30
 
+class ArtistWriteQueue:
+    """
+    画师更新的合并写入队列（单写线程）
+    补全/获取作品数等批量任务通过 submit 提交 update_artist 参数（可附带 fetch_status 记录获取结果），
+    写线程累计 max_items 条或等待 max_delay_ms 毫秒后在同一事务中提交，
+    避免每条结果单独提交一次事务
+    """
+
+    def __init__(self, max_items: int = 100, max_delay_ms: int = 500, on_flush=None):
+        self.max_items = max_items
+        self.max_delay = max_delay_ms / 1000
+        # 每次提交后回调 on_flush(提交的画师数量)
+        self.on_flush = on_flush
+        self.total_committed = 0
+
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._first_pending_at = 0.0
+        self._submitted = 0
+        self._committed = 0
+        self._flush_requested = False
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._cond = threading.Condition()
+
+    def submit(self, artist_id: int, **fields):
+        """提交一条更新（同一画师的多次更新会合并）"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("写入队列已关闭")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="artist-write-queue", daemon=True)
+                self._thread.start()
+            # 队列由空变为非空时唤醒写线程开始计时，攒满一批时唤醒立即写入
+            wake = not self._pending
+            if wake:
+                self._first_pending_at = time.monotonic()
+            self._pending.setdefault(artist_id, {}).update(fields)
+            self._submitted += 1
+            if wake or len(self._pending) >= self.max_items:
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = WRITE_QUEUE_TIMEOUT) -> bool:
+        """立即提交已排队的更新并等待完成，超时返回 False（timeout 为 None 时一直等待）"""
+        with self._cond:
+            target = self._submitted
+            if self._committed >= target:
+                return True
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self._committed >= target, timeout)
+
+    def close(self, timeout: Optional[float] = WRITE_QUEUE_TIMEOUT):
+        """提交剩余更新并停止写线程（进程退出时调用）"""
+        if not self.flush(timeout):
+            print("写入队列关闭超时，部分更新可能未提交")
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _should_write(self) -> bool:
+        if not self._pending:
+            return False
+        return (self._flush_requested or self._closed
+                or len(self._pending) >= self.max_items
+                or time.monotonic() - self._first_pending_at >= self.max_delay)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._should_write():
+                    if self._closed:
+                        close_db()
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = max(0.0, self._first_pending_at + self.max_delay - time.monotonic())
+                    self._cond.wait(timeout)
+                batch, self._pending = self._pending, {}
+                target = self._submitted
+                self._flush_requested = False
+
+            count = self._write(batch)
+
+            with self._cond:
+                self._committed = target
+                self.total_committed += count
+                self._cond.notify_all()
+            if self.on_flush:
+                # 回调异常不能终止写线程，否则之后的更新都不会再提交
+                try:
+                    self.on_flush(count)
+                except Exception as e:
+                    print(f"写入队列回调失败: {e}")
+
+    def _write(self, batch: Dict[int, Dict[str, Any]]) -> int:
+        """在同一事务中写入一组更新；失败时逐条重试，避免单条错误丢弃整组"""
+        try:
+            with get_db():
+                return self._apply(batch)
+        except Exception as e:
+            print(f"合并写入失败，改为逐条写入: {e}")
+
+        count = 0
+        for artist_id, fields in batch.items():
+            try:
+                with get_db():
+                    count += self._apply({artist_id: fields})
+            except Exception as e:
+                print(f"更新画师 {artist_id} 失败: {e}")
+        return count
+
+    @staticmethod
+    def _apply(batch: Dict[int, Dict[str, Any]]) -> int:
+        """字段更新按 batch_update_artists 分组写入（值未变化的画师跳过），fetch_status 写入获取记录"""
+        updates = []
+        statuses = {}
+        for artist_id, fields in batch.items():
+            fields = dict(fields)
+            status = fields.pop('fetch_status', None)
+            if status:
+                statuses[artist_id] = status
+            if fields:
+                updates.append({'id': artist_id, **fields})
+        batch_update_artists(updates)
+        record_fetch_results(statuses)
+        return len(batch)
+
+def _log_write_queue_flush(count: int):
+    logging.info(f"写入队列提交了 {count} 个画师的更新")
+
+# 获取作品数据的结果写入队列（应用请求和后台任务共用一个写线程）：每 100 条或 500 毫秒合并提交一次
+artist_write_queue = ArtistWriteQueue(max_items=100, max_delay_ms=500, on_flush=_log_write_queue_flush)
+atexit.register(artist_write_queue.close)
 
 if __name__ == "__main__":
+    import sys
+
     init_db()
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild-category-stats":
+        count = rebuild_category_stats()
+        print(f"已重建 {count} 个分类的统计数据")
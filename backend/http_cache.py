@@ -0,0 +1,162 @@
+"""
+Danbooru 请求的持久化响应缓存
+独立的 SQLite 文件，避免缓存写入影响画师数据库的数据版本号
+"""
+import sqlite3
+import threading
+import time
+import os
+from typing import Optional, Dict, Any
+from pathlib import Path
+
+# 缓存数据库文件路径（支持通过环境变量配置，默认为 backend 目录）
+DATA_DIR = Path(os.environ.get('DATA_DIR', Path(__file__).parent))
+HTTP_CACHE_PATH = DATA_DIR / "http_cache.db"
+
+# 各接口的缓存有效期（秒）
+HTTP_CACHE_TTLS = {
+    'counts': 6 * 3600,       # /counts/posts.json
+    'posts': 24 * 3600,       # /posts.json
+    'tags': 6 * 3600,         # /tags.json（批量作品数）
+}
+DEFAULT_HTTP_CACHE_TTL = 3600
+
+# 缓存总大小上限（字节），超出后按最近访问时间淘汰到上限的 90%
+HTTP_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# 缓存较小且访问集中在补全任务中，使用一个共享连接并由锁串行化
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_total_bytes: Optional[int] = None
+_counters = {'hits': 0, 'misses': 0, 'stale': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0}
+
+def _get_conn() -> sqlite3.Connection:
+    """获取共享连接（首次调用时建表），调用方需持有 _lock"""
+    global _conn, _total_bytes
+    if _conn is None:
+        conn = sqlite3.connect(HTTP_CACHE_PATH, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                endpoint TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (endpoint, cache_key)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_http_cache_accessed ON http_cache(accessed_at)")
+        _total_bytes = conn.execute("SELECT IFNULL(SUM(size), 0) FROM http_cache").fetchone()[0]
+        _conn = conn
+    return _conn
+
+def lookup(endpoint: str, cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    查找缓存项
+    返回: {'body', 'etag', 'last_modified', 'fresh'} 或 None；fresh 表示仍在有效期内
+    """
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute("""
+            SELECT body, etag, last_modified, fetched_at FROM http_cache
+            WHERE endpoint = ? AND cache_key = ?
+        """, (endpoint, cache_key)).fetchone()
+        if row is None:
+            _counters['misses'] += 1
+            return None
+
+        now = time.time()
+        fresh = now - row['fetched_at'] < HTTP_CACHE_TTLS.get(endpoint, DEFAULT_HTTP_CACHE_TTL)
+        if fresh:
+            _counters['hits'] += 1
+            conn.execute("UPDATE http_cache SET accessed_at = ? WHERE endpoint = ? AND cache_key = ?",
+                         (now, endpoint, cache_key))
+        else:
+            _counters['stale'] += 1
+        return {
+            'body': row['body'],
+            'etag': row['etag'],
+            'last_modified': row['last_modified'],
+            'fresh': fresh
+        }
+
+def store(endpoint: str, cache_key: str, body: str,
+          etag: Optional[str] = None, last_modified: Optional[str] = None):
+    """写入或替换缓存项，超出大小上限时淘汰最久未访问的项"""
+    global _total_bytes
+    size = len(body.encode('utf-8'))
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        old = conn.execute("SELECT size FROM http_cache WHERE endpoint = ? AND cache_key = ?",
+                           (endpoint, cache_key)).fetchone()
+        conn.execute("""
+            INSERT OR REPLACE INTO http_cache
+                (endpoint, cache_key, body, etag, last_modified, fetched_at, accessed_at, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (endpoint, cache_key, body, etag, last_modified, now, now, size))
+        _total_bytes += size - (old['size'] if old else 0)
+        _counters['stored'] += 1
+
+        if _total_bytes > HTTP_CACHE_MAX_BYTES:
+            target = HTTP_CACHE_MAX_BYTES * 0.9
+            conn.execute("BEGIN")
+            while _total_bytes > target:
+                rows = conn.execute("""
+                    SELECT endpoint, cache_key, size FROM http_cache
+                    ORDER BY accessed_at LIMIT 100
+                """).fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    conn.execute("DELETE FROM http_cache WHERE endpoint = ? AND cache_key = ?",
+                                 (row['endpoint'], row['cache_key']))
+                    _total_bytes -= row['size']
+                    _counters['evicted'] += 1
+                    if _total_bytes <= target:
+                        break
+            conn.execute("COMMIT")
+
+def mark_revalidated(endpoint: str, cache_key: str):
+    """服务器返回 304 时刷新缓存项的获取时间"""
+    now = time.time()
+    with _lock:
+        _get_conn().execute("""
+            UPDATE http_cache SET fetched_at = ?, accessed_at = ?
+            WHERE endpoint = ? AND cache_key = ?
+        """, (now, now, endpoint, cache_key))
+        _counters['revalidated'] += 1
+
+def get_stats() -> Dict[str, Any]:
+    """缓存统计（条目数、占用大小、命中计数）"""
+    with _lock:
+        conn = _get_conn()
+        rows = conn.execute("""
+            SELECT endpoint, COUNT(*) AS entries, SUM(size) AS bytes
+            FROM http_cache GROUP BY endpoint
+        """).fetchall()
+        return {
+            'endpoints': {row['endpoint']: {'entries': row['entries'], 'bytes': row['bytes']} for row in rows},
+            'total_bytes': _total_bytes,
+            'max_bytes': HTTP_CACHE_MAX_BYTES,
+            'ttls': HTTP_CACHE_TTLS,
+            **_counters
+        }
+
+def clear(endpoint: Optional[str] = None) -> int:
+    """清空缓存（可只清空指定接口），返回删除的条目数"""
+    global _total_bytes
+    with _lock:
+        conn = _get_conn()
+        if endpoint:
+            cursor = conn.execute("DELETE FROM http_cache WHERE endpoint = ?", (endpoint,))
+        else:
+            cursor = conn.execute("DELETE FROM http_cache")
+        _total_bytes = conn.execute("SELECT IFNULL(SUM(size), 0) FROM http_cache").fetchone()[0]
+        return cursor.rowcount
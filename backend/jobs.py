@@ -0,0 +1,646 @@
+"""
+持久化后台任务队列（一键补全等长时间任务）
+任务、逐画师子任务和进度事件存放在独立的 jobs.db，进度写入不会改变画师数据库的数据版本号
+工作线程随应用启动（start_worker），也可单独运行: python -m jobs
+"""
+import sqlite3
+import threading
+import logging
+import socket
+import time
+import uuid
+import json
+import os
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple
+from pathlib import Path
+
+# 任务数据库文件路径（支持通过环境变量配置，默认为 backend 目录）
+DATA_DIR = Path(os.environ.get('DATA_DIR', Path(__file__).parent))
+JOBS_DATABASE_PATH = DATA_DIR / "jobs.db"
+
+# 支持的任务类型
+JOB_KINDS = ('enrich',)
+
+# 每批处理的画师数量（每批结束后写入结果、心跳和进度事件）
+JOB_CHUNK_SIZE = 10
+
+# 运行中任务超过该时间（秒）没有心跳，视为工作进程已退出，可由其他工作进程接管
+JOB_STALE_AFTER = 120
+
+# 工作线程空闲时的轮询间隔（秒）
+JOB_POLL_INTERVAL = 5
+
+# 保留的已结束任务数量，超出后删除最早的任务及其子任务和事件
+JOB_HISTORY_LIMIT = 50
+
+# 连接参数
+JOBS_DB_BUSY_TIMEOUT_MS = 5000
+JOBS_DB_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    f"PRAGMA busy_timeout = {JOBS_DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA foreign_keys = ON",
+)
+
+# 每个线程复用一个连接
+_local = threading.local()
+
+def _connect() -> sqlite3.Connection:
+    """创建新连接并应用 PRAGMA 配置"""
+    conn = sqlite3.connect(JOBS_DATABASE_PATH, timeout=JOBS_DB_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    for pragma in JOBS_DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+@contextmanager
+def get_jobs_db():
+    """
+    获取任务数据库连接的上下文管理器
+    同一线程内复用连接；嵌套调用共享外层事务，仅最外层提交或回滚
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+        _local.depth = 0
+
+    _local.depth += 1
+    try:
+        yield conn
+        if _local.depth == 1:
+            conn.commit()
+    except Exception:
+        if _local.depth == 1:
+            conn.rollback()
+        raise
+    finally:
+        _local.depth -= 1
+
+def close_jobs_db():
+    """关闭当前线程缓存的任务数据库连接"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and not getattr(_local, 'depth', 0):
+        _local.conn = None
+        conn.close()
+
+# 任务数据库结构版本（PRAGMA user_version）
+JOBS_SCHEMA_VERSION = 2
+
+def init_jobs_db():
+    """
+    初始化任务数据库表结构
+    通过 PRAGMA user_version 记录结构版本，已是最新版本时只读取一个整数即返回
+    """
+    with get_jobs_db() as conn:
+        cursor = conn.cursor()
+        current_version = cursor.execute("PRAGMA user_version").fetchone()[0]
+        if current_version >= JOBS_SCHEMA_VERSION:
+            return
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                params TEXT NOT NULL DEFAULT '{}',
+                phase TEXT,
+                total INTEGER,
+                done INTEGER NOT NULL DEFAULT 0,
+                succeeded INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                updated_count INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                error TEXT,
+                worker_id TEXT,
+                heartbeat_at REAL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        # 同一类型最多一个未结束的任务（多个标签页同时发起时只会创建一个）
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_kind
+            ON jobs(kind) WHERE status IN ('pending', 'running')
+        """)
+
+        # 逐画师子任务：status 为 pending / done / failed / skipped
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS job_tasks (
+                job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+                artist_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                result TEXT,
+                updated_at REAL,
+                PRIMARY KEY (job_id, artist_id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_job_tasks_status ON job_tasks(job_id, status)")
+
+        # 进度事件（seq 作为 SSE 的事件 ID，断线后从 Last-Event-ID 继续）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+                seq INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            ) WITHOUT ROWID
+        """)
+
+        # 周期任务的最近执行记录（多个进程共用，同一周期只有一个进程执行）
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS periodic_runs (
+                name TEXT PRIMARY KEY,
+                last_run_at REAL NOT NULL DEFAULT 0,
+                result TEXT
+            )
+        """)
+
+        cursor.execute(f"PRAGMA user_version = {JOBS_SCHEMA_VERSION}")
+        conn.commit()
+
+def _job_to_dict(row) -> Dict[str, Any]:
+    job = dict(row)
+    job['params'] = json.loads(job['params'] or '{}')
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+def _append_event(conn, job_id: int, data: Dict[str, Any]) -> int:
+    """追加一条进度事件，返回事件序号"""
+    seq = conn.execute("SELECT IFNULL(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?",
+                       (job_id,)).fetchone()[0]
+    conn.execute("INSERT INTO job_events (job_id, seq, data) VALUES (?, ?, ?)",
+                 (job_id, seq, json.dumps(data, ensure_ascii=False)))
+    return seq
+
+def _prune_history(conn):
+    """删除超出保留数量的已结束任务"""
+    conn.execute("""
+        DELETE FROM jobs WHERE id IN (
+            SELECT id FROM jobs
+            WHERE status NOT IN ('pending', 'running')
+            ORDER BY id DESC LIMIT -1 OFFSET ?
+        )
+    """, (JOB_HISTORY_LIMIT,))
+
+def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    """获取任务详情"""
+    with get_jobs_db() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_to_dict(row) if row else None
+
+def get_active_job(kind: str) -> Optional[Dict[str, Any]]:
+    """获取指定类型未结束的任务"""
+    with get_jobs_db() as conn:
+        row = conn.execute("""
+            SELECT * FROM jobs WHERE kind = ? AND status IN ('pending', 'running')
+        """, (kind,)).fetchone()
+        return _job_to_dict(row) if row else None
+
+def list_jobs(limit: int = 20) -> List[Dict[str, Any]]:
+    """最近的任务（新的在前）"""
+    with get_jobs_db() as conn:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [_job_to_dict(row) for row in rows]
+
+def create_job(kind: str, params: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    创建任务；同类型已有未结束的任务时直接返回该任务
+    返回: (job, created)
+    """
+    if kind not in JOB_KINDS:
+        raise ValueError(f"不支持的任务类型: {kind}")
+
+    with get_jobs_db() as conn:
+        existing = conn.execute("""
+            SELECT * FROM jobs WHERE kind = ? AND status IN ('pending', 'running')
+        """, (kind,)).fetchone()
+        if existing:
+            return _job_to_dict(existing), False
+
+        try:
+            cursor = conn.execute("""
+                INSERT INTO jobs (kind, params, created_at) VALUES (?, ?, ?)
+            """, (kind, json.dumps(params or {}), time.time()))
+        except sqlite3.IntegrityError:
+            # 其他连接抢先创建了同类型任务（唯一部分索引兜底）
+            row = conn.execute("""
+                SELECT * FROM jobs WHERE kind = ? AND status IN ('pending', 'running')
+            """, (kind,)).fetchone()
+            return _job_to_dict(row), False
+
+        job_id = cursor.lastrowid
+        _append_event(conn, job_id, {'type': 'queued', 'job_id': job_id})
+        _prune_history(conn)
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    notify_worker()
+    return _job_to_dict(row), True
+
+def cancel_job(job_id: int) -> Optional[Dict[str, Any]]:
+    """
+    取消任务：未开始的任务直接结束，运行中的任务在当前批次完成后停止
+    返回更新后的任务，任务不存在时返回 None
+    """
+    with get_jobs_db() as conn:
+        row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        if row['status'] == 'pending':
+            conn.execute("""
+                UPDATE jobs SET status = 'cancelled', message = '任务已取消', finished_at = ?
+                WHERE id = ?
+            """, (time.time(), job_id))
+            _append_event(conn, job_id, {'type': 'cancelled', 'message': '任务已取消'})
+        elif row['status'] == 'running':
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+    return get_job(job_id)
+
+def get_job_events(job_id: int, after: int = 0, limit: int = 500) -> List[Tuple[int, str]]:
+    """获取序号大于 after 的进度事件，返回 [(seq, data_json)]"""
+    with get_jobs_db() as conn:
+        rows = conn.execute("""
+            SELECT seq, data FROM job_events
+            WHERE job_id = ? AND seq > ?
+            ORDER BY seq LIMIT ?
+        """, (job_id, after, limit)).fetchall()
+        return [(row['seq'], row['data']) for row in rows]
+
+def get_job_tasks(job_id: int, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    """获取任务的逐画师子任务（可按状态筛选）"""
+    with get_jobs_db() as conn:
+        if status:
+            rows = conn.execute("""
+                SELECT artist_id, status, result, updated_at FROM job_tasks
+                WHERE job_id = ? AND status = ? ORDER BY artist_id
+            """, (job_id, status)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT artist_id, status, result, updated_at FROM job_tasks
+                WHERE job_id = ? ORDER BY artist_id
+            """, (job_id,)).fetchall()
+        tasks = []
+        for row in rows:
+            task = dict(row)
+            task['result'] = json.loads(task['result']) if task['result'] else None
+            tasks.append(task)
+        return tasks
+
+def claim_periodic_run(name: str, interval: float) -> bool:
+    """距上次执行已满 interval 秒时登记本次执行并返回 True（多进程下只有一个进程领到）"""
+    now = time.time()
+    with get_jobs_db() as conn:
+        conn.execute("INSERT OR IGNORE INTO periodic_runs (name) VALUES (?)", (name,))
+        cursor = conn.execute("""
+            UPDATE periodic_runs SET last_run_at = ? WHERE name = ? AND last_run_at <= ?
+        """, (now, name, now - interval))
+        return cursor.rowcount == 1
+
+def record_periodic_run(name: str, result: Dict[str, Any]):
+    """保存周期任务最近一次的执行结果"""
+    with get_jobs_db() as conn:
+        conn.execute("UPDATE periodic_runs SET result = ? WHERE name = ?",
+                     (json.dumps(result, ensure_ascii=False), name))
+
+def get_periodic_run(name: str) -> Optional[Dict[str, Any]]:
+    """周期任务最近一次的执行时间和结果"""
+    with get_jobs_db() as conn:
+        row = conn.execute("SELECT last_run_at, result FROM periodic_runs WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'last_run_at': row['last_run_at'] or None,
+            'result': json.loads(row['result']) if row['result'] else None
+        }
+
+# -------------------------------
+# 工作进程
+# -------------------------------
+
+class JobLostError(Exception):
+    """任务已被其他工作进程接管或已被删除"""
+
+# 本进程内正在运行的工作循环
+_live_worker_ids = set()
+
+def _is_orphaned(worker_id: Optional[str]) -> bool:
+    """
+    判断运行中任务的工作进程是否已在本机退出（应用重启后无需等待心跳超时即可续跑）
+    worker_id 格式为 主机名:进程号:随机后缀
+    """
+    host, _, rest = (worker_id or '').partition(':')
+    pid, _, _ = rest.partition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return worker_id not in _live_worker_ids
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+def claim_job(worker_id: str) -> Optional[Dict[str, Any]]:
+    """
+    领取一个待执行的任务：未开始的任务，或工作进程已退出 / 心跳超时的运行中任务（断点续跑）
+    领取在写事务中完成，多个工作进程不会领到同一个任务
+    """
+    now = time.time()
+    with get_jobs_db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = None
+        for candidate in conn.execute("""
+            SELECT * FROM jobs WHERE status IN ('pending', 'running') ORDER BY id
+        """).fetchall():
+            if (candidate['status'] == 'pending'
+                    or (candidate['heartbeat_at'] or 0) < now - JOB_STALE_AFTER
+                    or _is_orphaned(candidate['worker_id'])):
+                row = candidate
+                break
+        if row is None:
+            return None
+
+        resumed = row['status'] == 'running'
+        conn.execute("""
+            UPDATE jobs SET status = 'running', worker_id = ?, heartbeat_at = ?,
+                            started_at = IFNULL(started_at, ?)
+            WHERE id = ?
+        """, (worker_id, now, now, row['id']))
+        _append_event(conn, row['id'], {'type': 'resumed' if resumed else 'started', 'job_id': row['id']})
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+        return _job_to_dict(row)
+
+def _heartbeat(conn, job_id: int, worker_id: str) -> bool:
+    """刷新心跳，返回是否已请求取消；任务被其他工作进程接管时抛出 JobLostError"""
+    row = conn.execute("SELECT worker_id, status, cancel_requested FROM jobs WHERE id = ?",
+                       (job_id,)).fetchone()
+    if row is None or row['worker_id'] != worker_id or row['status'] != 'running':
+        raise JobLostError(job_id)
+    conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time(), job_id))
+    return bool(row['cancel_requested'])
+
+def _finish_job(job_id: int, worker_id: str, status: str, event: Dict[str, Any],
+                message: Optional[str] = None, error: Optional[str] = None):
+    with get_jobs_db() as conn:
+        cursor = conn.execute("""
+            UPDATE jobs SET status = ?, message = ?, error = ?, finished_at = ?, phase = NULL
+            WHERE id = ? AND worker_id = ? AND status = 'running'
+        """, (status, message, error, time.time(), job_id, worker_id))
+        if cursor.rowcount:
+            _append_event(conn, job_id, event)
+
+def _display_name(artist: Dict[str, Any]) -> str:
+    """显示名称：优先使用 NAI 格式并去除 artist: 前缀和括号转义"""
+    name = artist.get('name_nai') or artist.get('name_noob') or '未命名'
+    if name.startswith('artist:'):
+        name = name[7:]
+    return name.replace('\\(', '(').replace('\\)', ')')
+
+def _prepare_enrich_job(job: Dict[str, Any], worker_id: str):
+    """
+    一键补全的准备阶段：补全名称和链接，再写入待获取作品数据的画师子任务
+    子任务写入与 total 设置在同一事务中，中断后重新执行本阶段是安全的
+    """
+    from database import get_all_artists, get_enrichment_candidates, get_artist_by_id, batch_update_artists
+    from utils import auto_complete_names
+
+    job_id = job['id']
+    params = job['params']
+
+    with get_jobs_db() as conn:
+        _heartbeat(conn, job_id, worker_id)
+        conn.execute("UPDATE jobs SET phase = 'names' WHERE id = ?", (job_id,))
+
+    # 1. 补全名称和链接（值未变化的画师由 batch_update_artists 跳过）
+    name_updates = []
+    for artist in get_all_artists():
+        name_noob = artist.get('name_noob', '')
+        name_nai = artist.get('name_nai', '')
+        danbooru_link = artist.get('danbooru_link', '')
+        new_noob, new_nai, new_link = auto_complete_names(name_noob, name_nai, danbooru_link)
+        if new_noob != name_noob or new_nai != name_nai or new_link != danbooru_link:
+            name_updates.append({
+                'id': artist['id'],
+                'name_noob': new_noob,
+                'name_nai': new_nai,
+                'danbooru_link': new_link
+            })
+    updated_count = batch_update_artists(name_updates)
+
+    # 2. 确定需要获取作品数据的画师（指定了画师时只处理这些画师）
+    if params.get('artist_ids'):
+        artist_ids = []
+        for artist_id in params['artist_ids']:
+            artist = get_artist_by_id(artist_id)
+            if artist and artist.get('danbooru_link') and not artist.get('skip_danbooru'):
+                artist_ids.append(artist['id'])
+    else:
+        artist_ids = [artist['id'] for artist in get_enrichment_candidates()]
+
+    now = time.time()
+    with get_jobs_db() as conn:
+        _heartbeat(conn, job_id, worker_id)
+        conn.executemany("""
+            INSERT OR IGNORE INTO job_tasks (job_id, artist_id, updated_at) VALUES (?, ?, ?)
+        """, [(job_id, artist_id, now) for artist_id in artist_ids])
+        conn.execute("""
+            UPDATE jobs SET phase = 'fetch', total = ?, updated_count = ? WHERE id = ?
+        """, (len(artist_ids), updated_count, job_id))
+        _append_event(conn, job_id, {
+            'type': 'phase', 'phase': 'fetch', 'total': len(artist_ids),
+            'updated_count': updated_count,
+            'message': f'开始获取 {len(artist_ids)} 个画师的作品数据...'
+        })
+
+def _run_enrich_job(job: Dict[str, Any], worker_id: str):
+    """
+    一键补全：逐批获取作品数和示例图并写回画师库
+    子任务只在结果写入画师库之后才标记完成，续跑时从未完成的子任务继续
+    """
+    from database import get_artist_by_id, artist_write_queue
+    from utils import fetch_post_counts_batch, fetch_status_from_result
+
+    job_id = job['id']
+    force_refresh = bool(job['params'].get('force_refresh'))
+
+    if job['total'] is None:
+        _prepare_enrich_job(job, worker_id)
+
+    while True:
+        with get_jobs_db() as conn:
+            if _heartbeat(conn, job_id, worker_id):
+                _finish_job(job_id, worker_id, 'cancelled',
+                            {'type': 'cancelled', 'message': '任务已取消'}, message='任务已取消')
+                return
+            rows = conn.execute("""
+                SELECT artist_id FROM job_tasks
+                WHERE job_id = ? AND status = 'pending'
+                ORDER BY artist_id LIMIT ?
+            """, (job_id, JOB_CHUNK_SIZE)).fetchall()
+        if not rows:
+            break
+
+        # 按画师库的最新数据获取（画师可能在排队期间被修改或删除）
+        task_status = {}
+        chunk = []
+        for row in rows:
+            artist = get_artist_by_id(row['artist_id'])
+            if not artist or not artist.get('danbooru_link') or artist.get('skip_danbooru'):
+                task_status[row['artist_id']] = ('skipped', None)
+                continue
+            chunk.append({
+                'id': artist['id'],
+                'uuid': artist.get('uuid'),
+                'danbooru_link': artist['danbooru_link'],
+                'name': _display_name(artist)
+            })
+
+        results = fetch_post_counts_batch(chunk, force_refresh=force_refresh) if chunk else {}
+
+        # 结果和获取记录经共享的写入队列提交（与其他请求的写入合并），子任务在提交完成后才标记
+        image_failed = []
+        for artist in chunk:
+            result = results.get(artist['id']) or {}
+            update_data = {}
+            if result.get('post_count') is not None:
+                update_data['post_count'] = result['post_count']
+            if result.get('example_image'):
+                update_data['image_example'] = result['example_image']
+            artist_write_queue.submit(artist['id'], fetch_status=fetch_status_from_result(result), **update_data)
+            if update_data:
+                # 记录显示名称，完成事件据此列出封面获取失败的画师
+                task_status[artist['id']] = ('done', {**result, 'name': artist['name']})
+                if result.get('post_count') is not None and not result.get('example_image'):
+                    image_failed.append(artist['name'])
+            else:
+                task_status[artist['id']] = ('failed', result or None)
+        if chunk and not artist_write_queue.flush():
+            raise RuntimeError("写入队列提交超时")
+
+        now = time.time()
+        succeeded = sum(1 for status, _ in task_status.values() if status == 'done')
+        failed = sum(1 for status, _ in task_status.values() if status == 'failed')
+        with get_jobs_db() as conn:
+            _heartbeat(conn, job_id, worker_id)
+            conn.executemany("""
+                UPDATE job_tasks SET status = ?, result = ?, updated_at = ?
+                WHERE job_id = ? AND artist_id = ? AND status = 'pending'
+            """, [
+                (status, json.dumps(result, ensure_ascii=False) if result else None, now, job_id, artist_id)
+                for artist_id, (status, result) in task_status.items()
+            ])
+            conn.execute("""
+                UPDATE jobs SET done = done + ?, succeeded = succeeded + ?, failed = failed + ?
+                WHERE id = ?
+            """, (len(task_status), succeeded, failed, job_id))
+            progress = conn.execute("SELECT done, total FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            _append_event(conn, job_id, {
+                'type': 'progress', 'phase': 'fetch',
+                'current': progress['done'], 'total': progress['total'],
+                'artist_name': chunk[-1]['name'] if chunk else '',
+                'succeeded': succeeded, 'failed': failed, 'image_failed_artists': image_failed
+            })
+
+    with get_jobs_db() as conn:
+        job = _job_to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+        image_failed_artists = [row[0] for row in conn.execute("""
+            SELECT json_extract(result, '$.name') FROM job_tasks
+            WHERE job_id = ? AND status = 'done' AND json_extract(result, '$.example_image') IS NULL
+            ORDER BY artist_id
+        """, (job_id,))]
+    image_failed_count = len(image_failed_artists)
+
+    message = f"已自动补全 {job['updated_count']} 个画师的基本信息"
+    if job['succeeded'] > 0:
+        message += f"，并成功获取了 {job['succeeded']} 个画师的作品数据"
+    elif job['total']:
+        message += f"，尝试获取 {job['total']} 个画师的作品数据但未成功"
+    if image_failed_count > 0:
+        message += f"（其中 {image_failed_count} 个画师封面获取失败）"
+
+    _finish_job(job_id, worker_id, 'completed', {
+        'type': 'complete', 'message': message,
+        'updated_count': job['updated_count'], 'fetched_count': job['succeeded'],
+        'failed_count': job['failed'], 'image_failed_count': image_failed_count,
+        'image_failed_artists': [name for name in image_failed_artists if name]
+    }, message=message)
+
+_JOB_RUNNERS = {
+    'enrich': _run_enrich_job,
+}
+
+def run_job(job: Dict[str, Any], worker_id: str):
+    """执行已领取的任务，异常时把任务标记为失败"""
+    try:
+        _JOB_RUNNERS[job['kind']](job, worker_id)
+    except JobLostError:
+        logging.warning(f"任务 {job['id']} 已被其他工作进程接管，停止执行")
+    except Exception as e:
+        logging.error(f"任务 {job['id']} 执行失败: {e}")
+        _finish_job(job['id'], worker_id, 'failed', {'type': 'error', 'error': str(e)}, error=str(e))
+
+# 唤醒本进程工作线程（创建任务后无需等待轮询间隔）
+_wake = threading.Event()
+_worker_thread: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+def notify_worker():
+    _wake.set()
+
+def make_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def run_worker(worker_id: Optional[str] = None, stop_event: Optional[threading.Event] = None,
+               poll_interval: float = JOB_POLL_INTERVAL, once: bool = False):
+    """
+    工作循环：领取并执行任务，空闲时等待唤醒或轮询
+    once 为 True 时处理完当前可领取的任务后返回
+    """
+    from database import close_db
+
+    worker_id = worker_id or make_worker_id()
+    _live_worker_ids.add(worker_id)
+    try:
+        while not (stop_event and stop_event.is_set()):
+            _wake.clear()
+            try:
+                job = claim_job(worker_id)
+            except sqlite3.OperationalError as e:
+                logging.warning(f"领取任务失败: {e}")
+                job = None
+            if job:
+                logging.info(f"开始执行任务 {job['id']}（{job['kind']}）")
+                run_job(job, worker_id)
+                continue
+            if once:
+                return
+            _wake.wait(poll_interval)
+    finally:
+        _live_worker_ids.discard(worker_id)
+        close_jobs_db()
+        close_db()
+
+def start_worker():
+    """在当前进程启动后台工作线程（重复调用只启动一次）"""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is None or not _worker_thread.is_alive():
+            _worker_thread = threading.Thread(target=run_worker, name='job-worker', daemon=True)
+            _worker_thread.start()
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="后台任务工作进程")
+    parser.add_argument('--once', action='store_true', help="处理完当前任务后退出")
+    args = parser.parse_args()
+
+    init_jobs_db()
+    from database import init_db
+    init_db()
+    run_worker(once=args.once)
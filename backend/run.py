@@ -2,7 +2,9 @@
 """
 启动后端服务
 """
-from app import app
+import os
+
+from app import app, start_background_services
 
 if __name__ == '__main__':
     print("=" * 50)
@@ -11,4 +13,7 @@ if __name__ == '__main__':
     print("API 运行在: http://localhost:5000")
     print("健康检查: http://localhost:5000/api/health")
     print("=" * 50)
+    # debug 模式下 reloader 的父进程只负责监视文件，后台服务只在实际服务的子进程中启动
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
     app.run(debug=True, host='0.0.0.0', port=5000)
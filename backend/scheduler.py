@@ -0,0 +1,156 @@
+"""
+作品数量的定时刷新（低优先级）
+每个周期挑选一批最陈旧的画师，用批量标签查询刷新作品数，单个周期的 Danbooru 请求数不超过预算；
+最近查看过、作品数多的画师优先。一键补全任务运行中或限速器繁忙时跳过本周期
+"""
+import math
+import threading
+import logging
+import time
+import os
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+import jobs
+from database import get_stale_artists, bulk_update_post_counts, record_fetch_results, close_db
+from utils import refresh_post_counts_bulk, extract_artist_tag_from_url, DANBOORU_API_LIMITER, TAG_COUNT_CHUNK_SIZE
+
+# 刷新周期（秒），设为 0 关闭定时刷新
+REFRESH_INTERVAL = int(os.environ.get('POST_COUNT_REFRESH_INTERVAL', 15 * 60))
+
+# 每个周期最多发出的 Danbooru 请求数（批量标签查询 + 逐个回退查询）
+REFRESH_REQUEST_BUDGET = int(os.environ.get('POST_COUNT_REFRESH_BUDGET', 10))
+
+# 每个周期最多刷新的画师数量
+REFRESH_BATCH_SIZE = int(os.environ.get('POST_COUNT_REFRESH_BATCH', 200))
+
+# 作品数超过该天数未获取视为陈旧；上次获取失败或最近查看过的画师超过 REFRESH_RETRY_HOURS 即可再次刷新
+REFRESH_MAX_AGE_DAYS = float(os.environ.get('POST_COUNT_MAX_AGE_DAYS', 7))
+REFRESH_RETRY_HOURS = 24
+
+# 应用启动后首个周期的延迟（秒），避免与启动时的其他请求叠加
+REFRESH_STARTUP_DELAY = 60
+
+# 最近查看记录：保留的画师数量和有效时长（秒）
+RECENT_VIEW_LIMIT = 500
+RECENT_VIEW_WINDOW = 24 * 3600
+
+_PERIODIC_RUN_NAME = 'post_count_refresh'
+
+_recent_views: "OrderedDict[int, float]" = OrderedDict()
+_views_lock = threading.Lock()
+
+_scheduler_thread: Optional[threading.Thread] = None
+_scheduler_lock = threading.Lock()
+_stop = threading.Event()
+
+def record_artist_view(artist_id: int):
+    """记录画师被查看（仅保存在内存中，用于定时刷新的优先级）"""
+    with _views_lock:
+        _recent_views.pop(artist_id, None)
+        _recent_views[artist_id] = time.time()
+        while len(_recent_views) > RECENT_VIEW_LIMIT:
+            _recent_views.popitem(last=False)
+
+def get_recent_views() -> List[int]:
+    """有效期内最近查看过的画师 ID（新的在前）"""
+    cutoff = time.time() - RECENT_VIEW_WINDOW
+    with _views_lock:
+        return [artist_id for artist_id, viewed_at in reversed(_recent_views.items()) if viewed_at >= cutoff]
+
+def _busy_reason() -> Optional[str]:
+    """Danbooru 请求正被其他任务使用时返回跳过原因"""
+    if any(jobs.get_active_job(kind) for kind in jobs.JOB_KINDS):
+        return '后台任务运行中'
+    state = DANBOORU_API_LIMITER.state()
+    if state['in_flight'] > 0 or state['blocked_for'] > 0:
+        return 'Danbooru 请求繁忙'
+    return None
+
+def run_refresh_once() -> Dict[str, Any]:
+    """
+    执行一个刷新周期
+    返回: {'skipped': 原因} 或 {'selected', 'fetched', 'updated', 'failed', 'requests', ...}
+    """
+    reason = _busy_reason()
+    if reason:
+        return {'skipped': reason}
+
+    batch_size = min(REFRESH_BATCH_SIZE, REFRESH_REQUEST_BUDGET * TAG_COUNT_CHUNK_SIZE)
+    if batch_size <= 0:
+        return {'skipped': '请求预算为 0'}
+
+    artists = get_stale_artists(batch_size, REFRESH_MAX_AGE_DAYS, REFRESH_RETRY_HOURS,
+                                priority_ids=get_recent_views())
+    if not artists:
+        return {'selected': 0, 'fetched': 0, 'updated': 0, 'failed': 0, 'requests': 0, 'deferred': 0}
+
+    # 预算先留给批量标签查询（按实际挑选的画师数计算），剩余部分用于未命中标签的逐个回退查询
+    tag_queries = math.ceil(len(artists) / TAG_COUNT_CHUNK_SIZE)
+    max_fallback = max(0, REFRESH_REQUEST_BUDGET - tag_queries)
+
+    results, stats = refresh_post_counts_bulk(artists, max_fallback=max_fallback)
+    counts = {artist_id: count for artist_id, count in results.items() if count is not None}
+    updated = bulk_update_post_counts(counts)
+
+    # 超出回退预算未查询的画师记为 deferred，避免每个周期都挑选到同一批画师；
+    # 链接中提取不到标签的画师无法通过标签查询刷新，记为 failed
+    statuses = {artist_id: 'ok' if count is not None else 'failed' for artist_id, count in results.items()}
+    for artist in artists:
+        if artist['id'] not in statuses:
+            has_tag = extract_artist_tag_from_url(artist['danbooru_link']).strip()
+            statuses[artist['id']] = 'deferred' if has_tag else 'failed'
+    record_fetch_results(statuses)
+
+    return {
+        'selected': len(artists),
+        'fetched': len(counts),
+        'updated': updated,
+        'failed': sum(1 for status in statuses.values() if status == 'failed'),
+        'requests': stats['tag_queries'] + stats['fallback_queries'],
+        'deferred': sum(1 for status in statuses.values() if status == 'deferred')
+    }
+
+def _scheduler_loop():
+    _stop.wait(REFRESH_STARTUP_DELAY)
+    while not _stop.is_set():
+        try:
+            # 多个进程（开发模式重载、多进程部署）共用执行记录，同一周期只刷新一次
+            if jobs.claim_periodic_run(_PERIODIC_RUN_NAME, REFRESH_INTERVAL):
+                result = run_refresh_once()
+                result['finished_at'] = time.time()
+                jobs.record_periodic_run(_PERIODIC_RUN_NAME, result)
+                if result.get('selected'):
+                    logging.info(f"定时刷新了 {result['fetched']} 个画师的作品数量，其中 {result['updated']} 个有变化")
+        except Exception as e:
+            logging.error(f"定时刷新作品数量失败: {e}")
+        finally:
+            close_db()
+            jobs.close_jobs_db()
+        _stop.wait(REFRESH_INTERVAL)
+
+def start_scheduler():
+    """在当前进程启动定时刷新线程（REFRESH_INTERVAL 为 0 时不启动，重复调用只启动一次）"""
+    global _scheduler_thread
+    if REFRESH_INTERVAL <= 0:
+        return
+    with _scheduler_lock:
+        if _scheduler_thread is None or not _scheduler_thread.is_alive():
+            _scheduler_thread = threading.Thread(target=_scheduler_loop, name='post-count-refresh', daemon=True)
+            _scheduler_thread.start()
+
+def get_scheduler_state() -> Dict[str, Any]:
+    """定时刷新的配置、最近一次执行结果和下次执行时间"""
+    last_run = jobs.get_periodic_run(_PERIODIC_RUN_NAME) or {'last_run_at': None, 'result': None}
+    return {
+        'enabled': REFRESH_INTERVAL > 0,
+        'running': _scheduler_thread is not None and _scheduler_thread.is_alive(),
+        'interval': REFRESH_INTERVAL,
+        'request_budget': REFRESH_REQUEST_BUDGET,
+        'batch_size': REFRESH_BATCH_SIZE,
+        'max_age_days': REFRESH_MAX_AGE_DAYS,
+        'recent_views': len(get_recent_views()),
+        'last_run_at': last_run['last_run_at'],
+        'last_result': last_run['result'],
+        'next_run_at': last_run['last_run_at'] + REFRESH_INTERVAL if last_run['last_run_at'] else None,
+    }
@@ -0,0 +1,12 @@
+"""
+后端测试公共配置：数据文件写入临时目录
+运行: cd backend && python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 各模块在导入时读取 DATA_DIR，需在导入被测模块之前设置
+os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='artist-manager-test-')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,82 @@
+"""增量同步（按数据版本返回变更，删除以墓碑返回）"""
+import pytest
+
+from database import (
+    create_artist, create_category, delete_artist, get_artist_changes, get_data_version, get_db, init_db,
+    set_artist_categories, update_artist
+)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _db():
+    init_db()
+
+
+def _item_ids(changes):
+    return [a['id'] for a in changes['items']]
+
+
+def test_changes_since_version():
+    since = get_data_version()
+    kept = create_artist([], name_noob='sync_kept')
+    removed = create_artist([], name_noob='sync_removed')
+
+    changes = get_artist_changes(since)
+    assert _item_ids(changes) == [kept, removed]
+    assert changes['deleted_ids'] == []
+    assert changes['version'] == get_data_version() > since
+    assert not changes['reset']
+
+    since = changes['version']
+    update_artist(kept, notes='changed')
+    delete_artist(removed)
+    changes = get_artist_changes(since)
+    assert [(a['id'], a['notes']) for a in changes['items']] == [(kept, 'changed')]
+    assert changes['deleted_ids'] == [removed]
+
+    # 没有新变更时返回空结果，版本号不变
+    since = changes['version']
+    changes = get_artist_changes(since)
+    assert (changes['items'], changes['deleted_ids'], changes['version']) == ([], [], since)
+
+
+def test_created_then_deleted_returns_only_tombstone():
+    since = get_data_version()
+    artist_id = create_artist([], name_noob='sync_short_lived')
+    delete_artist(artist_id)
+
+    changes = get_artist_changes(since)
+    assert artist_id not in _item_ids(changes)
+    assert changes['deleted_ids'] == [artist_id]
+
+
+def test_category_changes():
+    category_id = create_category('sync_category')
+    artist_id = create_artist([], name_noob='sync_linked')
+    since = get_data_version()
+
+    # 分类关联变化记为画师变更
+    set_artist_categories(artist_id, [category_id])
+    changes = get_artist_changes(since)
+    assert _item_ids(changes) == [artist_id]
+    assert [c['id'] for c in changes['items'][0]['categories']] == [category_id]
+
+    since = changes['version']
+    with get_db() as conn:
+        conn.execute("DELETE FROM artist_categories WHERE category_id = ?", (category_id,))
+        conn.execute("DELETE FROM categories WHERE id = ?", (category_id,))
+    changes = get_artist_changes(since)
+    assert changes['deleted_category_ids'] == [category_id]
+    assert _item_ids(changes) == [artist_id]
+    assert changes['items'][0]['categories'] == []
+
+
+def test_reset_and_invalid_version():
+    artist_id = create_artist([], name_noob='sync_reset')
+    changes = get_artist_changes(get_data_version() + 100)
+    assert changes['reset']
+    assert artist_id in _item_ids(changes)
+    assert changes['deleted_ids'] == []
+
+    with pytest.raises(ValueError):
+        get_artist_changes(-1)
@@ -0,0 +1,23 @@
+"""筛选表达式的嵌套层数限制"""
+import pytest
+
+from artist_filter import MAX_FILTER_DEPTH, FilterSyntaxError, compile_filter
+
+
+def test_nesting_within_limit():
+    compile_filter('(' * MAX_FILTER_DEPTH + 'wlop' + ')' * MAX_FILTER_DEPTH)
+    compile_filter('NOT ' * MAX_FILTER_DEPTH + 'wlop')
+
+
+@pytest.mark.parametrize('expr', [
+    '(' * 300 + 'x' + ')' * 300,
+    'NOT ' * 200 + 'x',
+    '(NOT ' * 20 + 'x' + ')' * 20,
+])
+def test_deep_nesting_rejected(expr):
+    with pytest.raises(FilterSyntaxError):
+        compile_filter(expr)
+
+
+def test_sibling_groups_do_not_accumulate_depth():
+    compile_filter(' OR '.join(['(a AND NOT b)'] * 40))
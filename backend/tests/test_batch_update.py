@@ -0,0 +1,74 @@
+"""批量更新画师（按变更字段分组写入，跳过未变化的画师）"""
+import pytest
+
+from database import (
+    batch_update_artists, check_artist_exists, create_artist, create_category, get_artist_by_id,
+    get_data_version, get_db, init_db
+)
+
+SENTINEL = '2000-01-01 00:00:00'
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _db():
+    init_db()
+
+
+def _reset_updated_at(*artist_ids):
+    with get_db() as conn:
+        conn.executemany("UPDATE artists SET updated_at = ? WHERE id = ?",
+                         [(SENTINEL, artist_id) for artist_id in artist_ids])
+
+
+def _updated_at(artist_id):
+    return get_artist_by_id(artist_id)['updated_at']
+
+
+def test_only_changed_artists_are_written():
+    a = create_artist([], name_noob='batch_a', post_count=1)
+    b = create_artist([], name_noob='batch_b', notes='old', skip_danbooru=True)
+    c = create_artist([], name_noob='batch_c', post_count=7)
+    _reset_updated_at(a, b, c)
+
+    changed = batch_update_artists([
+        {'id': a, 'post_count': 2},
+        {'id': b, 'notes': 'new', 'skip_danbooru': True},
+        {'id': c, 'name_noob': 'batch_c', 'post_count': 7},
+        {'id': 999999, 'post_count': 1},
+    ])
+
+    assert changed == 2
+    assert get_artist_by_id(a)['post_count'] == 2
+    assert get_artist_by_id(b)['notes'] == 'new'
+    assert _updated_at(a) != SENTINEL
+    assert _updated_at(b) != SENTINEL
+    assert _updated_at(c) == SENTINEL
+
+
+def test_noop_batch_skips_write():
+    artist_id = create_artist([], name_noob='batch_noop', post_count=3, skip_danbooru=True)
+    _reset_updated_at(artist_id)
+    version = get_data_version()
+
+    assert batch_update_artists([{'id': artist_id, 'post_count': 3, 'skip_danbooru': 1}]) == 0
+    assert batch_update_artists([]) == 0
+    assert get_data_version() == version
+    assert _updated_at(artist_id) == SENTINEL
+
+
+def test_category_links_are_diffed():
+    first = create_category('batch_first')
+    second = create_category('batch_second')
+    artist_id = create_artist([first], name_noob='batch_categories')
+
+    assert batch_update_artists([{'id': artist_id, 'category_ids': [first]}]) == 0
+    assert batch_update_artists([{'id': artist_id, 'category_ids': [second, first]}]) == 1
+    assert {c['id'] for c in get_artist_by_id(artist_id)['categories']} == {first, second}
+
+
+def test_rename_refreshes_identity_keys():
+    artist_id = create_artist([], name_noob='batch_rename_before')
+
+    assert batch_update_artists([{'id': artist_id, 'name_noob': 'batch_rename_after'}]) == 1
+    assert check_artist_exists(name_noob='batch_rename_before') is None
+    assert check_artist_exists(name_noob='Batch_Rename_After')['id'] == artist_id
@@ -0,0 +1,67 @@
+"""分类统计列（触发器增量维护，结果须与全量重新计算一致）"""
+import pytest
+
+from database import (
+    batch_create_artists, batch_update_artists, create_artist, create_category, delete_artist,
+    get_all_categories, init_db, rebuild_category_stats, set_artist_categories, update_artist
+)
+
+STATS = ('artist_count', 'total_post_count', 'max_post_count', 'incomplete_count')
+LINK = 'https://danbooru.donmai.us/posts?tags=stats_artist'
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _db():
+    init_db()
+
+
+def _stats(category_id):
+    category = next(c for c in get_all_categories() if c['id'] == category_id)
+    return tuple(category[column] for column in STATS)
+
+
+def _assert_stats(category_id, expected):
+    assert _stats(category_id) == expected
+    # 增量维护的结果与全量重建一致
+    rebuild_category_stats()
+    assert _stats(category_id) == expected
+
+
+def test_counters_follow_artist_changes():
+    category_id = create_category('stats_counters')
+    complete = create_artist([category_id], name_noob='stats_complete', post_count=40,
+                             danbooru_link=LINK, image_example='a.jpg')
+    top = create_artist([category_id], name_noob='stats_top', post_count=100)
+    _assert_stats(category_id, (2, 140, 100, 1))
+
+    # 最大值画师作品数减少时重新计算最大值
+    update_artist(top, post_count=10)
+    _assert_stats(category_id, (2, 50, 40, 1))
+
+    update_artist(top, danbooru_link=LINK, image_example='b.jpg')
+    _assert_stats(category_id, (2, 50, 40, 0))
+
+    batch_update_artists([{'id': complete, 'post_count': 0}, {'id': top, 'post_count': 15}])
+    _assert_stats(category_id, (2, 15, 15, 1))
+
+    delete_artist(top)
+    _assert_stats(category_id, (1, 0, 0, 1))
+
+
+def test_counters_follow_category_links():
+    first = create_category('stats_first')
+    second = create_category('stats_second')
+    ids = batch_create_artists([
+        {'category_ids': [first], 'name_noob': 'stats_bulk_a', 'post_count': 5},
+        {'category_ids': [first, second], 'name_noob': 'stats_bulk_b', 'post_count': 9},
+    ])
+    _assert_stats(first, (2, 14, 9, 2))
+    _assert_stats(second, (1, 9, 9, 1))
+
+    set_artist_categories(ids[1], [second])
+    _assert_stats(first, (1, 5, 5, 1))
+    _assert_stats(second, (1, 9, 9, 1))
+
+    batch_update_artists([{'id': ids[0], 'category_ids': [second]}])
+    _assert_stats(first, (0, 0, 0, 0))
+    _assert_stats(second, (2, 14, 9, 2))
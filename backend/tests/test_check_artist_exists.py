@@ -0,0 +1,54 @@
+"""画师查重（按字段比较身份键）"""
+import pytest
+
+from database import (
+    batch_create_artists, check_artist_exists, create_artist, get_all_artists_for_dedup, init_db, update_artist
+)
+
+
+@pytest.fixture(scope='module')
+def artist_id():
+    init_db()
+    # identity_key 取自 NOOB 名称，NAI 名称和链接中的标签与之不同
+    return create_artist([], name_noob='dedup_noob_name', name_nai='artist:dedup nai name',
+                         danbooru_link='https://danbooru.donmai.us/posts?tags=dedup_link_tag')
+
+
+def test_match_by_noob(artist_id):
+    assert check_artist_exists(name_noob='Dedup_Noob_Name')['id'] == artist_id
+
+
+def test_match_by_nai_only(artist_id):
+    assert check_artist_exists(name_nai='artist:Dedup_Nai_Name')['id'] == artist_id
+    assert check_artist_exists(name_noob='dedup_nai_name')['id'] == artist_id
+
+
+def test_match_by_link_only(artist_id):
+    assert check_artist_exists(danbooru_link='https://danbooru.donmai.us/posts?tags=Dedup_Link_Tag')['id'] == artist_id
+    assert check_artist_exists(name_nai='dedup link tag')['id'] == artist_id
+
+
+def test_no_match(artist_id):
+    assert check_artist_exists(name_noob='someone_else') is None
+    assert check_artist_exists() is None
+
+
+def test_import_dedup_map_has_every_field(artist_id):
+    by_identity = get_all_artists_for_dedup()['by_identity']
+    for key in ('dedup noob name', 'dedup nai name', 'dedup link tag'):
+        assert by_identity[key]['id'] == artist_id
+
+
+def test_keys_follow_rename(artist_id):
+    other = create_artist([], name_noob='rename_noob', name_nai='artist:rename old')
+    update_artist(other, name_nai='artist:rename new')
+    assert check_artist_exists(name_nai='rename old') is None
+    assert check_artist_exists(name_nai='rename new')['id'] == other
+
+
+def test_batch_created_artists_match_by_link(artist_id):
+    [created] = batch_create_artists([{
+        'category_ids': [], 'name_noob': 'batch_noob',
+        'danbooru_link': 'https://danbooru.donmai.us/posts?tags=batch_link_tag'
+    }])
+    assert check_artist_exists(name_nai='artist:batch link tag')['id'] == created
@@ -0,0 +1,54 @@
+"""重复画师的查找与合并（按字段比较身份键）"""
+import pytest
+
+from database import create_artist, find_duplicate_artists, init_db, merge_duplicate_artists
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _db():
+    init_db()
+
+
+def _group_ids(groups):
+    return [[g['canonical']['id']] + [a['id'] for a in g['duplicates']] for g in groups]
+
+
+def _all_groups():
+    groups, token = [], None
+    while True:
+        page = find_duplicate_artists(limit=1, cursor_token=token)
+        groups.extend(page['groups'])
+        token = page['next_cursor']
+        if not token:
+            return groups
+
+
+def test_groups_on_every_field():
+    noob = create_artist([], name_noob='dup_group_noob', name_nai='artist:dup group nai')
+    nai_only = create_artist([], name_nai='artist:Dup_Group_Nai')
+    link_only = create_artist([], name_noob='dup_group_other',
+                              danbooru_link='https://danbooru.donmai.us/posts?tags=dup_group_noob')
+    unrelated = create_artist([], name_noob='dup_group_unrelated')
+
+    groups = _group_ids(_all_groups())
+    assert [noob, nai_only, link_only] in groups
+    assert all(unrelated not in ids for ids in groups)
+    assert find_duplicate_artists()['total_groups'] == len(groups)
+
+
+def test_merge_only_within_group():
+    keep = create_artist([], name_noob='merge_keep', name_nai='artist:merge keep nai')
+    loser = create_artist([], name_nai='artist:merge keep nai')
+    stranger = create_artist([], name_noob='merge_stranger')
+
+    result = merge_duplicate_artists([{'keep_id': keep, 'remove_ids': [loser, stranger]}])
+    assert result['removed_count'] == 1
+    assert all(keep not in ids for ids in _group_ids(_all_groups()))
+    assert all(stranger not in ids for ids in _group_ids(_all_groups()))
+
+
+def test_merge_all():
+    create_artist([], name_noob='merge_all_a', danbooru_link='https://danbooru.donmai.us/posts?tags=merge_all_b')
+    create_artist([], name_noob='merge_all_b')
+    merge_duplicate_artists()
+    assert find_duplicate_artists()['total_groups'] == 0
@@ -0,0 +1,64 @@
+"""示例图下载：原图超过像素上限时改用缩小版本"""
+import asyncio
+import io
+
+from PIL import Image
+
+import utils
+
+
+class _Response:
+    def __init__(self, body: bytes, content_type: str):
+        self.status_code = 200
+        self.headers = {'Content-Type': content_type, 'Content-Length': str(len(body))}
+        self._body = body
+
+    async def aiter_content(self):
+        yield self._body
+
+    async def aclose(self):
+        pass
+
+
+class _Session:
+    def __init__(self, files):
+        self.files = files
+        self.requested = []
+
+    async def get(self, url, **kwargs):
+        self.requested.append(url)
+        return _Response(*self.files[url])
+
+
+def _image_bytes(size, fmt):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def test_oversized_original_falls_back_to_sample(monkeypatch, tmp_path):
+    monkeypatch.setattr(utils, 'IMAGES_DIR', tmp_path)
+    monkeypatch.setattr(utils, 'IMAGE_MAX_PIXELS', 100 * 100)
+    post = {
+        'id': 1,
+        'large_file_url': 'https://cdn.example/original.png',
+        'media_asset': {'variants': [
+            {'type': '360x360', 'url': 'https://cdn.example/360.jpg'},
+            {'type': 'sample', 'url': 'https://cdn.example/sample.jpg'},
+        ]},
+    }
+    session = _Session({
+        'https://cdn.example/original.png': (_image_bytes((200, 200), 'PNG'), 'image/png'),
+        'https://cdn.example/sample.jpg': (_image_bytes((80, 80), 'JPEG'), 'image/jpeg'),
+    })
+
+    async def fake_posts(*args, **kwargs):
+        return [post]
+    monkeypatch.setattr(utils, 'get_posts_api', fake_posts)
+
+    filename = asyncio.run(utils.get_example_image_api(session, 'artist', 'uuid-1', max_retries=1))
+
+    assert filename == 'uuid-1.jpg'
+    assert session.requested == ['https://cdn.example/original.png', 'https://cdn.example/sample.jpg']
+    with Image.open(tmp_path / filename) as img:
+        assert img.size == (80, 80)
@@ -0,0 +1,54 @@
+"""画师模糊搜索（三元组 Jaccard 相似度排序）"""
+import pytest
+
+from database import create_artist, fuzzy_search_artists, init_db, update_artist
+
+
+@pytest.fixture(scope='module')
+def artists():
+    init_db()
+    return {
+        'exact': create_artist([], name_noob='zyxwvu_morikawa'),
+        'typo': create_artist([], name_noob='zyxwvu_morikava'),
+        'distant': create_artist([], name_noob='zyxwvu_mori'),
+        'nai_only': create_artist([], name_nai='artist:zyxwvu hanabusa'),
+    }
+
+
+def _scores(query, **kwargs):
+    return [(a['id'], a['score']) for a in fuzzy_search_artists(query, **kwargs)]
+
+
+def test_ranks_by_similarity(artists):
+    results = _scores('zyxwvu morikawa')
+    ids = [artist_id for artist_id, _ in results]
+
+    assert results[0] == (artists['exact'], 1.0)
+    assert ids.index(artists['typo']) < ids.index(artists['distant'])
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+
+def test_ignores_spacing_and_prefix(artists):
+    # 模糊匹配键去除所有空白，并按身份键规则清洗 artist: 前缀和下划线
+    assert _scores('artist:zyxwvu_hanabusa')[0] == (artists['nai_only'], 1.0)
+    assert _scores('zyxwvuhana busa')[0] == (artists['nai_only'], 1.0)
+
+
+def test_min_score_and_limit(artists):
+    assert [a for a, _ in _scores('zyxwvu morikawa', min_score=0.99)] == [artists['exact']]
+    assert len(_scores('zyxwvu morikawa', limit=2)) == 2
+    assert _scores('  ') == []
+
+
+def test_tie_broken_by_post_count():
+    low = create_artist([], name_noob='qwvxz tie', post_count=3)
+    high = create_artist([], name_noob='qwvxz_tie', post_count=30)
+    assert [a for a, _ in _scores('qwvxz tie')] == [high, low]
+
+
+def test_index_follows_rename(artists):
+    artist_id = create_artist([], name_noob='zyxwvu_renamed_before')
+    update_artist(artist_id, name_noob='jklmn_renamed_after')
+
+    assert artist_id not in [a for a, _ in _scores('zyxwvu renamed before', min_score=0.5)]
+    assert _scores('jklmn renamed after')[0] == (artist_id, 1.0)
@@ -0,0 +1,60 @@
+"""画师列表的键集分页（游标）"""
+import pytest
+
+from database import create_artist, create_category, init_db, list_artists
+
+
+@pytest.fixture(scope='module')
+def category_id():
+    init_db()
+    category_id = create_category('keyset_pagination')
+    # 含相同作品数的画师，按 (作品数, id) 排序才能稳定分页；post_count 为空按 0 排序
+    for index, post_count in enumerate([5, 3, 5, None, 8, 3, 5]):
+        create_artist([category_id], name_noob=f'keyset_artist_{index}', post_count=post_count)
+    return category_id
+
+
+def _pages(category_id, sort, limit=3):
+    pages, token = [], None
+    while True:
+        page = list_artists(limit=limit, cursor_token=token, sort=sort, category_id=category_id)
+        pages.append(page)
+        token = page['next_cursor']
+        if not token:
+            return pages
+
+
+def _expected(category_id, sort):
+    items = list_artists(limit=500, sort=sort, category_id=category_id)['items']
+    key = lambda a: (a['post_count'] or 0, a['id'])
+    return [a['id'] for a in sorted(items, key=key, reverse=sort == 'count_desc')]
+
+
+@pytest.mark.parametrize('sort', ['count_desc', 'count_asc'])
+def test_pages_cover_all_in_order(category_id, sort):
+    pages = _pages(category_id, sort)
+    ids = [a['id'] for page in pages for a in page['items']]
+
+    assert [len(page['items']) for page in pages] == [3, 3, 1]
+    assert all(page['total'] == 7 for page in pages)
+    assert ids == _expected(category_id, sort)
+    assert all(a['categories'][0]['id'] == category_id for page in pages for a in page['items'])
+
+
+def test_cursor_is_stable_across_inserts(category_id):
+    first = list_artists(limit=3, sort='count_desc', category_id=category_id)
+    # 插入排在已读页之前的画师，后续页不会重复或遗漏
+    create_artist([category_id], name_noob='keyset_artist_late', post_count=100)
+    rest = list_artists(limit=500, cursor_token=first['next_cursor'], sort='count_desc', category_id=category_id)
+
+    seen = [a['id'] for a in first['items']] + [a['id'] for a in rest['items']]
+    assert len(seen) == len(set(seen)) == 7
+    assert rest['next_cursor'] is None
+    assert rest['total'] == 8
+
+
+def test_invalid_arguments(category_id):
+    with pytest.raises(ValueError):
+        list_artists(cursor_token='not-a-cursor', category_id=category_id)
+    with pytest.raises(ValueError):
+        list_artists(sort='name', category_id=category_id)
@@ -0,0 +1,47 @@
+"""画师串条目随画师改名同步（artists_preset_items_rename 触发器）"""
+import pytest
+
+from database import (create_artist, get_db, get_preset_items, get_presets_by_artist, init_db,
+                      update_artist, write_preset_items)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _db():
+    init_db()
+
+
+def _create_preset(name, noob_text, nai_text):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO artist_presets (name, description, noob_text, nai_text) VALUES (?, '', ?, ?)",
+                       (name, noob_text, nai_text))
+        preset_id = cursor.lastrowid
+        write_preset_items(cursor, preset_id, noob_text, nai_text)
+        return preset_id
+
+
+def test_rename_updates_linked_items():
+    artist_id = create_artist([], name_noob='preset_old', name_nai='artist:preset old nai')
+    preset_id = _create_preset('rename linked', '(preset_old:1.2), other_artist', '1.1::artist:preset_old::')
+
+    update_artist(artist_id, name_noob='preset_new_\\(x\\)', name_nai='artist:preset new nai')
+
+    items = get_preset_items(preset_id)
+    assert [(i['name'], i['artist_id'], i['weight']) for i in items['noob']] == [
+        ('preset new (x)', artist_id, 1.2), ('other artist', None, 1.0)]
+    assert [(i['name'], i['artist_id']) for i in items['nai']] == [('preset new (x)', artist_id)]
+    assert [p['id'] for p in get_presets_by_artist(artist_id)] == [preset_id]
+
+    with get_db() as conn:
+        keys = {row['identity_key'] for row in conn.execute(
+            "SELECT identity_key FROM artist_preset_items WHERE artist_id = ?", (artist_id,))}
+    assert keys == {'preset new (x)'}
+
+
+def test_rename_links_unmatched_items():
+    preset_id = _create_preset('rename unmatched', 'preset_later', '')
+    assert get_preset_items(preset_id)['noob'][0]['artist_id'] is None
+
+    artist_id = create_artist([], name_noob='preset_placeholder')
+    update_artist(artist_id, name_noob='preset_later')
+    assert get_preset_items(preset_id)['noob'][0]['artist_id'] == artist_id
@@ -0,0 +1,51 @@
+"""限速器并发名额的归还"""
+import asyncio
+
+from utils import AdaptiveRateLimiter, limited_get
+
+
+class _HangingSession:
+    """请求永远不返回的会话"""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+
+    async def get(self, url, **kwargs):
+        self.started.set()
+        await asyncio.Event().wait()
+
+
+def _make_limiter():
+    return AdaptiveRateLimiter('test', rate=100, min_rate=1, max_rate=100,
+                               concurrency=2, max_concurrency=2)
+
+
+def test_cancelled_request_releases_limiter():
+    limiter = _make_limiter()
+
+    async def run():
+        session = _HangingSession()
+        task = asyncio.create_task(limited_get(limiter, session, 'https://example.invalid'))
+        await session.started.wait()
+        assert limiter.state()['in_flight'] == 1
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    assert limiter.state()['in_flight'] == 0
+
+
+def test_timed_out_request_releases_limiter():
+    limiter = _make_limiter()
+
+    async def run():
+        try:
+            await asyncio.wait_for(limited_get(limiter, _HangingSession(), 'https://example.invalid'), 0.05)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(run())
+    assert limiter.state()['in_flight'] == 0
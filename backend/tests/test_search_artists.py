@@ -0,0 +1,49 @@
+"""画师全文搜索（FTS5 trigram）"""
+import pytest
+
+from database import create_artist, delete_artist, init_db, search_artists, update_artist
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _db():
+    init_db()
+
+
+def _ids(query, **kwargs):
+    return [a['id'] for a in search_artists(query, **kwargs)]
+
+
+def test_matches_cleaned_names_and_notes():
+    noob = create_artist([], name_noob='fts_kuro_\\(circle\\)')
+    nai = create_artist([], name_nai='artist:fts shiro')
+    notes = create_artist([], name_noob='fts_other', notes='画风类似 fts kuro')
+
+    # NOOB 格式的括号转义、NAI 格式的 artist: 前缀和下划线都按清洗后的名称匹配
+    assert _ids('fts_kuro_\\(circle') == [noob]
+    assert _ids('artist:FTS Shiro') == [nai]
+    # 名称命中排在备注命中之前
+    assert _ids('fts kuro') == [noob, notes]
+
+    result = search_artists('kuro (circle)')[0]
+    assert result['highlights']['name_noob'] == 'fts <mark>kuro (circle)</mark>'
+    assert '<mark>' in search_artists('画风类似')[0]['highlights']['notes']
+
+
+def test_index_follows_updates_and_deletes():
+    artist_id = create_artist([], name_noob='fts_before_rename')
+    update_artist(artist_id, name_noob='fts_after_rename')
+    assert _ids('before rename') == []
+    assert _ids('after rename') == [artist_id]
+
+    delete_artist(artist_id)
+    assert _ids('after rename') == []
+
+
+def test_short_query_and_ordering():
+    low = create_artist([], name_noob='fts_qz_low', post_count=1)
+    high = create_artist([], name_noob='fts_qz_high', post_count=50)
+
+    # 少于 3 个字符时回退为 LIKE，按作品数降序
+    assert _ids('qz') == [high, low]
+    assert _ids('qz', limit=1) == [high]
+    assert search_artists('   ') == []
@@ -0,0 +1,61 @@
+"""画师写入队列"""
+import time
+
+import pytest
+
+from database import ArtistWriteQueue, create_artist, get_artist_by_id, init_db
+
+
+@pytest.fixture(scope='module', autouse=True)
+def _db():
+    init_db()
+
+
+def test_on_flush_error_keeps_writer_running():
+    def on_flush(count):
+        raise RuntimeError('callback failed')
+
+    queue = ArtistWriteQueue(max_items=1, max_delay_ms=10, on_flush=on_flush)
+    first = create_artist([], name_noob='queue_first')
+    second = create_artist([], name_noob='queue_second')
+
+    queue.submit(first, notes='one')
+    assert queue.flush(5)
+    queue.submit(second, notes='two')
+    assert queue.flush(5)
+    queue.close(5)
+
+    assert get_artist_by_id(first)['notes'] == 'one'
+    assert get_artist_by_id(second)['notes'] == 'two'
+
+
+def test_flush_times_out():
+    class SlowQueue(ArtistWriteQueue):
+        def _write(self, batch):
+            time.sleep(0.5)
+            return super()._write(batch)
+
+    queue = SlowQueue(max_items=100, max_delay_ms=10)
+    artist_id = create_artist([], name_noob='queue_timeout')
+
+    queue.submit(artist_id, notes='late')
+    assert queue.flush(0.05) is False
+    assert queue.flush(5)
+    queue.close(5)
+    assert get_artist_by_id(artist_id)['notes'] == 'late'
+
+
+def test_fetch_status_written_with_fields():
+    queue = ArtistWriteQueue(max_items=100, max_delay_ms=10)
+    fetched = create_artist([], name_noob='queue_fetched')
+    failed = create_artist([], name_noob='queue_failed')
+
+    queue.submit(fetched, fetch_status='ok', post_count=12)
+    queue.submit(failed, fetch_status='failed')
+    assert queue.flush(5)
+    queue.close(5)
+
+    artist = get_artist_by_id(fetched)
+    assert (artist['post_count'], artist['fetch_status']) == (12, 'ok')
+    artist = get_artist_by_id(failed)
+    assert artist['fetch_status'] == 'failed' and artist['last_fetched_at']
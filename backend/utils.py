@@ -7,12 +7,19 @@ import random
 import os
 import asyncio
 import base64
-from io import BytesIO
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import unquote
+from email.utils import parsedate_to_datetime
 from typing import Optional, Dict, Tuple, List
 from curl_cffi.requests import AsyncSession
 from PIL import Image
 
+import http_cache
+
 logging.basicConfig(level=logging.INFO)
 
 # 数据目录（支持通过环境变量配置，默认为 backend 目录）
@@ -29,6 +36,22 @@ BACKGROUNDS_DIR.mkdir(parents=True, exist_ok=True)
 # Danbooru API 配置
 DANBOORU_API_BASE = "https://danbooru.donmai.us"
 
+# 示例图下载：单张图片的字节上限、保存尺寸上限（长边像素）和解码像素上限
+IMAGE_MAX_BYTES = 20 * 1024 * 1024
+IMAGE_MAX_SIZE = (1024, 1024)
+IMAGE_MAX_PIXELS = 16_000_000
+
+# 原图超过上述上限时依次改用帖子的这些缩小版本（Danbooru media_asset.variants，从大到小）
+IMAGE_FALLBACK_VARIANTS = ('sample', '720x720', '360x360')
+
+class ImageTooLargeError(ValueError):
+    """图片字节数或像素数超过上限（可改用同一帖子的缩小版本）"""
+
+# 图片解码使用固定的少量线程（PNG 等格式无法按比例解码，限制并发以控制峰值内存；
+# 复用同一批线程也避免每个临时线程各自占用一块内存分配区）
+IMAGE_DECODE_CONCURRENCY = 2
+_image_decode_executor = ThreadPoolExecutor(max_workers=IMAGE_DECODE_CONCURRENCY, thread_name_prefix='image-decode')
+
 # 业务相关请求头
 DEFAULT_HEADERS = {
     "Accept": "application/json, text/plain, */*",
@@ -57,6 +80,40 @@ def clean_artist_name(name: str) -> str:
     name = re.sub(r'\\([()])', r'\1', name)
     return name
 
+def artist_identity_key(name: str) -> str:
+    """
+    画师身份键（用于去重和匹配）:去除 "artist:" 前缀,按 clean_artist_name 规则清洗,
+    合并多余空格并转小写。与前端 cleanSingleArtistName(...).toLowerCase() 一致。
+    """
+    if not isinstance(name, str):
+        return ""
+    name = name.strip()
+    if name.startswith("artist:"):
+        name = name[7:]
+    return " ".join(clean_artist_name(name).split()).lower()
+
+def artist_identity_from_fields(name_noob: str, name_nai: str, danbooru_link: str) -> str:
+    """
+    根据画师记录的字段生成身份键,依次使用 NOOB 名称、NAI 名称、Danbooru 链接中的标签
+    """
+    for name in (name_noob, name_nai):
+        key = artist_identity_key(name)
+        if key:
+            return key
+    return artist_link_key(danbooru_link)
+
+def artist_link_key(danbooru_link: str) -> str:
+    """Danbooru 链接中画师标签的身份键"""
+    return artist_identity_key(unquote(extract_artist_tag_from_url(danbooru_link)))
+
+def artist_field_keys(name_noob: str, name_nai: str, danbooru_link: str) -> List[str]:
+    """
+    按字段分别生成的身份键（去重后，忽略空值）
+    记录的 identity_key 只取第一个非空字段，查重时需逐个字段比较，才能匹配只有 NAI 名称或链接相同的画师
+    """
+    keys = (artist_identity_key(name_noob), artist_identity_key(name_nai), artist_link_key(danbooru_link))
+    return [key for key in dict.fromkeys(keys) if key]
+
 def format_noob(name: str) -> str:
     """
     NOOB 格式:先清洗,然后对括号添加反斜杠转义。
@@ -147,6 +204,241 @@ def auto_complete_names(name_noob: str, name_nai: str, danbooru_link: str) -> tu
 
     return name_noob, name_nai, danbooru_link
 
+# -------------------------------
+# 预设提示词解析
+# -------------------------------
+
+# NAI 权重块: 1.2::name:: 或 1.2::a, b::
+_NAI_WEIGHT_BLOCK = re.compile(r'(\d+(?:\.\d+)?)::(.*?)::', re.S)
+# NOOB 权重格式: (name:1.2)，内容可嵌套
+_NOOB_WEIGHT_GROUP = re.compile(r'^\((.+):(\d+(?:\.\d+)?)\)$', re.S)
+
+def _split_prompt_parts(content: str) -> List[str]:
+    """按顶层逗号/换行分隔提示词，忽略括号内和转义括号（与前端 splitNoobContent 一致）"""
+    parts = []
+    current = []
+    depth = 0
+    i = 0
+    while i < len(content):
+        char = content[i]
+        if char == '\\' and content[i + 1:i + 2] in ('(', ')'):
+            current.append(content[i:i + 2])
+            i += 2
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char in ',，\n' and depth <= 0:
+            part = ''.join(current).strip()
+            if part:
+                parts.append(part)
+            current = []
+            i += 1
+            continue
+        current.append(char)
+        i += 1
+
+    part = ''.join(current).strip()
+    if part:
+        parts.append(part)
+    return parts
+
+def _parse_noob_prompt(content: str, weight: float) -> List[Dict]:
+    tokens = []
+    for part in _split_prompt_parts(content):
+        match = _NOOB_WEIGHT_GROUP.match(part)
+        if match:
+            tokens.extend(_parse_noob_prompt(match.group(1), float(match.group(2))))
+            continue
+        name = clean_artist_name(part)
+        if name.startswith("artist:"):
+            name = name[7:].strip()
+        if name:
+            tokens.append({'raw': part, 'name': name, 'weight': weight})
+    return tokens
+
+def parse_prompt_artists(text: str, weight: float = 1.0) -> List[Dict]:
+    """
+    解析预设提示词中的画师标签，支持 NOOB 权重 (name:1.2)（可嵌套）和 NAI 权重 1.2::name::
+    返回: [{'raw': 原始片段, 'name': 清洗后的名称, 'weight': 权重}, ...]，按出现顺序
+    """
+    if not isinstance(text, str) or not text.strip():
+        return []
+
+    tokens = []
+    pos = 0
+    for match in _NAI_WEIGHT_BLOCK.finditer(text):
+        tokens.extend(_parse_noob_prompt(text[pos:match.start()], weight))
+        tokens.extend(_parse_noob_prompt(match.group(2), float(match.group(1))))
+        pos = match.end()
+    tokens.extend(_parse_noob_prompt(text[pos:], weight))
+    return tokens
+
+
+# -------------------------------
+# 请求限速（进程内共享的自适应令牌桶）
+# -------------------------------
+
+class AdaptiveRateLimiter:
+    """
+    自适应令牌桶限速器（AIMD）
+    - 每次成功请求小幅增加速率和并发上限（加性增）
+    - 遇到 429/503 时速率和并发减半（乘性减），并按 Retry-After 暂停所有请求
+    状态由线程锁保护，可在多个线程各自的事件循环中共享
+    """
+
+    def __init__(self, name: str, rate: float, min_rate: float, max_rate: float,
+                 concurrency: float, max_concurrency: float, min_concurrency: float = 1.0,
+                 default_backoff: float = 5.0):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.default_backoff = default_backoff
+
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'last_throttled_at': None}
+
+    def _refill(self, now: float):
+        # 令牌桶容量为 1 秒的配额（至少 1 个令牌）
+        self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    async def acquire(self):
+        """等待令牌和并发名额"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._in_flight >= int(self.concurrency):
+                    wait = 0.05
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    self._in_flight += 1
+                    self._stats['requests'] += 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+    def release(self, throttled: bool = False, retry_after: Optional[float] = None, error: bool = False):
+        """请求结束时调用：成功时加性增，被限流时乘性减并暂停"""
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            now = time.monotonic()
+            if throttled:
+                self._stats['throttled'] += 1
+                self._stats['last_throttled_at'] = time.time()
+                self._blocked_until = max(self._blocked_until, now + (retry_after or self.default_backoff))
+                self._tokens = 0.0
+                # 同一轮拥塞中并发返回的多个 429 只减一次
+                if now - self._last_decrease > 1.0:
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                    self._last_decrease = now
+            elif error:
+                self._stats['errors'] += 1
+            else:
+                # 每秒约增加 0.5 req/s；并发每满一轮增加 1
+                self.rate = min(self.max_rate, self.rate + 0.5 / max(self.rate, 1.0))
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / max(self.concurrency, 1.0))
+
+    def state(self) -> Dict:
+        """当前限速状态（用于状态接口）"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                'name': self.name,
+                'rate': round(self.rate, 3),
+                'rate_range': [self.min_rate, self.max_rate],
+                'concurrency': round(self.concurrency, 3),
+                'concurrency_range': [self.min_concurrency, self.max_concurrency],
+                'in_flight': self._in_flight,
+                'tokens': round(self._tokens, 3),
+                'blocked_for': round(max(0.0, self._blocked_until - now), 3),
+                **self._stats
+            }
+
+# Danbooru API 与图片 CDN 分别限速
+DANBOORU_API_LIMITER = AdaptiveRateLimiter(
+    'danbooru_api', rate=2.0, min_rate=0.2, max_rate=10.0, concurrency=3, max_concurrency=8
+)
+DANBOORU_CDN_LIMITER = AdaptiveRateLimiter(
+    'danbooru_cdn', rate=4.0, min_rate=0.5, max_rate=20.0, concurrency=4, max_concurrency=16
+)
+
+# 被限流时的最大重试次数
+THROTTLE_MAX_RETRIES = 3
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+async def close_stream(response):
+    """
+    关闭流式响应：先通知 curl 停止接收，再等待后台传输结束
+    （直接 aclose 会等整个响应体下载完，未读取的数据会堆积在内存队列中）
+    """
+    if getattr(response, 'quit_now', None) is not None:
+        response.quit_now.set()
+    await response.aclose()
+
+async def limited_get(limiter: AdaptiveRateLimiter, session: AsyncSession, url: str, **kwargs):
+    """
+    经限速器发出 GET 请求；遇到 429/503 时按 Retry-After 等待后重试
+    返回最后一次的响应（重试耗尽时为 429/503 响应），网络异常照常抛出
+    """
+    for attempt in range(THROTTLE_MAX_RETRIES + 1):
+        await limiter.acquire()
+        try:
+            response = await session.get(url, **kwargs)
+        except BaseException:
+            # 包括任务取消和 wait_for 超时，否则并发名额永远不会归还
+            limiter.release(error=True)
+            raise
+
+        if response.status_code in (429, 503):
+            retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+            limiter.release(throttled=True, retry_after=retry_after)
+            logging.warning(f"[{limiter.name}] 请求被限流 (HTTP {response.status_code})，"
+                            f"{retry_after or limiter.default_backoff:.1f} 秒后重试")
+            if attempt < THROTTLE_MAX_RETRIES:
+                # 流式请求需要先释放连接再重试
+                if kwargs.get('stream'):
+                    await close_stream(response)
+                continue
+        else:
+            limiter.release(error=response.status_code >= 500)
+        return response
+
+def get_rate_limiter_state() -> Dict[str, Dict]:
+    """获取所有限速器的当前状态"""
+    return {
+        'api': DANBOORU_API_LIMITER.state(),
+        'images': DANBOORU_CDN_LIMITER.state()
+    }
+
 
 # -------------------------------
 # Danbooru API 辅助函数
@@ -180,13 +472,63 @@ def get_auth_header(username: str, api_key: str) -> Dict[str, str]:
     return {"Authorization": f"Basic {encoded}"}
 
 
+async def cached_api_json(
+    session: AsyncSession,
+    endpoint: str,
+    cache_key: str,
+    url: str,
+    params: Dict,
+    headers: Dict[str, str],
+    force_refresh: bool = False
+):
+    """
+    带持久化缓存的 Danbooru API GET 请求
+    有效期内直接返回缓存；过期后携带 ETag / Last-Modified 条件请求，304 时沿用缓存
+    force_refresh 为 True 时跳过有效期判断（仍可用条件请求复用未变化的响应）
+    返回解析后的 JSON，请求失败返回 None
+    """
+    entry = http_cache.lookup(endpoint, cache_key)
+    if entry and entry['fresh'] and not force_refresh:
+        return json.loads(entry['body'])
+
+    request_headers = dict(headers)
+    if entry:
+        if entry['etag']:
+            request_headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            request_headers['If-Modified-Since'] = entry['last_modified']
+
+    response = await limited_get(
+        DANBOORU_API_LIMITER, session, url,
+        params=params,
+        headers=request_headers,
+        timeout=30
+    )
+
+    if response.status_code == 304 and entry:
+        http_cache.mark_revalidated(endpoint, cache_key)
+        return json.loads(entry['body'])
+    if response.status_code != 200:
+        logging.warning(f"请求 {endpoint} 失败: HTTP {response.status_code}")
+        return None
+
+    body = response.text
+    http_cache.store(
+        endpoint, cache_key, body,
+        etag=response.headers.get('ETag'),
+        last_modified=response.headers.get('Last-Modified')
+    )
+    return json.loads(body)
+
+
 async def get_post_count_api(
     session: AsyncSession,
     artist_tag: str,
-    auth_header: Dict[str, str] = None
+    auth_header: Dict[str, str] = None,
+    force_refresh: bool = False
 ) -> Optional[int]:
     """
-    通过 API 获取作品数量
+    通过 API 获取作品数量（结果持久化缓存）
     GET /counts/posts.json?tags={artist_tag}
     返回: {"counts": {"posts": 数量}}
     """
@@ -195,19 +537,16 @@ async def get_post_count_api(
         if auth_header:
             headers.update(auth_header)
 
-        response = await session.get(
+        data = await cached_api_json(
+            session, 'counts', artist_tag,
             f"{DANBOORU_API_BASE}/counts/posts.json",
             params={"tags": artist_tag},
             headers=headers,
-            timeout=30
+            force_refresh=force_refresh
         )
-
-        if response.status_code == 200:
-            data = response.json()
-            return data.get("counts", {}).get("posts")
-        else:
-            logging.warning(f"获取作品数量失败: HTTP {response.status_code}")
+        if data is None:
             return None
+        return data.get("counts", {}).get("posts")
     except Exception as e:
         logging.warning(f"获取作品数量异常: {e}")
         return None
@@ -217,10 +556,11 @@ async def get_posts_api(
     session: AsyncSession,
     artist_tag: str,
     limit: int = 10,
-    auth_header: Dict[str, str] = None
+    auth_header: Dict[str, str] = None,
+    force_refresh: bool = False
 ) -> List[Dict]:
     """
-    通过 API 获取帖子列表
+    通过 API 获取帖子列表（结果持久化缓存）
     GET /posts.json?tags={artist_tag}&limit={limit}
     """
     try:
@@ -228,23 +568,43 @@ async def get_posts_api(
         if auth_header:
             headers.update(auth_header)
 
-        response = await session.get(
+        data = await cached_api_json(
+            session, 'posts', f"{artist_tag}|{limit}",
             f"{DANBOORU_API_BASE}/posts.json",
             params={"tags": artist_tag, "limit": limit},
             headers=headers,
-            timeout=30
+            force_refresh=force_refresh
         )
-
-        if response.status_code == 200:
-            return response.json()
-        else:
-            logging.warning(f"获取帖子列表失败: HTTP {response.status_code}")
-            return []
+        return data or []
     except Exception as e:
         logging.warning(f"获取帖子列表异常: {e}")
         return []
 
 
+def _convert_image_to_jpeg(src_path: Path, dest_path: Path):
+    """
+    将下载的图片缩小到 IMAGE_MAX_SIZE 以内并保存为 JPEG（质量 80%）
+    JPEG 通过 draft() 在解码阶段按比例缩小，其余格式先检查像素数再用 reduce 缩小，
+    避免按原图分辨率解码（超过 IMAGE_MAX_PIXELS 时抛出 ImageTooLargeError）；
+    先写入临时文件再原子替换，失败时不会留下不完整的图片
+    """
+    with Image.open(src_path) as img:
+        img.draft('RGB', IMAGE_MAX_SIZE)
+        if img.width * img.height > IMAGE_MAX_PIXELS:
+            raise ImageTooLargeError(f"图片尺寸过大: {img.width}x{img.height}")
+
+        img.thumbnail(IMAGE_MAX_SIZE, reducing_gap=3.0)
+        # 转换为 RGB 模式（处理 PNG 透明通道等）
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        tmp_path = dest_path.with_name(f".{dest_path.name}.tmp")
+        try:
+            img.save(tmp_path, 'JPEG', quality=80, optimize=True)
+            os.replace(tmp_path, dest_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
 async def download_image_api(
     session: AsyncSession,
     url: str,
@@ -253,8 +613,11 @@ async def download_image_api(
 ) -> Optional[str]:
     """
     下载图片到本地，转换为 JPEG 格式
-    返回: 本地文件名(例如 "uuid.jpg") 或 None
+    响应体流式写入临时文件（超过 IMAGE_MAX_BYTES 或不是图片时立即中止），内存占用与原图大小无关
+    返回: 本地文件名(例如 "uuid.jpg") 或 None；图片超过字节数或像素数上限时抛出 ImageTooLargeError
     """
+    download_path = IMAGES_DIR / f".{artist_identifier}.download"
+    response = None
     try:
         logging.info(f"正在下载图片: {url[:80]}...")
 
@@ -268,55 +631,85 @@ async def download_image_api(
             "Sec-Fetch-Site": "cross-site",
         }
 
-        response = await session.get(
+        response = await limited_get(
+            DANBOORU_CDN_LIMITER, session,
             url,
             headers=image_headers,
             timeout=timeout,
-            allow_redirects=True
+            allow_redirects=True,
+            stream=True
         )
 
         if response.status_code != 200:
             logging.warning(f"图片下载失败: HTTP {response.status_code}")
             return None
 
-        image_content = response.content
-
-        # 使用 Pillow 处理图片：转换为 JPEG 格式，质量 80%
+        # 读取响应体之前先检查类型和声明的大小（视频、压缩包等直接跳过）
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type and (not content_type.startswith('image/') or content_type == 'image/svg+xml'):
+            logging.warning(f"跳过非图片内容: {content_type}")
+            return None
+        content_length = response.headers.get('Content-Length', '')
+        if content_length.isdigit() and int(content_length) > IMAGE_MAX_BYTES:
+            raise ImageTooLargeError(f"图片过大: {int(content_length)} 字节")
+
+        received = 0
+        with open(download_path, 'wb') as f:
+            async for chunk in response.aiter_content():
+                received += len(chunk)
+                if received > IMAGE_MAX_BYTES:
+                    raise ImageTooLargeError(f"图片超过 {IMAGE_MAX_BYTES} 字节，已中止下载")
+                f.write(chunk)
+
+        # 生成文件名（统一使用 .jpg 后缀）
+        filename = f"{artist_identifier}.jpg"
+        filepath = IMAGES_DIR / filename
+
+        # 使用 Pillow 处理图片（在解码线程中执行，不阻塞其他并发下载）
         try:
-            with Image.open(BytesIO(image_content)) as img:
-                # 转换为 RGB 模式（处理 PNG 透明通道等）
-                if img.mode in ('RGBA', 'P', 'LA'):
-                    img = img.convert('RGB')
-
-                # 生成文件名（统一使用 .jpg 后缀）
-                filename = f"{artist_identifier}.jpg"
-                filepath = IMAGES_DIR / filename
-
-                # 如果已存在同标识符的其他格式图片，先删除
-                for old_file in IMAGES_DIR.glob(f"{artist_identifier}.*"):
-                    if old_file.name != filename:
-                        old_file.unlink()
-                        logging.info(f"删除旧图片: {old_file.name}")
-
-                # 保存为 JPEG
-                img.save(filepath, 'JPEG', quality=80, optimize=True)
-                logging.info(f"图片已转换并保存为 JPEG: {filename}")
-                return filename
+            await asyncio.get_running_loop().run_in_executor(
+                _image_decode_executor, _convert_image_to_jpeg, download_path, filepath
+            )
+        except ImageTooLargeError:
+            raise
         except Exception as e:
             logging.error(f"图片处理失败: {e}")
             return None
 
+        # 如果已存在同标识符的其他格式图片，删除
+        for old_file in IMAGES_DIR.glob(f"{artist_identifier}.*"):
+            if old_file.name != filename:
+                old_file.unlink()
+                logging.info(f"删除旧图片: {old_file.name}")
+
+        logging.info(f"图片已转换并保存为 JPEG: {filename}")
+        return filename
+
+    except ImageTooLargeError:
+        raise
     except Exception as e:
         logging.warning(f"下载图片失败: {url} - {e}")
         return None
+    finally:
+        if response is not None:
+            await close_stream(response)
+        download_path.unlink(missing_ok=True)
+
 
+def _post_image_urls(post: dict) -> List[str]:
+    """帖子可下载的图片地址：首选地址在前，其后为按尺寸从大到小的缩小版本"""
+    urls = [post.get('large_file_url') or post.get('file_url')]
+    variants = {v.get('type'): v.get('url') for v in (post.get('media_asset') or {}).get('variants') or []}
+    urls.extend(variants.get(variant) for variant in IMAGE_FALLBACK_VARIANTS)
+    return [url for url in dict.fromkeys(urls) if url]
 
 async def get_example_image_api(
     session: AsyncSession,
     artist_tag: str,
     artist_identifier: str,
     auth_header: Dict[str, str] = None,
-    max_retries: int = 5
+    max_retries: int = 5,
+    force_refresh: bool = False
 ) -> Optional[str]:
     """
     获取画师的示例图片并下载到本地
@@ -324,7 +717,8 @@ async def get_example_image_api(
     """
     try:
         # 获取帖子列表
-        posts = await get_posts_api(session, artist_tag, limit=10, auth_header=auth_header)
+        posts = await get_posts_api(session, artist_tag, limit=10, auth_header=auth_header,
+                                    force_refresh=force_refresh)
 
         if not posts:
             logging.debug(f"未找到画师 {artist_tag} 的帖子")
@@ -350,14 +744,16 @@ async def get_example_image_api(
             post = random.choice(available_posts)
             tried_posts.add(post.get('id'))
 
-            # 优先使用 large_file_url（较小），否则使用 file_url（原图）
-            image_url = post.get('large_file_url') or post.get('file_url')
-
-            if not image_url:
-                continue
-
-            logging.info(f"尝试下载图片 ({attempt + 1}/{max_retries}): {image_url[:80]}...")
-            filename = await download_image_api(session, image_url, artist_identifier)
+            # 优先使用 large_file_url（较小），否则使用 file_url（原图）；超过上限时改用更小的版本
+            filename = None
+            for image_url in _post_image_urls(post):
+                logging.info(f"尝试下载图片 ({attempt + 1}/{max_retries}): {image_url[:80]}...")
+                try:
+                    filename = await download_image_api(session, image_url, artist_identifier)
+                except ImageTooLargeError as e:
+                    logging.warning(f"{e}，改用较小的版本")
+                    continue
+                break
 
             if filename:
                 logging.info(f"图片下载成功: {filename}")
@@ -377,7 +773,8 @@ async def fetch_artist_data(
     session: AsyncSession,
     artist: dict,
     auth_header: Dict[str, str] = None,
-    retry_count: int = 3
+    retry_count: int = 3,
+    force_refresh: bool = False
 ) -> Tuple[int, Optional[Dict]]:
     """
     获取单个画师的作品数量和示例图
@@ -402,8 +799,10 @@ async def fetch_artist_data(
             logging.info(f"正在获取画师 {name} 的数据...")
 
             # 并行获取作品数量和示例图
-            post_count_task = get_post_count_api(session, artist_tag, auth_header)
-            example_image_task = get_example_image_api(session, artist_tag, artist_identifier, auth_header)
+            post_count_task = get_post_count_api(session, artist_tag, auth_header, force_refresh)
+            example_image_task = get_example_image_api(
+                session, artist_tag, artist_identifier, auth_header, force_refresh=force_refresh
+            )
 
             post_count, example_image = await asyncio.gather(
                 post_count_task,
@@ -450,7 +849,8 @@ def _get_danbooru_auth() -> Dict[str, str]:
     return {}
 
 
-async def _fetch_post_counts_batch_async(artists: list, concurrency: int = 5) -> dict:
+async def _fetch_post_counts_batch_async(artists: list, concurrency: Optional[int] = None,
+                                         force_refresh: bool = False) -> dict:
     """
     内部异步函数：批量获取画师作品数量
     """
@@ -468,17 +868,14 @@ async def _fetch_post_counts_batch_async(artists: list, concurrency: int = 5) ->
     if not valid_artists:
         return results
 
-    # 使用信号量控制并发数
-    semaphore = asyncio.Semaphore(concurrency)
+    # 同时处理的画师数量上限；实际请求速率和并发由共享限速器自适应控制
+    semaphore = asyncio.Semaphore(concurrency or int(DANBOORU_API_LIMITER.max_concurrency))
 
     # 创建持久化的客户端，使用 chrome 浏览器指纹
     async with AsyncSession(impersonate="chrome136") as session:
         async def fetch_with_semaphore(artist: dict) -> Tuple[int, Optional[Dict]]:
             async with semaphore:
-                result = await fetch_artist_data(session, artist, auth_header)
-                # 短暂等待避免请求过快
-                await asyncio.sleep(0.65)
-                return result
+                return await fetch_artist_data(session, artist, auth_header, force_refresh=force_refresh)
 
         # 创建所有任务并并行执行
         tasks = [fetch_with_semaphore(artist) for artist in valid_artists]
@@ -496,138 +893,115 @@ async def _fetch_post_counts_batch_async(artists: list, concurrency: int = 5) ->
     return results
 
 
-def fetch_post_counts_batch(artists: list, concurrency: int = 5) -> dict:
+def fetch_post_counts_batch(artists: list, concurrency: Optional[int] = None,
+                            force_refresh: bool = False) -> dict:
     """
     批量获取画师作品数量和示例图（并行版本）
     artists: 列表,每个元素是字典 {'id': ..., 'uuid': ..., 'danbooru_link': ..., 'name': ...}
-    concurrency: 并行请求数量，默认5个
+    concurrency: 同时处理的画师数量上限，默认取限速器的最大并发
+    force_refresh: 忽略 Danbooru 响应缓存的有效期
     返回: {artist_id: {'post_count': int, 'example_image': str}}
     """
-    return asyncio.run(_fetch_post_counts_batch_async(artists, concurrency))
+    return asyncio.run(_fetch_post_counts_batch_async(artists, concurrency, force_refresh))
 
 
-def fetch_post_counts_streaming(artists: list, concurrency: int = 5):
-    """
-    流式批量获取画师作品数量和示例图（并行生成器版本，用于SSE）
-    artists: 列表,每个元素是字典 {'id': ..., 'uuid': ..., 'danbooru_link': ..., 'name': ...}
-    concurrency: 并行请求数量，默认5个
-    生成: {'type': 'progress', ...} 或 {'type': 'result', ...}
-    """
-    import queue
-    import threading
+# 批量刷新作品数时每次 /tags.json 查询的标签数量
+TAG_COUNT_CHUNK_SIZE = 100
 
-    total = len(artists)
-    if total == 0:
-        return
+async def _fetch_tag_counts_chunk(
+    session: AsyncSession,
+    tags: List[str],
+    auth_header: Dict[str, str],
+    force_refresh: bool = False
+) -> Dict[str, int]:
+    """一次查询多个标签的作品数: GET /tags.json?search[name_comma]=a,b,c"""
+    headers = {**DEFAULT_HEADERS, **auth_header}
+    names = sorted(tags)
+    try:
+        data = await cached_api_json(
+            session, 'tags', ",".join(names),
+            f"{DANBOORU_API_BASE}/tags.json",
+            params={
+                "search[name_comma]": ",".join(names),
+                "limit": len(names),
+                "only": "name,post_count"
+            },
+            headers=headers,
+            force_refresh=force_refresh
+        )
+    except Exception as e:
+        logging.warning(f"批量获取标签作品数异常: {e}")
+        return {}
+    return {tag['name']: tag['post_count'] for tag in data or [] if 'name' in tag and 'post_count' in tag}
 
-    # 过滤有效画师（有链接的）
-    valid_artists = [a for a in artists if a.get('danbooru_link', '').strip()]
-    valid_total = len(valid_artists)
-
-    if valid_total == 0:
-        yield {'type': 'progress', 'current': total, 'total': total, 'artist_name': '完成'}
-        return
-
-    # 线程安全的结果队列
-    result_queue = queue.Queue()
-
-    async def _streaming_worker():
-        """异步工作函数"""
-        completed_count = 0
-
-        # 获取认证信息
-        auth_header = _get_danbooru_auth()
-
-        # 使用信号量控制并发数
-        semaphore = asyncio.Semaphore(concurrency)
-
-        # 创建持久化的客户端，使用 chrome 浏览器指纹
-        async with AsyncSession(impersonate="chrome136") as session:
-            async def process_artist(artist: dict, worker_id: int):
-                nonlocal completed_count
-                async with semaphore:
-                    artist_id = artist['id']
-                    artist_identifier = artist.get('uuid') or str(artist_id)
-                    url = artist.get('danbooru_link', '')
-                    name = artist.get('name', 'Unknown')
-
-                    completed_count += 1
-                    result_queue.put({
-                        'type': 'progress',
-                        'current': completed_count,
-                        'total': valid_total,
-                        'artist_name': name
-                    })
-
-                    if not url or not url.strip():
-                        return
-
-                    try:
-                        artist_tag = extract_artist_tag_from_url(url)
-                        if not artist_tag:
-                            return
-
-                        logging.info(f"[Worker-{worker_id}] 正在获取画师 {name} 的数据...")
-
-                        # 并行获取数据
-                        post_count_task = get_post_count_api(session, artist_tag, auth_header)
-                        example_image_task = get_example_image_api(session, artist_tag, artist_identifier, auth_header)
-
-                        post_count, example_image = await asyncio.gather(
-                            post_count_task,
-                            example_image_task
-                        )
-
-                        if post_count is not None:
-                            result_queue.put({
-                                'type': 'result',
-                                'artist_id': artist_id,
-                                'artist_name': name,
-                                'result': {
-                                    'post_count': post_count,
-                                    'example_image': example_image
-                                }
-                            })
-                            logging.info(f"[Worker-{worker_id}] 画师 {name} - 作品数量: {post_count}, 示例图: {example_image or 'None'}")
-                        else:
-                            logging.warning(f"[Worker-{worker_id}] 未能获取画师 {name} 的数据")
-                    except Exception as e:
-                        logging.error(f"[Worker-{worker_id}] 处理画师 {name} 时出错: {e}")
-                    finally:
-                        # 短暂等待避免请求过快
-                        await asyncio.sleep(0.15)
-
-            # 创建所有任务并并行执行
-            tasks = [
-                process_artist(artist, i % concurrency)
-                for i, artist in enumerate(valid_artists)
-            ]
-            await asyncio.gather(*tasks, return_exceptions=True)
-
-        # 发送完成信号
-        result_queue.put({'type': 'done'})
-
-    def run_async_in_thread():
-        """在新线程中运行异步事件循环"""
-        asyncio.run(_streaming_worker())
-
-    # 启动异步工作线程
-    worker_thread = threading.Thread(target=run_async_in_thread)
-    worker_thread.start()
-
-    # 主线程从队列读取结果并 yield
-    while True:
-        try:
-            item = result_queue.get(timeout=120)  # 2分钟超时
-            if item['type'] == 'done':
-                break
-            yield item
-        except queue.Empty:
-            # 检查线程是否还在运行
-            if not worker_thread.is_alive():
-                break
+async def _fetch_tag_counts_async(tags: List[str], force_refresh: bool = False,
+                                  max_fallback: Optional[int] = None) -> Tuple[Dict[str, int], Dict[str, int]]:
+    auth_header = _get_danbooru_auth()
+    counts: Dict[str, int] = {}
+    stats = {'tag_queries': 0, 'fallback_queries': 0, 'fallback_skipped': 0}
 
-    worker_thread.join()
+    async with AsyncSession(impersonate="chrome136") as session:
+        chunks = [tags[i:i + TAG_COUNT_CHUNK_SIZE] for i in range(0, len(tags), TAG_COUNT_CHUNK_SIZE)]
+        stats['tag_queries'] = len(chunks)
+        for result in await asyncio.gather(*[
+            _fetch_tag_counts_chunk(session, chunk, auth_header, force_refresh) for chunk in chunks
+        ]):
+            counts.update(result)
+
+        # 未命中的标签（别名、已改名等）回退到逐个计数接口
+        misses = [tag for tag in tags if tag not in counts]
+        if max_fallback is not None and len(misses) > max_fallback:
+            stats['fallback_skipped'] = len(misses) - max_fallback
+            misses = misses[:max_fallback]
+        stats['fallback_queries'] = len(misses)
+        fallback = await asyncio.gather(*[
+            get_post_count_api(session, tag, auth_header, force_refresh) for tag in misses
+        ])
+        for tag, count in zip(misses, fallback):
+            if count is not None:
+                counts[tag] = count
+
+    return counts, stats
+
+def refresh_post_counts_bulk(artists: list, force_refresh: bool = False,
+                             max_fallback: Optional[int] = None) -> Tuple[Dict[int, Optional[int]], Dict[str, int]]:
+    """
+    仅刷新作品数量（不下载图片），按 TAG_COUNT_CHUNK_SIZE 个标签一组批量查询
+    artists: 列表,每个元素是字典 {'id': ..., 'danbooru_link': ...}
+    max_fallback: 逐个回退查询的数量上限（用于限制请求预算），超出的标签本次不查询
+    返回: ({artist_id: post_count}, {'tags', 'tag_queries', 'fallback_queries', 'fallback_skipped', 'missing'})
+          post_count 为 None 表示查询过但未获得作品数；本次未查询的画师不在结果中
+    """
+    tag_by_artist = {}
+    for artist in artists:
+        tag = unquote(extract_artist_tag_from_url(artist.get('danbooru_link') or '')).strip().lower()
+        if tag:
+            tag_by_artist[artist['id']] = tag
+
+    tags = sorted(set(tag_by_artist.values()))
+    if not tags:
+        return {}, {'tags': 0, 'tag_queries': 0, 'fallback_queries': 0, 'fallback_skipped': 0, 'missing': 0}
+
+    counts, stats = asyncio.run(_fetch_tag_counts_async(tags, force_refresh, max_fallback))
+    stats['tags'] = len(tags)
+    stats['missing'] = len([tag for tag in tags if tag not in counts])
+
+    # 回退查询时跳过的标签（按排序取未命中标签的末尾部分）
+    misses = [tag for tag in tags if tag not in counts]
+    skipped = set(misses[len(misses) - stats['fallback_skipped']:]) if stats['fallback_skipped'] else set()
+    return {
+        artist_id: counts.get(tag)
+        for artist_id, tag in tag_by_artist.items() if tag not in skipped
+    }, stats
+
+def fetch_status_from_result(result: Optional[dict]) -> str:
+    """
+    由获取结果得到 fetch_status
+    result: {'post_count': ..., 'example_image': ...}，未获取到时为 None
+    """
+    if not result or result.get('post_count') is None:
+        return 'failed'
+    return 'ok' if result.get('example_image') else 'no_image'
 
 
 def get_artists_without_images(artists: list) -> list:
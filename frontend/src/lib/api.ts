@@ -72,6 +72,9 @@ export interface Category {
   name: string
   display_order: number
   artist_count: number
+  total_post_count: number
+  max_post_count: number
+  incomplete_count: number
   created_at: string
 }
 
@@ -111,6 +114,9 @@ export interface Artist {
   categories: Category[]
   created_at: string
   updated_at: string
+  // 最近一次获取作品数据的时间和结果
+  last_fetched_at: string | null
+  fetch_status: 'ok' | 'no_image' | 'failed' | 'deferred' | null
 }
 
 export interface CreateArtistData {
@@ -123,10 +129,92 @@ export interface CreateArtistData {
   skip_danbooru?: boolean
 }
 
+export type ArtistSort = 'date_desc' | 'date_asc' | 'count_desc' | 'count_asc'
+
+export interface ArtistPageParams {
+  limit?: number
+  cursor?: string | null
+  sort?: ArtistSort
+  category_id?: number
+  incomplete?: boolean
+}
+
+export interface ArtistPagination {
+  next_cursor: string | null
+  total: number
+}
+
+export interface ArtistSearchHighlights {
+  name_noob: string | null
+  name_nai: string | null
+  notes: string | null
+}
+
+// 增量同步结果（version 作为下次请求的 since）
+export interface ArtistChanges {
+  version: number
+  reset: boolean
+  items: Artist[]
+  deleted_ids: number[]
+  categories: Category[]
+  deleted_category_ids: number[]
+}
+
 export const artistApi = {
   getAll: (categoryId?: number) =>
     request<Artist[]>(categoryId ? `/artists?category_id=${categoryId}` : '/artists'),
 
+  // 服务端键集分页
+  getPage: async (params: ArtistPageParams = {}) => {
+    const query = new URLSearchParams()
+    query.set('limit', String(params.limit ?? 100))
+    if (params.cursor) query.set('cursor', params.cursor)
+    if (params.sort) query.set('sort', params.sort)
+    if (params.category_id) query.set('category_id', String(params.category_id))
+    if (params.incomplete) query.set('incomplete', '1')
+    return request<Artist[]>(`/artists?${query.toString()}`) as Promise<
+      ApiResponse<Artist[]> & { pagination?: ArtistPagination }
+    >
+  },
+
+  // 按筛选表达式查询（如 "cat:Anime AND NOT cat:Sketch"、"posts>500 has:image"）
+  query: async (filter: string, params: Omit<ArtistPageParams, 'category_id' | 'incomplete'> = {}) => {
+    const query = new URLSearchParams()
+    query.set('filter', filter)
+    query.set('limit', String(params.limit ?? 100))
+    if (params.cursor) query.set('cursor', params.cursor)
+    if (params.sort) query.set('sort', params.sort)
+    return request<Artist[]>(`/artists/query?${query.toString()}`) as Promise<
+      ApiResponse<Artist[]> & { pagination?: ArtistPagination }
+    >
+  },
+
+  // 待补全画师（incomplete: 与"待补全"筛选一致；enrichment: 需要获取作品数据）
+  getIncomplete: async (mode: 'incomplete' | 'enrichment' = 'incomplete', params: { limit?: number; cursor?: string } = {}) => {
+    const query = new URLSearchParams()
+    query.set('mode', mode)
+    query.set('limit', String(params.limit ?? 100))
+    if (params.cursor) query.set('cursor', params.cursor)
+    return request<Artist[]>(`/artists/incomplete?${query.toString()}`) as Promise<
+      ApiResponse<Artist[]> & { pagination?: ArtistPagination }
+    >
+  },
+
+  // 服务端全文搜索（名称与备注）
+  search: (q: string, limit = 50) =>
+    request<(Artist & { highlights: ArtistSearchHighlights })[]>(
+      `/artists/search?q=${encodeURIComponent(q)}&limit=${limit}`
+    ),
+
+  // 模糊搜索（容忍拼写错误）
+  fuzzySearch: (q: string, limit = 20) =>
+    request<(Artist & { score: number })[]>(
+      `/artists/fuzzy?q=${encodeURIComponent(q)}&limit=${limit}`
+    ),
+
+  // 获取指定数据版本之后的变更
+  getChanges: (since = 0) => request<ArtistChanges>(`/artists/changes?since=${since}`),
+
   getById: (id: number) => request<Artist>(`/artists/${id}`),
 
   create: (data: CreateArtistData) =>
@@ -172,6 +260,65 @@ export interface AutoCompleteProgress {
   error?: string
 }
 
+export interface DuplicateGroup {
+  identity_key: string
+  canonical: Artist
+  duplicates: Artist[]
+}
+
+// Danbooru 请求限速器状态
+export interface RateLimiterState {
+  name: string
+  rate: number
+  rate_range: [number, number]
+  concurrency: number
+  concurrency_range: [number, number]
+  in_flight: number
+  tokens: number
+  blocked_for: number
+  requests: number
+  throttled: number
+  errors: number
+  last_throttled_at: number | null
+}
+
+// Danbooru 响应缓存统计
+export interface HttpCacheStats {
+  endpoints: Record<string, { entries: number; bytes: number }>
+  total_bytes: number
+  max_bytes: number
+  ttls: Record<string, number>
+  hits: number
+  misses: number
+  stale: number
+  revalidated: number
+  stored: number
+  evicted: number
+}
+
+// 作品数量定时刷新状态
+export interface RefreshSchedulerState {
+  enabled: boolean
+  running: boolean
+  interval: number
+  request_budget: number
+  batch_size: number
+  max_age_days: number
+  recent_views: number
+  last_run_at: number | null
+  last_result: {
+    skipped?: string
+    selected?: number
+    fetched?: number
+    updated?: number
+    failed?: number
+    requests?: number
+    deferred?: number
+    finished_at: number
+  } | null
+  next_run_at: number | null
+}
+
 export const toolsApi = {
   autoComplete: (name_noob: string, name_nai: string, danbooru_link: string) =>
     request<{ name_noob: string; name_nai: string; danbooru_link: string }>(
@@ -182,9 +329,11 @@ export const toolsApi = {
       }
     ),
 
-  // SSE 流式自动补全
-  autoCompleteAllStream: (onProgress: (data: AutoCompleteProgress) => void): (() => void) => {
-    const eventSource = new EventSource(`${API_BASE}/tools/auto-complete-all-stream`, {
+  // SSE 流式自动补全（由后端的一键补全任务执行，已有任务运行时附加到该任务）
+  // forceRefresh 为 true 时忽略 Danbooru 响应缓存的有效期
+  autoCompleteAllStream: (onProgress: (data: AutoCompleteProgress) => void, forceRefresh = false): (() => void) => {
+    const query = forceRefresh ? '?force_refresh=1' : ''
+    const eventSource = new EventSource(`${API_BASE}/tools/auto-complete-all-stream${query}`, {
       withCredentials: true,
     })
 
@@ -211,14 +360,153 @@ export const toolsApi = {
     return () => eventSource.close()
   },
 
-  fetchPostCounts: (artist_ids: number[]) =>
+  // 重复画师分组（分页）
+  getDuplicates: (cursor?: string | null, limit = 50) =>
+    request<DuplicateGroup[]>(
+      `/tools/duplicates?limit=${limit}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`
+    ) as Promise<ApiResponse<DuplicateGroup[]> & { pagination?: ArtistPagination }>,
+
+  // 合并重复画师；不传 merges 时合并所有分组（保留最早创建的画师）
+  mergeDuplicates: (merges?: { keep_id: number; remove_ids: number[] }[]) =>
+    request<{ merged_groups: number; removed_count: number }>('/tools/duplicates/merge', {
+      method: 'POST',
+      body: JSON.stringify(merges ? { merges } : { all: true }),
+    }),
+
+  // 仅刷新作品数量（批量标签查询）；不传 artist_ids 时刷新全部画师
+  refreshPostCounts: (artist_ids?: number[], force_refresh = false) =>
+    request<{
+      requested: number
+      fetched: number
+      updated: number
+      tags: number
+      tag_queries: number
+      fallback_queries: number
+      fallback_skipped: number
+      missing: number
+    }>('/tools/refresh-post-counts', {
+      method: 'POST',
+      body: JSON.stringify({ artist_ids, force_refresh }),
+    }),
+
+  // 限速器实时状态
+  getRateLimits: () => request<{ api: RateLimiterState; images: RateLimiterState }>('/tools/rate-limits'),
+
+  // 作品数量定时刷新状态
+  getRefreshScheduler: () => request<RefreshSchedulerState>('/tools/refresh-scheduler'),
+
+  fetchPostCounts: (artist_ids: number[], force_refresh = false) =>
     request<Record<number, { post_count: number; example_image: string }>>(
       '/tools/fetch-post-counts',
       {
         method: 'POST',
-        body: JSON.stringify({ artist_ids }),
+        body: JSON.stringify({ artist_ids, force_refresh }),
       }
     ),
+
+  // Danbooru 响应缓存统计 / 清空
+  getHttpCacheStats: () => request<HttpCacheStats>('/tools/http-cache'),
+
+  clearHttpCache: (endpoint?: 'counts' | 'posts' | 'tags') =>
+    request<{ removed: number }>(`/tools/http-cache${endpoint ? `?endpoint=${endpoint}` : ''}`, {
+      method: 'DELETE',
+    }),
+}
+
+// 后台任务相关
+export type JobStatus = 'pending' | 'running' | 'completed' | 'failed' | 'cancelled'
+
+export interface Job {
+  id: number
+  kind: 'enrich'
+  status: JobStatus
+  params: { force_refresh?: boolean; artist_ids?: number[] }
+  phase: 'names' | 'fetch' | null
+  total: number | null
+  done: number
+  succeeded: number
+  failed: number
+  updated_count: number
+  cancel_requested: boolean
+  message: string | null
+  error: string | null
+  worker_id: string | null
+  heartbeat_at: number | null
+  created_at: number
+  started_at: number | null
+  finished_at: number | null
+  tasks?: {
+    artist_id: number
+    status: 'pending' | 'done' | 'failed' | 'skipped'
+    result: { post_count?: number; example_image?: string } | null
+    updated_at: number | null
+  }[]
+}
+
+export interface JobEvent {
+  type: 'queued' | 'started' | 'resumed' | 'phase' | 'progress' | 'complete' | 'cancelled' | 'error'
+  job_id?: number
+  phase?: 'fetch'
+  current?: number
+  total?: number
+  artist_name?: string
+  succeeded?: number
+  failed?: number
+  updated_count?: number
+  fetched_count?: number
+  failed_count?: number
+  image_failed_count?: number
+  image_failed_artists?: string[]
+  message?: string
+  error?: string
+}
+
+export const jobsApi = {
+  // 发起一键补全；已有未结束的补全任务时返回该任务（created 为 false）
+  create: (params: { force_refresh?: boolean; artist_ids?: number[] } = {}) =>
+    request<Job>('/jobs', {
+      method: 'POST',
+      body: JSON.stringify({ kind: 'enrich', ...params }),
+    }) as Promise<ApiResponse<Job> & { created?: boolean }>,
+
+  get: (id: number, tasks?: 'all' | 'pending' | 'done' | 'failed' | 'skipped') =>
+    request<Job>(`/jobs/${id}${tasks ? `?tasks=${tasks}` : ''}`),
+
+  // 最近的任务；active 为 true 时只返回未结束的任务（页面刷新后重新订阅进度）
+  list: (active = false) => request<Job[]>(`/jobs${active ? '?active=1' : ''}`),
+
+  cancel: (id: number) => request<Job>(`/jobs/${id}/cancel`, { method: 'POST' }),
+
+  // 订阅任务进度（SSE）；连接中断时浏览器自动重连并从 Last-Event-ID 继续
+  subscribe: (id: number, onEvent: (data: JobEvent) => void, after = 0): (() => void) => {
+    const query = after > 0 ? `?after=${after}` : ''
+    const eventSource = new EventSource(`${API_BASE}/jobs/${id}/events${query}`, {
+      withCredentials: true,
+    })
+
+    eventSource.onmessage = (event) => {
+      try {
+        const data = JSON.parse(event.data) as JobEvent
+        onEvent(data)
+
+        // 任务结束时关闭连接
+        if (data.type === 'complete' || data.type === 'cancelled' || data.type === 'error') {
+          eventSource.close()
+        }
+      } catch (e) {
+        console.error('Failed to parse SSE data:', e)
+      }
+    }
+
+    eventSource.onerror = () => {
+      // 浏览器会自动重连；只有放弃重连（如任务已不存在）时才报告错误
+      if (eventSource.readyState === EventSource.CLOSED) {
+        onEvent({ type: 'error', error: '连接中断' })
+      }
+    }
+
+    return () => eventSource.close()
+  },
 }
 
 // 导入导出相关
@@ -316,6 +604,33 @@ export const importExportApi = {
   },
 }
 
+// 画师库统计
+export interface LibraryStats {
+  artists: {
+    total: number
+    complete: number
+    incomplete: number
+    skip_danbooru: number
+    missing_link: number
+    missing_image: number
+    missing_post_count: number
+    uncategorized: number
+    total_post_count: number
+    last_updated_at: string | null
+    // 最近一次获取作品数据的时间和上次获取失败的画师数
+    last_fetched_at: string | null
+    fetch_failed: number
+  }
+  categories: number
+  presets: number
+  post_count_histogram: { bucket: string; count: number }[]
+  images: { count: number; bytes: number }
+}
+
+export const statsApi = {
+  get: () => request<LibraryStats>('/stats'),
+}
+
 // 画师串相关
 export interface Preset {
   id: number
@@ -327,9 +642,48 @@ export interface Preset {
   updated_at: string
 }
 
+// 服务端解析后的画师标签（未匹配到画师时 artist_id 为 null）
+export interface ResolvedPresetToken {
+  raw: string
+  name: string
+  weight: number
+  artist_id: number | null
+  post_count: number | null
+  image_url: string | null
+  // 已保存画师串的条目附带关联画师的当前名称
+  name_noob?: string | null
+  name_nai?: string | null
+}
+
+// 使用了某个画师的画师串
+export interface ArtistPresetRef {
+  id: number
+  name: string
+  description: string
+  updated_at: string
+  fields: ('noob' | 'nai')[]
+  max_weight: number
+}
+
 export const presetApi = {
   getAll: () => request<Preset[]>('/presets'),
 
+  // 解析已保存画师串并匹配画师库
+  resolve: (id: number) =>
+    request<{ noob: ResolvedPresetToken[]; nai: ResolvedPresetToken[] }>(`/presets/${id}/resolve`, {
+      method: 'POST',
+    }),
+
+  // 反查使用了指定画师的画师串
+  getByArtist: (artistId: number) => request<ArtistPresetRef[]>(`/artists/${artistId}/presets`),
+
+  // 解析原始提示词文本
+  resolveText: (texts: { noob_text?: string; nai_text?: string; text?: string }) =>
+    request<Partial<Record<'noob' | 'nai' | 'text', ResolvedPresetToken[]>>>('/presets/resolve', {
+      method: 'POST',
+      body: JSON.stringify(texts),
+    }),
+
   create: (name: string, description: string, noob_text: string, nai_text: string) =>
     request<{ id: number }>('/presets', {
       method: 'POST',